@@ -0,0 +1,28 @@
+"""add indexes backing report and ETL queries
+
+Revision ID: 008_add_report_query_indexes
+Revises: 74297424421c
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_report_query_indexes'
+down_revision = '74297424421c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_payments_status_received_at', 'payments', ['status', 'received_at'], unique=False)
+    op.create_index(op.f('ix_payments_invoice_id'), 'payments', ['invoice_id'], unique=False)
+    op.create_index('ix_patient_payment_history_patient_date', 'patient_payment_history', ['patient_id', 'payment_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_patient_payment_history_patient_date', table_name='patient_payment_history')
+    op.drop_index(op.f('ix_payments_invoice_id'), table_name='payments')
+    op.drop_index('ix_payments_status_received_at', table_name='payments')
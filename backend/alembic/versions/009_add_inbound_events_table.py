@@ -0,0 +1,45 @@
+"""add inbound_events table for the webhook inbox
+
+Revision ID: 009_add_inbound_events_table
+Revises: 008_add_report_query_indexes
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_inbound_events_table'
+down_revision = '008_add_report_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('inbound_events',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('event_id', sa.String(), nullable=True),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('ordering_key', sa.String(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'PROCESSED', 'DEAD', name='inboundeventstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_inbound_events_status'), 'inbound_events', ['status'], unique=False)
+    op.create_index(op.f('ix_inbound_events_ordering_key'), 'inbound_events', ['ordering_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_inbound_events_ordering_key'), table_name='inbound_events')
+    op.drop_index(op.f('ix_inbound_events_status'), table_name='inbound_events')
+    op.drop_table('inbound_events')
+    op.execute('DROP TYPE IF EXISTS inboundeventstatus')
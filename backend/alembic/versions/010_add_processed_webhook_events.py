@@ -0,0 +1,32 @@
+"""add processed_webhook_events de-duplication table
+
+Revision ID: 010_add_processed_webhook_events
+Revises: 009_add_inbound_events_table
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_processed_webhook_events'
+down_revision = '009_add_inbound_events_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('processed_webhook_events',
+        sa.Column('event_id', sa.String(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('event_id')
+    )
+    op.create_index(op.f('ix_processed_webhook_events_received_at'), 'processed_webhook_events', ['received_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_processed_webhook_events_received_at'), table_name='processed_webhook_events')
+    op.drop_table('processed_webhook_events')
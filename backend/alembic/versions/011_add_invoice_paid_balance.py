@@ -0,0 +1,46 @@
+"""add denormalized paid balance columns to invoices
+
+Revision ID: 011_add_invoice_paid_balance
+Revises: 010_add_processed_webhook_events
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_invoice_paid_balance'
+down_revision = '010_add_processed_webhook_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('invoices', sa.Column('paid_cents', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('invoices', sa.Column('balance_cents', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('invoices', sa.Column('last_payment_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill from succeeded payments
+    op.execute(
+        """
+        UPDATE invoices SET
+            paid_cents = COALESCE((
+                SELECT SUM(p.amount_cents) FROM payments p
+                WHERE p.invoice_id = invoices.id AND p.status = 'SUCCEEDED'
+            ), 0),
+            last_payment_at = (
+                SELECT MAX(p.received_at) FROM payments p
+                WHERE p.invoice_id = invoices.id AND p.status = 'SUCCEEDED'
+            )
+        """
+    )
+    op.execute("UPDATE invoices SET balance_cents = total_amount_cents - paid_cents")
+    op.create_index('ix_invoices_balance_cents', 'invoices', ['balance_cents'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invoices_balance_cents', table_name='invoices')
+    op.drop_column('invoices', 'last_payment_at')
+    op.drop_column('invoices', 'balance_cents')
+    op.drop_column('invoices', 'paid_cents')
@@ -0,0 +1,28 @@
+"""add (received_at, id) indexes for keyset pagination of payments
+
+Revision ID: 012_add_payments_keyset_indexes
+Revises: 011_add_invoice_paid_balance
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_add_payments_keyset_indexes'
+down_revision = '011_add_invoice_paid_balance'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_payments_received_at_id', 'payments', ['received_at', 'id'], unique=False)
+    op.drop_index('ix_payments_status_received_at', table_name='payments')
+    op.create_index('ix_payments_status_received_at', 'payments', ['status', 'received_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_status_received_at', table_name='payments')
+    op.create_index('ix_payments_status_received_at', 'payments', ['status', 'received_at'], unique=False)
+    op.drop_index('ix_payments_received_at_id', table_name='payments')
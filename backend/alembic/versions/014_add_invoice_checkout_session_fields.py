@@ -0,0 +1,28 @@
+"""store checkout session url, expiry and amount on invoices
+
+Revision ID: 014_add_invoice_checkout_session_fields
+Revises: 013_add_email_outbox_table
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014_add_invoice_checkout_session_fields'
+down_revision = '013_add_email_outbox_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('invoices', sa.Column('stripe_checkout_url', sa.String(), nullable=True))
+    op.add_column('invoices', sa.Column('stripe_checkout_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('invoices', sa.Column('stripe_checkout_amount_cents', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('invoices', 'stripe_checkout_amount_cents')
+    op.drop_column('invoices', 'stripe_checkout_expires_at')
+    op.drop_column('invoices', 'stripe_checkout_url')
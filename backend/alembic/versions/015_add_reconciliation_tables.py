@@ -0,0 +1,60 @@
+"""add reconciliation_runs and reconciliation_discrepancies tables
+
+Revision ID: 015_add_reconciliation_tables
+Revises: 014_add_invoice_checkout_session_fields
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '015_add_reconciliation_tables'
+down_revision = '014_add_invoice_checkout_session_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('reconciliation_runs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('period_start', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('period_end', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('status', sa.Enum('RUNNING', 'COMPLETED', 'FAILED', name='reconciliationrunstatus'), nullable=False),
+        sa.Column('entries_total', sa.Integer(), nullable=False),
+        sa.Column('entries_matched', sa.Integer(), nullable=False),
+        sa.Column('entries_ignored', sa.Integer(), nullable=False),
+        sa.Column('summary', sa.JSON(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('reconciliation_discrepancies',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('run_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('kind', sa.Enum('UNMATCHED', 'MISSING', 'AMOUNT_MISMATCH', 'DUPLICATE', 'STATUS_MISMATCH', name='discrepancykind'), nullable=False),
+        sa.Column('stripe_payment_id', sa.String(), nullable=True),
+        sa.Column('balance_transaction_id', sa.String(), nullable=True),
+        sa.Column('payment_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('expected_amount_cents', sa.Integer(), nullable=True),
+        sa.Column('actual_amount_cents', sa.Integer(), nullable=True),
+        sa.Column('currency', sa.String(), nullable=True),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['run_id'], ['reconciliation_runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_reconciliation_discrepancies_run_kind', 'reconciliation_discrepancies', ['run_id', 'kind'], unique=False)
+    op.create_index(op.f('ix_reconciliation_discrepancies_stripe_payment_id'), 'reconciliation_discrepancies', ['stripe_payment_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reconciliation_discrepancies_stripe_payment_id'), table_name='reconciliation_discrepancies')
+    op.drop_index('ix_reconciliation_discrepancies_run_kind', table_name='reconciliation_discrepancies')
+    op.drop_table('reconciliation_discrepancies')
+    op.drop_table('reconciliation_runs')
+    op.execute('DROP TYPE IF EXISTS discrepancykind')
+    op.execute('DROP TYPE IF EXISTS reconciliationrunstatus')
@@ -0,0 +1,89 @@
+"""move payments.raw_event to a compressed payment_raw_events side table
+
+Revision ID: 016_move_payment_raw_events
+Revises: 015_add_reconciliation_tables
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import json
+import zlib
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '016_move_payment_raw_events'
+down_revision = '015_add_reconciliation_tables'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+payments = sa.table(
+    'payments',
+    sa.column('id', postgresql.UUID(as_uuid=True)),
+    sa.column('raw_event', sa.JSON()),
+)
+raw_events = sa.table(
+    'payment_raw_events',
+    sa.column('payment_id', postgresql.UUID(as_uuid=True)),
+    sa.column('encoding', sa.String()),
+    sa.column('data', sa.LargeBinary()),
+    sa.column('size_bytes', sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    op.create_table('payment_raw_events',
+        sa.Column('payment_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('encoding', sa.String(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('payment_id')
+    )
+
+    # Copy existing payloads in keyset batches, compressing them on the way
+    conn = op.get_bind()
+    last_id = None
+    while True:
+        query = sa.select(payments.c.id, payments.c.raw_event).where(payments.c.raw_event.isnot(None))
+        if last_id is not None:
+            query = query.where(payments.c.id > last_id)
+        rows = conn.execute(query.order_by(payments.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        values = []
+        for payment_id, payload in rows:
+            if payload is None:
+                continue
+            raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+            values.append({"payment_id": payment_id, "encoding": "zlib", "data": zlib.compress(raw, 6), "size_bytes": len(raw)})
+        if values:
+            conn.execute(raw_events.insert(), values)
+        last_id = rows[-1][0]
+
+    op.drop_column('payments', 'raw_event')
+
+
+def downgrade() -> None:
+    op.add_column('payments', sa.Column('raw_event', sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    last_id = None
+    while True:
+        query = sa.select(raw_events.c.payment_id, raw_events.c.data)
+        if last_id is not None:
+            query = query.where(raw_events.c.payment_id > last_id)
+        rows = conn.execute(query.order_by(raw_events.c.payment_id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        for payment_id, data in rows:
+            conn.execute(
+                payments.update().where(payments.c.id == payment_id).values(raw_event=json.loads(zlib.decompress(data)))
+            )
+        last_id = rows[-1][0]
+
+    op.drop_table('payment_raw_events')
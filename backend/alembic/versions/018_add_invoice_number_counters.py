@@ -0,0 +1,30 @@
+"""add invoice_number_counters table
+
+Revision ID: 018_add_invoice_number_counters
+Revises: 017_add_idempotency_keys
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '018_add_invoice_number_counters'
+down_revision = '017_add_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('invoice_number_counters',
+        sa.Column('period', sa.String(length=6), nullable=False),
+        sa.Column('last_value', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('period')
+    )
+    # Months already in progress are seeded from their highest invoice number on first use
+
+
+def downgrade() -> None:
+    op.drop_table('invoice_number_counters')
@@ -0,0 +1,30 @@
+"""add keyset indexes for the invoice list and invoice_items.invoice_id
+
+Revision ID: 019_add_invoice_list_indexes
+Revises: 018_add_invoice_number_counters
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '019_add_invoice_list_indexes'
+down_revision = '018_add_invoice_number_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_invoices_created_at_id', 'invoices', ['created_at', 'id'], unique=False)
+    op.create_index('ix_invoices_patient_id_created_at', 'invoices', ['patient_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_invoices_status_created_at', 'invoices', ['status', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_invoice_items_invoice_id'), 'invoice_items', ['invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_invoice_items_invoice_id'), table_name='invoice_items')
+    op.drop_index('ix_invoices_status_created_at', table_name='invoices')
+    op.drop_index('ix_invoices_patient_id_created_at', table_name='invoices')
+    op.drop_index('ix_invoices_created_at_id', table_name='invoices')
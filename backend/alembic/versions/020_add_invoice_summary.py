@@ -0,0 +1,60 @@
+"""add invoice_summary read model
+
+Revision ID: 020_add_invoice_summary
+Revises: 019_add_invoice_list_indexes
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '020_add_invoice_summary'
+down_revision = '019_add_invoice_list_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('invoice_summary',
+        sa.Column('invoice_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('invoice_number', sa.String(), nullable=False),
+        sa.Column('patient_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('patient_name', sa.String(), nullable=True),
+        sa.Column('patient_email', sa.String(), nullable=True),
+        sa.Column('currency', sa.String(), nullable=False),
+        sa.Column('total_amount_cents', sa.Integer(), nullable=False),
+        sa.Column('paid_cents', sa.Integer(), nullable=False),
+        sa.Column('balance_cents', sa.Integer(), nullable=False),
+        sa.Column('last_payment_at', sa.DateTime(timezone=True), nullable=True),
+        # The invoices enum type already exists
+        sa.Column('status', postgresql.ENUM('DRAFT', 'ISSUED', 'PAID', 'PARTIALLY_PAID', 'CANCELLED', name='invoicestatus', create_type=False), nullable=False),
+        sa.Column('due_date', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('invoice_id')
+    )
+    op.execute(
+        """
+        INSERT INTO invoice_summary (
+            invoice_id, invoice_number, patient_id, patient_name, patient_email, currency,
+            total_amount_cents, paid_cents, balance_cents, last_payment_at, status, due_date, created_at
+        )
+        SELECT i.id, i.invoice_number, i.patient_id, p.name, p.email, i.currency,
+               i.total_amount_cents, i.paid_cents, i.balance_cents, i.last_payment_at, i.status, i.due_date, i.created_at
+        FROM invoices i LEFT JOIN patients p ON p.id = i.patient_id
+        """
+    )
+    op.create_index('ix_invoice_summary_created_at_id', 'invoice_summary', ['created_at', 'invoice_id'], unique=False)
+    op.create_index('ix_invoice_summary_status_created_at', 'invoice_summary', ['status', 'created_at', 'invoice_id'], unique=False)
+    op.create_index('ix_invoice_summary_patient_id_created_at', 'invoice_summary', ['patient_id', 'created_at', 'invoice_id'], unique=False)
+    op.create_index('ix_invoice_summary_balance_cents', 'invoice_summary', ['balance_cents'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invoice_summary_balance_cents', table_name='invoice_summary')
+    op.drop_index('ix_invoice_summary_patient_id_created_at', table_name='invoice_summary')
+    op.drop_index('ix_invoice_summary_status_created_at', table_name='invoice_summary')
+    op.drop_index('ix_invoice_summary_created_at_id', table_name='invoice_summary')
+    op.drop_table('invoice_summary')
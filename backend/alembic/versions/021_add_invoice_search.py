@@ -0,0 +1,45 @@
+"""add invoice_search full-text documents
+
+Revision ID: 021_add_invoice_search
+Revises: 020_add_invoice_summary
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '021_add_invoice_search'
+down_revision = '020_add_invoice_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('invoice_search',
+        sa.Column('invoice_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('document', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('invoice_id')
+    )
+    op.execute(
+        "ALTER TABLE invoice_search ADD COLUMN document_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED"
+    )
+    op.execute(
+        """
+        INSERT INTO invoice_search (invoice_id, document)
+        SELECT i.id, concat_ws(' ', i.invoice_number, p.name, string_agg(ii.description, ' '))
+        FROM invoices i
+        LEFT JOIN patients p ON p.id = i.patient_id
+        LEFT JOIN invoice_items ii ON ii.invoice_id = i.id
+        GROUP BY i.id, i.invoice_number, p.name
+        """
+    )
+    op.execute("CREATE INDEX ix_invoice_search_document_tsv ON invoice_search USING GIN (document_tsv)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_invoice_search_document_tsv")
+    op.drop_table('invoice_search')
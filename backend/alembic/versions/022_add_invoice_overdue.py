@@ -0,0 +1,26 @@
+"""add invoices.overdue_at and the overdue scan index
+
+Revision ID: 022_add_invoice_overdue
+Revises: 021_add_invoice_search
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '022_add_invoice_overdue'
+down_revision = '021_add_invoice_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('invoices', sa.Column('overdue_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_invoices_status_due_date', 'invoices', ['status', 'due_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invoices_status_due_date', table_name='invoices')
+    op.drop_column('invoices', 'overdue_at')
@@ -0,0 +1,43 @@
+"""add patients.search_text with a trigram index
+
+Revision ID: 023_add_patient_search
+Revises: 022_add_invoice_overdue
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.patient import patient_search_text
+
+
+# revision identifiers, used by Alembic.
+revision = '023_add_patient_search'
+down_revision = '022_add_invoice_overdue'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK = 5000
+
+
+def upgrade() -> None:
+    op.add_column('patients', sa.Column('search_text', sa.String(), nullable=True))
+
+    # Normalization strips accents in Python, so the backfill cannot be a single UPDATE
+    conn = op.get_bind()
+    patients = sa.table('patients', sa.column('id'), sa.column('name'), sa.column('email'), sa.column('phone'), sa.column('search_text'))
+    update = patients.update().where(patients.c.id == sa.bindparam('patient_id')).values(search_text=sa.bindparam('text'))
+    rows = conn.execute(sa.select(patients.c.id, patients.c.name, patients.c.email, patients.c.phone)).all()
+    for start in range(0, len(rows), BACKFILL_CHUNK):
+        conn.execute(update, [
+            {"patient_id": row.id, "text": patient_search_text(row.name, row.email, row.phone)}
+            for row in rows[start:start + BACKFILL_CHUNK]
+        ])
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_patients_search_text_trgm ON patients USING GIN (search_text gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_search_text_trgm")
+    op.drop_column('patients', 'search_text')
@@ -0,0 +1,61 @@
+"""add patient_imports, patient_import_errors and patient duplicate-check indexes
+
+Revision ID: 024_add_patient_imports
+Revises: 023_add_patient_search
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '024_add_patient_imports'
+down_revision = '023_add_patient_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('patient_imports',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('format', sa.String(length=10), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='patientimportstatus'), nullable=False),
+        sa.Column('staff_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('rows_read', sa.Integer(), nullable=False),
+        sa.Column('created', sa.Integer(), nullable=False),
+        sa.Column('duplicates', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['staff_id'], ['staff.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('patient_import_errors',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('import_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('row', sa.Integer(), nullable=False),
+        sa.Column('issue', sa.Enum('INVALID', 'DUPLICATE', name='patientimportissue'), nullable=False),
+        sa.Column('field', sa.String(), nullable=True),
+        sa.Column('message', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=True),
+        sa.Column('existing_patient_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(['import_id'], ['patient_imports.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_patient_import_errors_import_row', 'patient_import_errors', ['import_id', 'row'], unique=False)
+    op.create_index('ix_patients_email_lower', 'patients', [sa.text('lower(email)')], unique=False)
+    op.create_index('ix_patients_name_lower_dob', 'patients', [sa.text('lower(name)'), 'dob'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_patients_name_lower_dob', table_name='patients')
+    op.drop_index('ix_patients_email_lower', table_name='patients')
+    op.drop_index('ix_patient_import_errors_import_row', table_name='patient_import_errors')
+    op.drop_table('patient_import_errors')
+    op.drop_table('patient_imports')
+    op.execute("DROP TYPE IF EXISTS patientimportissue")
+    op.execute("DROP TYPE IF EXISTS patientimportstatus")
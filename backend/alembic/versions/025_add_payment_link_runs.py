@@ -0,0 +1,56 @@
+"""add payment_link_runs and payment_link_results
+
+Revision ID: 025_add_payment_link_runs
+Revises: 024_add_patient_imports
+Create Date: 2026-10-20 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '025_add_payment_link_runs'
+down_revision = '024_add_patient_imports'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('payment_link_runs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='paymentlinkrunstatus'), nullable=False),
+        sa.Column('staff_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('sent', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('skipped', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['staff_id'], ['staff.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('payment_link_results',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('run_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('invoice_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('invoice_number', sa.String(), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('checkout_url', sa.String(), nullable=True),
+        sa.Column('sent_to', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['run_id'], ['payment_link_runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payment_link_results_run_id', 'payment_link_results', ['run_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_link_results_run_id', table_name='payment_link_results')
+    op.drop_table('payment_link_results')
+    op.drop_table('payment_link_runs')
+    op.execute("DROP TYPE IF EXISTS paymentlinkrunstatus")
@@ -0,0 +1,32 @@
+"""add invoice_summary.overdue_at and clear stale overdue flags
+
+Revision ID: 026_add_invoice_summary_overdue
+Revises: 025_add_payment_link_runs
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '026_add_invoice_summary_overdue'
+down_revision = '025_add_payment_link_runs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Flags left on invoices that were paid or cancelled after the scan
+    op.execute("UPDATE invoices SET overdue_at = NULL WHERE overdue_at IS NOT NULL AND status IN ('PAID', 'CANCELLED')")
+    op.add_column('invoice_summary', sa.Column('overdue_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        "UPDATE invoice_summary SET overdue_at = "
+        "(SELECT invoices.overdue_at FROM invoices WHERE invoices.id = invoice_summary.invoice_id)"
+    )
+    op.create_index('ix_invoice_summary_overdue_at', 'invoice_summary', ['overdue_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invoice_summary_overdue_at', table_name='invoice_summary')
+    op.drop_column('invoice_summary', 'overdue_at')
@@ -11,6 +11,7 @@ from app.models.patient import Patient
 from app.models.invoice import Invoice
 from app.models.payment import Payment
 from app.db.session import get_db
+from app.services import patient_search
 from sqlalchemy.orm import Session as SQLSession
 from sqlalchemy import func
 
@@ -66,10 +67,7 @@ def search_patients(query: str) -> List[Dict[str, Any]]:
     """Search for patients by name or email."""
     db = next(get_db())
     try:
-        patients = db.query(Patient).filter(
-            (Patient.name.ilike(f"%{query}%")) | 
-            (Patient.email.ilike(f"%{query}%"))
-        ).limit(10).all()
+        patients = [patient for patient, _ in patient_search.search_patients(db, query, limit=10)]
         
         return [
             {
@@ -91,9 +89,14 @@ def get_billing_summary() -> Dict[str, Any]:
         # Get total patients
         total_patients = db.query(func.count(Patient.id)).scalar()
         
-        # Get total invoices and amounts
-        total_invoices = db.query(func.count(Invoice.id)).scalar()
-        total_invoice_amount_cents = db.query(func.sum(Invoice.total_amount_cents)).scalar() or 0
+        # Get total invoices and amounts; paid/outstanding come from the invoices'
+        # denormalized balances instead of summing the payments table
+        total_invoices, total_invoice_amount_cents, total_paid_cents, outstanding_cents = db.query(
+            func.count(Invoice.id),
+            func.coalesce(func.sum(Invoice.total_amount_cents), 0),
+            func.coalesce(func.sum(Invoice.paid_cents), 0),
+            func.coalesce(func.sum(Invoice.balance_cents), 0),
+        ).one()
         total_invoice_amount = total_invoice_amount_cents / 100  # Convert cents to dollars
         
         # Get paid vs outstanding
@@ -102,8 +105,7 @@ def get_billing_summary() -> Dict[str, Any]:
         
         # Get total payments
         total_payments = db.query(func.count(Payment.id)).scalar()
-        total_payment_amount_cents = db.query(func.sum(Payment.amount_cents)).scalar() or 0
-        total_payment_amount = total_payment_amount_cents / 100  # Convert cents to dollars
+        total_payment_amount = total_paid_cents / 100  # Convert cents to dollars
         
         return {
             "total_patients": total_patients,
@@ -113,7 +115,7 @@ def get_billing_summary() -> Dict[str, Any]:
             "outstanding_invoices": outstanding_invoices,
             "total_payments": total_payments,
             "total_payment_amount": float(total_payment_amount),
-            "outstanding_amount": float(total_invoice_amount - total_payment_amount)
+            "outstanding_amount": float(outstanding_cents / 100)
         }
     finally:
         db.close()
@@ -173,7 +175,23 @@ def get_invoice_by_number(invoice_number: str) -> Dict[str, Any]:
     try:
         invoice = db.query(Invoice).filter(Invoice.invoice_number == invoice_number).first()
         if not invoice:
-            return {"error": f"Invoice with number {invoice_number} not found"}
+            # Not an exact number: treat it as a fragment (or patient/item words) and search
+            from app.services.invoice_search import search_invoices
+            matches = search_invoices(db, invoice_number, limit=5)
+            if len(matches) != 1:
+                return {
+                    "error": f"Invoice with number {invoice_number} not found",
+                    "matches": [
+                        {
+                            "invoice_number": summary.invoice_number,
+                            "patient_name": summary.patient_name,
+                            "status": summary.status,
+                            "balance": float(summary.balance_cents / 100),
+                        }
+                        for summary, _ in matches
+                    ],
+                }
+            invoice = db.query(Invoice).filter(Invoice.id == matches[0][0].invoice_id).first()
         
         # Get related patient information
         patient = db.query(Patient).filter(Patient.id == invoice.patient_id).first()
@@ -1,35 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, raiseload, selectinload
 from typing import List, Optional
 from datetime import datetime, date
 from app.db.session import get_db
 from app.models.invoice import Invoice, InvoiceItem, InvoiceStatus
+from app.models.invoice_summary import InvoiceSummary
 from app.models.patient import Patient
 from app.models.staff import Staff
-from app.schemas.invoice import InvoiceCreate, InvoiceResponse
+from app.schemas.invoice import BulkInvoiceCreate, InvoiceCreate, InvoiceListItem, InvoiceResponse, InvoiceSummaryResponse, InvoiceSummaryRow, InvoiceSearchResult
 from app.api.api_v1.endpoints.auth import get_current_staff
+from app.core.pagination import decode_cursor, encode_cursor
+from app.services.bulk_invoices import MAX_BULK_INVOICES, create_invoices
+from app.services.invoice_numbers import allocate_invoice_number
+from app.services.invoice_search import search_invoices
+from app.services.invoice_pdf import invoice_pdf_cache, invoice_snapshot, snapshot_digest
+import asyncio
 import uuid
 
 router = APIRouter()
 
-def generate_invoice_number(db: Session) -> str:
-    """Generate unique invoice number in format CLINIC-YYYYMM-0001"""
-    from datetime import datetime
-    current_date = datetime.now()
-    year_month = current_date.strftime("%Y%m")
-    
-    # Find the highest invoice number for this month
-    last_invoice = db.query(Invoice).filter(
-        Invoice.invoice_number.like(f"CLINIC-{year_month}-%")
-    ).order_by(Invoice.invoice_number.desc()).first()
-    
-    if last_invoice:
-        # Extract the sequence number and increment
-        sequence = int(last_invoice.invoice_number.split("-")[-1]) + 1
-    else:
-        sequence = 1
-    
-    return f"CLINIC-{year_month}-{sequence:04d}"
+# Page size of GET /invoices when a cursor is sent without a limit
+DEFAULT_PAGE_SIZE = 50
 
 @router.post("/", response_model=InvoiceResponse)
 def create_invoice(
@@ -53,7 +47,7 @@ def create_invoice(
     
     # Create invoice
     db_invoice = Invoice(
-        invoice_number=generate_invoice_number(db),
+        invoice_number=allocate_invoice_number(db),
         patient_id=invoice.patient_id,
         staff_id=current_staff.id,
         currency=invoice.currency,
@@ -88,6 +82,93 @@ def create_invoice(
         pass
     return db_invoice
 
+@router.post("/bulk")
+def create_invoices_bulk(
+    payload: BulkInvoiceCreate,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Create a batch of draft invoices in one transaction.
+
+    Returns one result per entry in input order; invalid entries carry an error
+    and are not created (with all_or_nothing, nothing is created if any entry is invalid).
+    """
+    if current_staff.role not in ["admin", "billing_clerk"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions to create invoices")
+    if not payload.invoices:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No invoices given")
+    if len(payload.invoices) > MAX_BULK_INVOICES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_INVOICES} invoices per request"
+        )
+
+    outcome = create_invoices(db, payload.invoices, staff_id=current_staff.id, all_or_nothing=payload.all_or_nothing)
+    return outcome.as_dict()
+
+@router.get("/summary", response_model=List[InvoiceSummaryRow])
+def list_invoice_summaries(
+    response: Response,
+    patient_id: Optional[str] = Query(None),
+    status: Optional[InvoiceStatus] = Query(None),
+    outstanding: bool = Query(False, description="Only invoices with a balance due"),
+    overdue: bool = Query(False, description="Only invoices flagged overdue"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Invoice list rows with patient and balance, newest first, from the invoice_summary read model.
+
+    Reads one table without joins. Pass the X-Next-Cursor response header back
+    as ``cursor`` for the next page (keyset on created_at, invoice_id).
+    """
+    query = db.query(InvoiceSummary)
+    if patient_id:
+        try:
+            pid = uuid.UUID(patient_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid patient id")
+        query = query.filter(InvoiceSummary.patient_id == pid)
+    if status:
+        query = query.filter(InvoiceSummary.status == status)
+    if outstanding:
+        query = query.filter(InvoiceSummary.balance_cents > 0)
+    if overdue:
+        query = query.filter(InvoiceSummary.overdue_at.isnot(None))
+    if cursor:
+        try:
+            after_created_at, after_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(InvoiceSummary.created_at, InvoiceSummary.invoice_id) < (after_created_at, after_id))
+
+    rows = query.order_by(InvoiceSummary.created_at.desc(), InvoiceSummary.invoice_id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.invoice_id)
+    return rows
+
+@router.get("/search", response_model=List[InvoiceSearchResult])
+def search_invoice_documents(
+    q: str = Query(..., min_length=1, description="Words or fragments of invoice number, patient name or item description"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Full-text invoice search, best match first.
+
+    Every word of ``q`` must match the start of a word in the invoice number,
+    patient name or an item description, so "smi 0042" finds CLINIC-202410-0042
+    billed to Jane Smith.
+    """
+    return [
+        InvoiceSearchResult(**InvoiceSummaryRow.model_validate(summary).model_dump(), rank=rank)
+        for summary, rank in search_invoices(db, q, limit=limit, offset=offset)
+    ]
+
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
 def get_invoice(
     invoice_id: str,
@@ -107,22 +188,66 @@ def get_invoice(
         )
     return invoice
 
-@router.get("/", response_model=List[InvoiceResponse])
+@router.get("/{invoice_id}/pdf")
+async def get_invoice_pdf(
+    invoice_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Invoice as a PDF, rendered once per invoice state and then served from disk.
+
+    The ETag is the hash of everything the document shows, so a client sending
+    it back in If-None-Match gets 304 until the invoice, its items or payments change.
+    """
+    try:
+        invoice_uuid = uuid.UUID(invoice_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid invoice id")
+
+    snapshot = await run_in_threadpool(invoice_snapshot, db, invoice_uuid)
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invoice not found")
+
+    digest = snapshot_digest(snapshot)
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if digest in {tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = await asyncio.wrap_future(invoice_pdf_cache.render(snapshot, digest))
+    return FileResponse(
+        path, media_type="application/pdf", filename=f"{snapshot['invoice_number']}.pdf", headers=headers
+    )
+
+@router.get("/", response_model=List[InvoiceListItem])
 def list_invoices(
+    response: Response,
     patient_id: Optional[str] = Query(None),
     status: Optional[InvoiceStatus] = Query(None),
     from_date: Optional[date] = Query(None),
     to_date: Optional[date] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    include_items: bool = Query(True, description="Set to false for summary rows without line items"),
     db: Session = Depends(get_db),
     current_staff: Staff = Depends(get_current_staff)
 ):
+    """List invoices, newest first.
+
+    With ``limit`` or ``cursor`` the list is keyset-paginated on (created_at, id):
+    pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page (``limit`` defaults to DEFAULT_PAGE_SIZE). Without either, every
+    matching invoice is returned, as existing clients expect. Line items are
+    loaded with one extra query, or not at all with include_items=false.
+    """
     query = db.query(Invoice)
     
     if patient_id:
         try:
             pid = uuid.UUID(patient_id)
         except Exception:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid patient id")
+            raise HTTPException(status_code=400, detail="Invalid patient id")
         query = query.filter(Invoice.patient_id == pid)
     if status:
         query = query.filter(Invoice.status == status)
@@ -130,8 +255,29 @@ def list_invoices(
         query = query.filter(Invoice.created_at >= from_date)
     if to_date:
         query = query.filter(Invoice.created_at <= to_date)
-    
-    return query.order_by(Invoice.created_at.desc()).all()
+    if cursor:
+        try:
+            after_created_at, after_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(Invoice.created_at, Invoice.id) < (after_created_at, after_id))
+
+    query = query.options(selectinload(Invoice.items) if include_items else raiseload(Invoice.items))
+    query = query.order_by(Invoice.created_at.desc(), Invoice.id.desc())
+    if limit is None and cursor is None:
+        invoices = query.all()
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        # Fetch one extra row to know whether another page follows
+        invoices = query.limit(limit + 1).all()
+    if limit is not None and len(invoices) > limit:
+        invoices = invoices[:limit]
+        last = invoices[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+
+    if not include_items:
+        return [InvoiceSummaryResponse.model_validate(invoice) for invoice in invoices]
+    return invoices
 
 @router.post("/{invoice_id}/issue", response_model=InvoiceResponse)
 def issue_invoice(
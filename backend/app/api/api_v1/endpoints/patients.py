@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, File, HTTPException, status, Query, Response, UploadFile
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.db.session import get_db
 from app.models.patient import Patient
+from app.models.patient_import import PatientImport, PatientImportError
 from app.models.staff import Staff
-from app.schemas.patient import PatientCreate, PatientResponse, PatientUpdate
+from app.schemas.patient import PatientCreate, PatientImportResponse, PatientResponse, PatientSuggestion, PatientUpdate
 from app.api.api_v1.endpoints.auth import get_current_staff
+from app.services import patient_search
+from app.services.patient_typeahead import MAX_SUGGESTIONS, patient_typeahead
+from app.services.patient_import import FORMATS, patient_importer, start_import
+import csv
+import io
+import os
+import shutil
+import tempfile
 import uuid
 
 router = APIRouter()
@@ -20,8 +29,117 @@ def create_patient(
     db.add(db_patient)
     db.commit()
     db.refresh(db_patient)
+    patient_typeahead.add([db_patient])
     return db_patient
 
+_IMPORT_SUFFIXES = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "ndjson"}
+
+@router.post("/import", response_model=PatientImportResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_patients(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON; fields name, email, phone, dob"),
+    format: Optional[str] = Query(None, description="csv or ndjson (default: from the file name)"),
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Start a bulk import of patients; it runs in the background.
+
+    Poll GET /patients/import/{id} for progress and fetch the rows that were
+    not imported from GET /patients/import/{id}/errors.
+    """
+    if current_staff.role not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions to import patients")
+    suffix = ("." + file.filename.rsplit(".", 1)[-1].lower()) if file.filename and "." in file.filename else ""
+    fmt = format or _IMPORT_SUFFIXES.get(suffix)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be csv or ndjson")
+
+    # The upload is gone when this request ends, so the background import reads its own copy;
+    # once submitted the importer deletes it, until then it is ours to clean up
+    with tempfile.NamedTemporaryFile(prefix="patient-import-", suffix=suffix, delete=False) as copy:
+        try:
+            shutil.copyfileobj(file.file, copy, 1 << 20)
+        except BaseException:
+            copy.close()
+            os.unlink(copy.name)
+            raise
+    try:
+        run = start_import(db, source=file.filename or "upload", fmt=fmt, staff_id=current_staff.id)
+        patient_importer.submit(run.id, copy.name)
+    except BaseException:
+        os.unlink(copy.name)
+        raise
+    return run
+
+def _get_import(db: Session, import_id: str) -> PatientImport:
+    try:
+        run = db.get(PatientImport, uuid.UUID(import_id))
+    except ValueError:
+        run = None
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import not found")
+    return run
+
+@router.get("/import/{import_id}", response_model=PatientImportResponse)
+def get_patient_import(
+    import_id: str,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    run = _get_import(db, import_id)
+    # A running import commits its counters from another session
+    db.refresh(run)
+    return run
+
+@router.get("/import/{import_id}/errors")
+def get_patient_import_errors(
+    import_id: str,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """The rows of an import that were not imported, as CSV in file order.
+
+    Imports keep at most MAX_REPORTED_ERRORS report rows, so the report is built in memory.
+    """
+    run = _get_import(db, import_id)
+    errors = (
+        db.query(PatientImportError)
+        .filter(PatientImportError.import_id == run.id)
+        .order_by(PatientImportError.row, PatientImportError.id)
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["row", "issue", "field", "message", "value", "existing_patient_id"])
+    for error in errors:
+        writer.writerow([error.row, error.issue.value, error.field or "", error.message, error.value or "", error.existing_patient_id or ""])
+    return Response(
+        buffer.getvalue(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="patient-import-{run.id}-errors.csv"'},
+    )
+
+@router.get("/suggest", response_model=List[PatientSuggestion])
+def suggest_patients(
+    response: Response,
+    q: str = Query(..., min_length=1, description="What has been typed so far: name, email or phone"),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Patient picker suggestions, answered from the in-memory prefix index.
+
+    Falls back to the database search while the index is being built or when
+    it is disabled; the X-Suggest-Source header says which one answered.
+    """
+    suggestions = patient_typeahead.suggest(q, limit=limit)
+    if suggestions is not None:
+        response.headers["X-Suggest-Source"] = "memory"
+        return [
+            PatientSuggestion(id=patient_id, name=name, email=email, phone=phone)
+            for patient_id, name, email, phone in suggestions
+        ]
+    response.headers["X-Suggest-Source"] = "database"
+    return [patient for patient, _ in patient_search.search_patients(db, q, limit=limit)]
+
 @router.get("/{patient_id}", response_model=PatientResponse)
 def get_patient(
     patient_id: str,
@@ -47,19 +165,20 @@ def get_patient(
 @router.get("/", response_model=List[PatientResponse])
 def search_patients(
     query: Optional[str] = Query(None, description="Search by name, email, or phone"),
+    limit: int = Query(20, ge=1, le=100, description="Page size when searching"),
+    offset: int = Query(0, ge=0, le=1000),
     db: Session = Depends(get_db),
     current_staff: Staff = Depends(get_current_staff)
 ):
-    patients_query = db.query(Patient)
-    
+    """All patients, or with ``query`` the best matches first, ``limit`` at a time.
+
+    Every word of the query has to occur in the patient's name, email or
+    phone (see app.services.patient_search).
+    """
     if query:
-        patients_query = patients_query.filter(
-            Patient.name.ilike(f"%{query}%") |
-            Patient.email.ilike(f"%{query}%") |
-            Patient.phone.ilike(f"%{query}%")
-        )
-    
-    return patients_query.all()
+        return [patient for patient, _ in patient_search.search_patients(db, query, limit=limit, offset=offset)]
+
+    return db.query(Patient).all()
 
 @router.put("/{patient_id}", response_model=PatientResponse)
 def update_patient(
@@ -89,6 +208,7 @@ def update_patient(
     
     db.commit()
     db.refresh(patient)
+    patient_typeahead.add([patient])
     return patient
 
 
@@ -116,4 +236,5 @@ def delete_patient(
     # Simple delete; if invoices exist you'd normally soft-delete or prevent deletion
     db.delete(patient)
     db.commit()
+    patient_typeahead.remove([patient_uuid])
     return {"detail": "Patient deleted"}
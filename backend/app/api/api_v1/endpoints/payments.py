@@ -1,131 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Body, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
+import asyncio
 import stripe
 import uuid
+import json
 from datetime import datetime
 from app.db.session import get_db
 from app.models.invoice import Invoice, InvoiceStatus
+from app.models.patient import Patient
 from app.models.payment import Payment, PaymentStatus
+from app.models.payment_link_run import PaymentLinkResult, PaymentLinkRun
 from app.models.staff import Staff
 from app.schemas.payment import PaymentResponse, PaymentCreate
-from app.schemas.payment import PaymentListItem
-from app.models.patient import Patient
+from app.schemas.payment import PaymentListItem, BulkPaymentLinkRequest, BulkPaymentCreate
+from app.schemas.payment import PaymentLinkResultResponse, PaymentLinkRunResponse
 from app.api.api_v1.endpoints.auth import get_current_staff
 from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor
 from app.services.audit_service import create_audit_log
-from app.services.mailer import get_mailer
+from app.services.invoice_balance import apply_payment
+from app.services.stripe_gateway import (
+    CheckoutSession,
+    StripeGateway,
+    StripeUnavailable,
+    checkout_session_fields,
+    get_or_create_checkout_session,
+    get_stripe_gateway,
+    invoice_checkout_amount,
+)
+from app.services.bulk_payment_links import payment_link_dispatcher, select_invoice_ids, start_payment_link_run
+from app.services.bulk_manual_payments import MAX_BULK_PAYMENTS, post_manual_payments
+from app.services.email_outbox import email_outbox, enqueue_email
+from app.services.email_templates import payment_link_email
+from app.services.payment_waiters import payment_waiters
+from app.services.webhook_inbox import record_event, webhook_inbox
 import logging
 
 router = APIRouter()
 
-# Configure Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
-# Ensure stripe api key from settings is applied at runtime if present
-if not getattr(stripe, "api_key", None):
-    stripe.api_key = getattr(settings, "STRIPE_SECRET_KEY", None)
-
-# Ensure Stripe module is properly loaded
-def _ensure_stripe_loaded():
-    """Ensure Stripe module is properly loaded and configured"""
-    import stripe
-    if not stripe.api_key:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-    if not stripe.checkout:
-        import stripe.checkout
-    return stripe.checkout and hasattr(stripe.checkout, 'Session')
-
-
-def _create_checkout_session(invoice, request: Request = None):
-    """Create a Stripe Checkout Session or return a fake session when Stripe isn't configured.
-    If request is provided we prefer building a backend absolute URL for local checkout pages.
-    """
-    print("_create_checkout_session called")
-    # ensure runtime stripe key from settings if available
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-
-    print(f"Stripe API Key: {stripe.api_key}")
-    print(invoice.invoice_number, invoice.total_amount_cents, invoice.currency)
-
-    # Check if Stripe API key is properly set
-    if not stripe.api_key or stripe.api_key == "":
-        print("Stripe API key is not set, falling back to fake session")
-        # Fallback fake session (local dev/test)
-        class _FakeSession:
-            def __init__(self, id, url):
-                self.id = id
-                self.url = url
-
-        fake_id = f"local_cs_{uuid.uuid4().hex}"
-
-        # Build backend-local URL using request.url_for when available, else use configured origin
-        if request is not None:
-            try:
-                print("Creating local checkout URL using request.url_for")
-                fake_url = str(request.url_for("local_checkout_page", session_id=fake_id))
-            except Exception:
-                print("Failed to use request.url_for, falling back to CORS_ORIGINS")
-                base = settings.CORS_ORIGINS[0].rstrip('/')
-                fake_url = f"{base}/api/v1/payments/local-checkout/{fake_id}"
-        else:
-            print("Creating local checkout URL using CORS_ORIGINS")
-            base = settings.CORS_ORIGINS[0].rstrip('/')
-            fake_url = f"{base}/api/v1/payments/local-checkout/{fake_id}"
-
-        return _FakeSession(fake_id, fake_url)
-
-    # Real Stripe (when SDK and API key available)
-    if _ensure_stripe_loaded() and stripe.api_key:
-        print("Creating real Stripe Checkout Session")
-        return stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': (invoice.currency or "USD").lower(),
-                    'product_data': {
-                        'name': f'Invoice {invoice.invoice_number}',
-                        'description': f'Payment for invoice {invoice.invoice_number}',
-                    },
-                    'unit_amount': int(invoice.total_amount_cents or 0),
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/success?session_id={{CHECKOUT_SESSION_ID}}',
-            cancel_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/cancelled',
-            metadata={
-                'invoice_id': str(invoice.id),
-                'clinic_id': getattr(settings, "CLINIC_ID", str(invoice.invoice_number))
-            }
-        )
-
-    print("Stripe not configured, creating fake session")
-    # Fallback fake session (local dev/test)
-    class _FakeSession:
-        def __init__(self, id, url):
-            self.id = id
-            self.url = url
-
-    fake_id = f"local_cs_{uuid.uuid4().hex}"
+def _local_checkout_base(request: Request = None) -> Optional[str]:
+    """Backend URL of the local checkout pages, used by the fake Stripe gateway."""
+    if request is None:
+        return None
+    try:
+        return str(request.url_for("local_checkout_page", session_id="_")).rsplit("/", 1)[0]
+    except Exception:
+        return None
 
-    # Build backend-local URL using request.url_for when available, else use configured origin
-    if request is not None:
-        try:
-            print("Creating local checkout URL using request.url_for")
-            fake_url = str(request.url_for("local_checkout_page", session_id=fake_id))
-        except Exception:
-            print("Failed to use request.url_for, falling back to CORS_ORIGINS")
-            base = settings.CORS_ORIGINS[0].rstrip('/')
-            fake_url = f"{base}/api/v1/payments/local-checkout/{fake_id}"
-    else:
-        print("Creating local checkout URL using CORS_ORIGINS")
-        base = settings.CORS_ORIGINS[0].rstrip('/')
-        fake_url = f"{base}/api/v1/payments/local-checkout/{fake_id}"
 
-    return _FakeSession(fake_id, fake_url)
+def _checkout_session_for(invoice: Invoice, request: Request, gateway: StripeGateway) -> CheckoutSession:
+    """Return the invoice's still-valid checkout session or create one and store it on the invoice (no commit)."""
+    checkout_session, created = get_or_create_checkout_session(gateway, invoice, _local_checkout_base(request))
+    if created:
+        for column, value in checkout_session_fields(checkout_session, invoice_checkout_amount(invoice)).items():
+            setattr(invoice, column, value)
+    return checkout_session
 
 
 @router.post("/invoices/{invoice_id}/create-payment-link")
@@ -133,7 +66,8 @@ def create_payment_link(
     invoice_id: str,
     request: Request,
     db: Session = Depends(get_db),
-    current_staff: Staff = Depends(get_current_staff)
+    current_staff: Staff = Depends(get_current_staff),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
 ):
     # Ensure invoice_id is a UUID for DB lookup
     try:
@@ -155,16 +89,16 @@ def create_payment_link(
         )
     
     try:
-        # Create Stripe Checkout Session (or fake one in test/dev env)
-        checkout_session = _create_checkout_session(invoice, request)
-
-        invoice.stripe_checkout_session_id = checkout_session.id
+        # Reuse the stored Stripe Checkout Session or create one (fake one in test/dev env)
+        checkout_session = _checkout_session_for(invoice, request, gateway)
         db.commit()
 
         return {
             "checkout_url": checkout_session.url,
             "session_id": checkout_session.id
         }
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -176,7 +110,8 @@ def create_payment_link(
 def create_payment_link_public(
     invoice_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
 ):
     """Public endpoint for patients to create payment links without authentication"""
     # Ensure invoice_id is a UUID for DB lookup
@@ -201,24 +136,17 @@ def create_payment_link_public(
         )
     
     try:
-        # Create Stripe Checkout Session (or fake one in test/dev env)
-        print("Create Stripe Checkout Session 1")
-        checkout_session = _create_checkout_session(invoice, request)
-        print("Create Stripe Checkout Session 2")
-        invoice.stripe_checkout_session_id = checkout_session.id
-        print("Create Stripe Checkout Session 3 : "+invoice.stripe_checkout_session_id)
+        # Reuse the stored Stripe Checkout Session or create one (fake one in test/dev env)
+        checkout_session = _checkout_session_for(invoice, request, gateway)
         db.commit()
-        print("Create Stripe Checkout Session 4")
         return {
             "checkout_url": checkout_session.url,
             "session_id": checkout_session.id
         }
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logging.error(f"Stripe session creation failed: {str(e)}")
-        logging.error(f"Settings STRIPE_SECRET_KEY present: {bool(settings.STRIPE_SECRET_KEY)}")
-        logging.error(f"CORS_ORIGINS[0]: {settings.CORS_ORIGINS[0]}")
-        print(f"Settings STRIPE_SECRET_KEY present: {bool(settings.STRIPE_SECRET_KEY)}")
-        print(f"CORS_ORIGINS[0]: {settings.CORS_ORIGINS[0]}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Stripe/create session error: {str(e)}"
@@ -231,9 +159,10 @@ def send_payment_link(
     request: Request,
     email: Optional[str] = Body(None, embed=True),
     db: Session = Depends(get_db),
-    current_staff: Staff = Depends(get_current_staff)
+    current_staff: Staff = Depends(get_current_staff),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
 ):
-    """Issue invoice if needed, create a Stripe payment link and (mock) send it to the provided email.
+    """Issue invoice if needed, create a Stripe payment link and queue an email with it to the provided email.
     For now if email is not provided we'll use a hardcoded address per requirements.
     """
     try:
@@ -245,185 +174,117 @@ def send_payment_link(
     if not invoice:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invoice not found")
 
-    # Issue invoice if it's still draft
+    # Issue invoice if it's still draft (committed together with the queued email below)
     if invoice.status == InvoiceStatus.DRAFT:
         invoice.status = InvoiceStatus.ISSUED
         invoice.issued_at = datetime.utcnow()
-        db.commit()
-        db.refresh(invoice)
 
     try:
-        checkout_session = _create_checkout_session(invoice, request)
+        checkout_session = _checkout_session_for(invoice, request, gateway)
 
-        # persist the checkout session id
-        invoice.stripe_checkout_session_id = checkout_session.id
-        db.commit()
-
-        # Send email via configured mailer (console by default in dev/test)
+        # persist the checkout session and queue the email in the same
+        # transaction; the email outbox workers deliver it in the background
         send_to = email or 'naeem.akhtar@f3technologies.eu'
-        mailer = get_mailer()
-
-        send_fn = getattr(mailer, "send_email", None)
-        if send_fn is None:
-            raise RuntimeError("Mailer has no send_email method")
-
-        try:
-            # Create HTML email content
-            amount_display = f"{(invoice.total_amount_cents or 0) / 100:.2f}"
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Payment Request - Invoice {invoice.invoice_number}</title>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .header {{
-                        background-color: #f8f9fa;
-                        padding: 20px;
-                        border-radius: 8px;
-                        margin-bottom: 20px;
-                    }}
-                    .invoice-details {{
-                        background-color: #ffffff;
-                        border: 1px solid #dee2e6;
-                        border-radius: 8px;
-                        padding: 20px;
-                        margin-bottom: 20px;
-                    }}
-                    .payment-button {{
-                        display: inline-block;
-                        background-color: #007bff;
-                        color: white;
-                        padding: 15px 30px;
-                        text-decoration: none;
-                        border-radius: 5px;
-                        font-weight: bold;
-                        font-size: 16px;
-                        margin: 20px 0;
-                        text-align: center;
-                    }}
-                    .payment-button:hover {{
-                        background-color: #0056b3;
-                    }}
-                    .footer {{
-                        margin-top: 30px;
-                        padding-top: 20px;
-                        border-top: 1px solid #dee2e6;
-                        font-size: 14px;
-                        color: #6c757d;
-                    }}
-                    .amount {{
-                        font-size: 24px;
-                        font-weight: bold;
-                        color: #28a745;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <h1>Payment Request</h1>
-                    <p>You have an outstanding invoice that requires payment.</p>
-                </div>
-                
-                <div class="invoice-details">
-                    <h2>Invoice Details</h2>
-                    <p><strong>Invoice Number:</strong> {invoice.invoice_number}</p>
-                    <p><strong>Amount Due:</strong> <span class="amount">${amount_display} {invoice.currency}</span></p>
-                    <p><strong>Due Date:</strong> {invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'Not specified'}</p>
-                </div>
-                
-                <div style="text-align: center;">
-                    <a href="{checkout_session.url}" class="payment-button" target="_blank">
-                        Complete Payment
-                    </a>
-                </div>
-                
-                <p>Click the button above to securely complete your payment. You will be redirected to our secure payment processor.</p>
-                
-                <p>If the button doesn't work, you can copy and paste this link into your browser:</p>
-                <p style="word-break: break-all; background-color: #f8f9fa; padding: 10px; border-radius: 4px;">
-                    {checkout_session.url}
-                </p>
-                
-                <div class="footer">
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                    <p>If you have any questions about this invoice, please contact our billing department.</p>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Plain text version for email clients that don't support HTML
-            plain_body = f"""
-Payment Request - Invoice {invoice.invoice_number}
-
-You have an outstanding invoice that requires payment.
-
-Invoice Details:
-- Invoice Number: {invoice.invoice_number}
-- Amount Due: ${amount_display} {invoice.currency}
-- Due Date: {invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'Not specified'}
-
-To complete your payment, please visit:
-{checkout_session.url}
-
-This is an automated message. Please do not reply to this email.
-If you have any questions about this invoice, please contact our billing department.
-            """
-            
-            # Send email using the configured mailer
-            send_fn(
-                to=send_to,
-                subject=f'Payment Request - Invoice {invoice.invoice_number}',
-                body=plain_body,
-                html_body=html_body,
-                from_address=settings.EMAIL_FROM_ADDRESS
-            )
-            
-
-            # persist a record that we sent the email and commit
-            if hasattr(invoice, "email_sent_to"):
-                invoice.email_sent_to = send_to
-            if hasattr(invoice, "email_sent_at"):
-                invoice.email_sent_at = datetime.utcnow()
-            # optional debug field if present
-            if hasattr(invoice, "ERROR"):
-                invoice.ERROR = f"Sent email to {send_to}"
-            db.commit()
-
-        except Exception as e:
-            logging.exception("[MAILER ERROR] Could not send email")
-            if hasattr(invoice, "ERROR"):
-                invoice.ERROR = f"[MAILER ERROR] Could not send email to {send_to}: {e}"
-            try:
-                db.commit()
-            except Exception:
-                logging.exception("Failed to commit invoice error state")
-
-            return {
-                "checkout_url": checkout_session.url,
-                "session_id": checkout_session.id,
-                "sent_to": send_to,
-                "mail_error": str(e)
-            }
+        subject, plain_body, html_body = payment_link_email(invoice, checkout_session.url)
+        message = enqueue_email(
+            db,
+            to=send_to,
+            subject=subject,
+            body=plain_body,
+            html_body=html_body,
+            from_address=settings.EMAIL_FROM_ADDRESS,
+            related_type="invoice",
+            related_id=str(invoice.id),
+        )
+        db.commit()
+        email_outbox.wake()
 
         return {
             "checkout_url": checkout_session.url,
             "session_id": checkout_session.id,
-            "sent_to": send_to
+            "sent_to": send_to,
+            "email_id": message.id,
+            "email_status": message.status.value
         }
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to send email: {e}")
 
+@router.post(
+    "/invoices/bulk-send-payment-links",
+    response_model=PaymentLinkRunResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def bulk_send_payment_links(
+    payload: BulkPaymentLinkRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
+):
+    """Issue invoices, create payment links and queue emails for many invoices; runs in the background.
+
+    Poll GET /payments/invoices/bulk-send-payment-links/{id} for progress and
+    the per-invoice results (sent, failed or skipped). Emails go to each
+    patient's address through the email outbox.
+    """
+    if current_staff.role not in ["admin", "billing_clerk"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions to send payment links")
+
+    if not (payload.invoice_ids or payload.status or payload.patient_id or payload.due_date_from or payload.due_date_to):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide invoice_ids or a filter")
+
+    try:
+        invoice_ids = select_invoice_ids(
+            db,
+            invoice_ids=payload.invoice_ids,
+            status=payload.status,
+            patient_id=payload.patient_id,
+            due_date_from=payload.due_date_from,
+            due_date_to=payload.due_date_to,
+        )
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid invoice or patient id")
+
+    run = start_payment_link_run(db, total=len(invoice_ids), staff_id=getattr(current_staff, 'id', None))
+    local_checkout_base = _local_checkout_base(request)
+    payment_link_dispatcher.submit(
+        run.id,
+        invoice_ids,
+        create_session=lambda invoice: get_or_create_checkout_session(gateway, invoice, local_checkout_base)[0],
+        concurrency=min(max(payload.concurrency, 1), 32),
+        wake=email_outbox.wake,
+    )
+    return run
+
+@router.get("/invoices/bulk-send-payment-links/{run_id}", response_model=PaymentLinkRunResponse)
+def get_payment_link_run(
+    run_id: str,
+    include_results: bool = Query(True, description="Set to false to poll the counters only"),
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Progress of a bulk payment-link dispatch and, by default, its per-invoice results."""
+    try:
+        run = db.get(PaymentLinkRun, uuid.UUID(run_id))
+    except ValueError:
+        run = None
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment-link run not found")
+    # The dispatch commits from another session
+    db.refresh(run)
+    response = PaymentLinkRunResponse.model_validate(run)
+    if include_results:
+        results = (
+            db.query(PaymentLinkResult)
+            .filter(PaymentLinkResult.run_id == run.id)
+            .order_by(PaymentLinkResult.id)
+            .all()
+        )
+        response.results = [PaymentLinkResultResponse.model_validate(result) for result in results]
+    return response
+
 @router.get("/invoices/{invoice_id}/payments", response_model=List[PaymentResponse])
 def get_invoice_payments(
     invoice_id: str,
@@ -442,7 +303,13 @@ def get_invoice_payments(
             detail="Invoice not found"
         )
     
-    payments = db.query(Payment).filter(Payment.invoice_id == invoice_uuid).all()
+    # The response includes raw_event, so load the payload side rows in one query
+    payments = (
+        db.query(Payment)
+        .options(selectinload(Payment.raw_event_record))
+        .filter(Payment.invoice_id == invoice_uuid)
+        .all()
+    )
     return payments
 
 
@@ -491,20 +358,12 @@ def create_payment(
 
     db.add(payment)
 
-    # Compute total paid and update invoice status
-    db.flush()
-    total_paid = db.query(func.coalesce(func.sum(Payment.amount_cents), 0)).filter(
-        Payment.invoice_id == invoice_uuid,
-        Payment.status == PaymentStatus.SUCCEEDED
-    ).scalar() or 0
-
-    if total_paid >= invoice.total_amount_cents:
-        invoice.status = InvoiceStatus.PAID
-    elif total_paid > 0:
-        invoice.status = InvoiceStatus.PARTIALLY_PAID
+    # Update the invoice's paid balance and status in the same transaction
+    apply_payment(db, invoice, payment.amount_cents, payload.received_at)
 
     db.commit()
     db.refresh(payment)
+    payment_waiters.notify(invoice.id)
 
     # Build JSON-serializable response (convert UUIDs to strings)
     response = {
@@ -544,16 +403,60 @@ def create_payment(
     return response
 
 
+@router.post("/bulk")
+def create_payments_bulk(
+    payload: BulkPaymentCreate,
+    db: Session = Depends(get_db),
+    current_staff: Staff = Depends(get_current_staff)
+):
+    """Post a batch of manual payments (e.g. end-of-day cash) in one transaction.
+
+    Returns one result per row in input order; invalid rows carry an error and
+    are not posted (with all_or_nothing, nothing is posted if any row is invalid).
+    """
+    if current_staff.role not in ["admin", "billing_clerk"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions to create payments")
+    if not payload.payments:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No payments given")
+    if len(payload.payments) > MAX_BULK_PAYMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_PAYMENTS} payments per request"
+        )
+
+    outcome = post_manual_payments(
+        db,
+        payload.payments,
+        actor_id=getattr(current_staff, 'id', None),
+        all_or_nothing=payload.all_or_nothing,
+    )
+    payment_waiters.notify(*(item["invoice_id"] for item in outcome.invoices))
+    return outcome.as_dict()
+
+
 @router.get("/", response_model=List[PaymentListItem])
 def list_payments(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     status: str = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_staff: Staff = Depends(get_current_staff)
 ):
-    # Build base query joining invoices and patients
-    query = db.query(Payment, Invoice, Patient).join(Invoice, Payment.invoice_id == Invoice.id).join(Patient, Invoice.patient_id == Patient.id)
+    """List payments, newest first.
+
+    Pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page; pages are keyset-paginated on (received_at, id) so deep pages
+    cost the same as the first. ``skip`` is only honoured without a cursor.
+    """
+    # Joined on the invoice and patient themselves: a payment whose invoice_summary
+    # row is missing or stale must still be listed
+    query = (
+        db.query(Payment, Invoice.invoice_number, Patient.id, Patient.name, Patient.email)
+        .join(Invoice, Payment.invoice_id == Invoice.id)
+        .join(Patient, Invoice.patient_id == Patient.id)
+    )
 
     if status:
         try:
@@ -562,17 +465,31 @@ def list_payments(
         except Exception:
             pass
 
-    results = query.order_by(Payment.received_at.desc()).offset(skip).limit(limit).all()
+    if cursor:
+        try:
+            after_received_at, after_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(Payment.received_at, Payment.id) < (after_received_at, after_id))
+    elif skip:
+        query = query.offset(skip)
+
+    # Fetch one extra row to know whether another page follows
+    results = query.order_by(Payment.received_at.desc(), Payment.id.desc()).limit(limit + 1).all()
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1][0]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.received_at, last.id)
 
     items = []
-    for payment, invoice, patient in results:
+    for payment, invoice_number, patient_id, patient_name, patient_email in results:
         items.append({
             'id': str(payment.id),
             'invoice_id': str(payment.invoice_id),
-            'invoice_number': invoice.invoice_number,
-            'patient_id': str(patient.id),
-            'patient_name': patient.name,
-            'patient_email': patient.email,
+            'invoice_number': invoice_number,
+            'patient_id': str(patient_id),
+            'patient_name': patient_name,
+            'patient_email': patient_email,
             'stripe_payment_id': payment.stripe_payment_id,
             'amount_cents': payment.amount_cents,
             'currency': payment.currency,
@@ -586,7 +503,8 @@ def list_payments(
 def refund_payment(
     payment_id: str,
     db: Session = Depends(get_db),
-    current_staff: Staff = Depends(get_current_staff)
+    current_staff: Staff = Depends(get_current_staff),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
 ):
     # Only admin can process refunds
     if current_staff.role not in ["admin"]:
@@ -615,13 +533,12 @@ def refund_payment(
     
     try:
         # Process refund through Stripe
-        refund = stripe.Refund.create(
-            payment_intent=payment.stripe_payment_id,
-            reason='requested_by_customer'
-        )
+        refund = gateway.create_refund(payment.stripe_payment_id, amount=payment.amount_cents)
         
-        # Update payment status
+        # Update payment status and take it off the invoice's paid balance
         payment.status = PaymentStatus.REFUNDED
+        if payment.invoice:
+            apply_payment(db, payment.invoice, -payment.amount_cents)
         db.commit()
         # Audit log for refund
         try:
@@ -645,6 +562,8 @@ def refund_payment(
             "amount": refund.amount
         }
         
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -652,86 +571,27 @@ def refund_payment(
         )
 
 @router.post("/webhooks/stripe")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(
+    request: Request,
+    db: Session = Depends(get_db),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
+):
     """Handle Stripe webhooks for payment events"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-        )
+        gateway.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
     
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        invoice_id = session.get('metadata', {}).get('invoice_id')
+    # Store the verified delivery and ack right away; the webhook inbox
+    # workers apply it in the background (see app.services.webhook_inbox)
+    await run_in_threadpool(record_event, db, json.loads(payload))
+    webhook_inbox.wake()
 
-        if invoice_id:
-            # convert invoice_id to UUID for DB queries
-            try:
-                invoice_uuid = uuid.UUID(str(invoice_id))
-            except Exception:
-                invoice_uuid = None
-
-            # Check if payment already exists (idempotency)
-            existing_payment = db.query(Payment).filter(
-                Payment.stripe_payment_id == session.get('payment_intent')
-            ).first()
-
-            if not existing_payment:
-                # Verify invoice exists and that the session id matches the stored checkout session
-                invoice = None
-                if invoice_uuid:
-                    invoice = db.query(Invoice).filter(Invoice.id == invoice_uuid).first()
-
-                # If invoice exists and a checkout session id was stored, ensure it matches the incoming session id
-                incoming_session_id = session.get('id')
-                if invoice and invoice.stripe_checkout_session_id and incoming_session_id and invoice.stripe_checkout_session_id != incoming_session_id:
-                    # Mismatch: ignore this webhook to avoid marking the wrong invoice paid
-                    print(f"[WEBHOOK] Ignoring checkout.session.completed for session {incoming_session_id} because it does not match invoice {invoice.invoice_number} stored session {invoice.stripe_checkout_session_id}")
-                else:
-                    # Create payment record
-                    payment = Payment(
-                        invoice_id=invoice_uuid or None,
-                        stripe_payment_id=session.get('payment_intent'),
-                        amount_cents=session.get('amount_total'),
-                        currency=session.get('currency', '').upper(),
-                        status=PaymentStatus.SUCCEEDED,
-                        raw_event=event
-                    )
-                    db.add(payment)
-
-                    # Update invoice status when possible
-                    if invoice:
-                        invoice.status = InvoiceStatus.PAID
-
-                    db.commit()
-
-                    # Create an audit entry for the automatic Stripe payment
-                    try:
-                        create_audit_log(
-                            db,
-                            actor_id=None,
-                            actor_type='stripe',
-                            action='checkout_completed',
-                            target_type='payment',
-                            target_id=str(payment.id),
-                            details={
-                                'invoice_id': str(invoice.id) if invoice else None,
-                                'session_id': incoming_session_id,
-                                'payment_intent': session.get('payment_intent')
-                            }
-                        )
-                    except Exception as e:
-                        print('[AUDIT ERROR] failed to create audit log for stripe webhook payment:', e)
-                        import traceback
-                        traceback.print_exc()
-    
     return {"status": "success"}
 
 @router.get("/local-checkout/{session_id}", response_class=HTMLResponse)
@@ -773,7 +633,12 @@ def local_checkout_page(session_id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/local-checkout/{session_id}/start")
-def local_checkout_start(session_id: str, request: Request, db: Session = Depends(get_db)):
+def local_checkout_start(
+    session_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
+):
     """
     Start a Stripe Checkout flow for the local session id when Stripe is configured.
     Falls back to the local completion behavior if Stripe is not configured or session creation fails.
@@ -795,9 +660,10 @@ def local_checkout_start(session_id: str, request: Request, db: Session = Depend
                 raw_event={"local_checkout": True, "session_id": session_id, "invoice_id": str(invoice.id)}
             )
             db.add(payment)
-            invoice.status = InvoiceStatus.PAID
+            apply_payment(db, invoice, payment.amount_cents)
             db.commit()
             db.refresh(payment)
+            payment_waiters.notify(invoice.id, session_id)
 
             try:
                 create_audit_log(
@@ -825,42 +691,28 @@ def local_checkout_start(session_id: str, request: Request, db: Session = Depend
         success_url = f"{settings.CORS_ORIGINS[0]}/patient/payment/success?session_id={session_id}"
         return RedirectResponse(url=success_url, status_code=303)
 
-    # Verify Stripe is configured (API key present) and SDK exposes checkout.Session
-    if not (getattr(stripe, "api_key", None) and stripe.api_key):
+    if not gateway.is_real:
         # Stripe not configured -> simulate
         logging.info("Stripe not configured, falling back to local simulation for session %s", session_id)
         return _simulate_and_redirect()
 
     # Try to create a real Stripe Checkout Session and redirect the browser to it
     try:
-        # Ensure Stripe is properly initialized
-        if not _ensure_stripe_loaded():
-            raise Exception("Stripe checkout module not properly loaded")
-        
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': (invoice.currency or "USD").lower(),
-                    'product_data': {
-                        'name': f'Invoice {invoice.invoice_number}',
-                        'description': f'Payment for invoice {invoice.invoice_number}',
-                    },
-                    'unit_amount': int(invoice.total_amount_cents or 0),
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/success?session_id={{CHECKOUT_SESSION_ID}}',
-            cancel_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/cancelled',
+        amount = invoice_checkout_amount(invoice)
+        checkout_session = gateway.create_checkout_session(
+            invoice,
+            amount_cents=amount,
             metadata={
                 'invoice_id': str(invoice.id),
                 'local_session_id': session_id
-            }
+            },
+            success_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/success?session_id={{CHECKOUT_SESSION_ID}}',
+            cancel_url=f'{settings.CORS_ORIGINS[0]}/patient/payment/cancelled',
         )
 
         # Persist Stripe session id so webhook can verify
-        invoice.stripe_checkout_session_id = checkout_session.id
+        for column, value in checkout_session_fields(checkout_session, amount).items():
+            setattr(invoice, column, value)
         db.commit()
 
         # Redirect browser to Stripe-hosted checkout page
@@ -875,7 +727,8 @@ def local_checkout_start(session_id: str, request: Request, db: Session = Depend
 @router.post("/verify-payment-success")
 def verify_payment_success(
     session_id: str = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    gateway: StripeGateway = Depends(get_stripe_gateway)
 ):
     """
     Verify Stripe payment session and process payment if successful.
@@ -883,7 +736,7 @@ def verify_payment_success(
     """
     try:
         # Retrieve the Stripe session
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = gateway.retrieve_checkout_session(session_id)
         
         # Check if payment was successful
         if session.payment_status != 'paid':
@@ -938,14 +791,15 @@ def verify_payment_success(
             amount_cents=session.amount_total,
             currency=session.currency.upper(),
             status=PaymentStatus.SUCCEEDED,
-            raw_event=session
+            raw_event=session.raw
         )
         db.add(payment)
         
-        # Update invoice status to paid
-        invoice.status = InvoiceStatus.PAID
+        # Update invoice balance and status
+        apply_payment(db, invoice, payment.amount_cents)
         db.commit()
         db.refresh(payment)
+        payment_waiters.notify(invoice.id, session_id)
         
         # Create audit log
         try:
@@ -975,6 +829,8 @@ def verify_payment_success(
             "currency": payment.currency
         }
         
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except stripe.error.StripeError as e:
         logging.exception("Stripe error during payment verification: %s", e)
         raise HTTPException(
@@ -986,4 +842,69 @@ def verify_payment_success(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during payment verification"
-        )
\ No newline at end of file
+        )
+
+
+def _payment_wait_state(db: Session, invoice_id: Optional[str], session_id: Optional[str]) -> Optional[dict]:
+    query = db.query(
+        Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.currency, Invoice.paid_cents, Invoice.balance_cents
+    )
+    if invoice_id:
+        try:
+            query = query.filter(Invoice.id == uuid.UUID(str(invoice_id)))
+        except ValueError:
+            return None
+    else:
+        query = query.filter(Invoice.stripe_checkout_session_id == session_id)
+    row = query.first()
+    # End the transaction so no connection is held while the request is parked
+    db.rollback()
+    if row is None:
+        return None
+    return {
+        "status": "paid" if row.status == InvoiceStatus.PAID else "pending",
+        "invoice_id": str(row.id),
+        "invoice_number": row.invoice_number,
+        "invoice_status": row.status.value,
+        "amount_paid": (row.paid_cents or 0) / 100,
+        "balance_due": (row.balance_cents or 0) / 100,
+        "currency": row.currency,
+    }
+
+
+@router.get("/wait")
+async def wait_for_payment(
+    invoice_id: Optional[str] = Query(None),
+    session_id: Optional[str] = Query(None),
+    timeout: float = Query(25, ge=0, description="Seconds to wait for the payment (capped at PAYMENT_WAIT_MAX_SECONDS)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Long-poll for a checkout payment, replacing repeated verify-payment-success calls.
+    Answers at once if the invoice is already paid; otherwise the request is parked
+    until the webhook, local checkout or verification path records the payment, or
+    until the timeout, when it answers with status "pending" and the client asks again.
+    """
+    if not invoice_id and not session_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invoice_id or session_id is required")
+
+    keys = [key for key in (invoice_id, session_id) if key]
+    # Register before the first read so a payment recorded in between still wakes us
+    waiter = payment_waiters.register(keys)
+    try:
+        state = await run_in_threadpool(_payment_wait_state, db, invoice_id, session_id)
+        if state is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invoice not found")
+        if state["status"] == "paid":
+            return state
+        # Waiting on the invoice id too means a session id lookup is woken by any payment path
+        if state["invoice_id"] not in keys:
+            keys.append(state["invoice_id"])
+            payment_waiters.register([state["invoice_id"]], waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), min(timeout, settings.PAYMENT_WAIT_MAX_SECONDS))
+        except asyncio.TimeoutError:
+            return state
+        return await run_in_threadpool(_payment_wait_state, db, state["invoice_id"], None)
+    finally:
+        payment_waiters.unregister(keys, waiter)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
@@ -23,13 +23,18 @@ def get_revenue(
     start_date: str | None = Query(None),
     end_date: str | None = Query(None),
     granularity: str = Query("month"),
+    compare: str | None = Query(None, description="previous_period or previous_year"),
     format: str = Query("json"),
     service: ReportService = Depends(get_report_service),
     db: Session = Depends(get_db),
 ):
-    data = service.get_revenue_report(db, start_date=start_date, end_date=end_date, granularity=granularity)
+    filters = dict(start_date=start_date, end_date=end_date, granularity=granularity, compare=compare)
+    try:
+        data = service.get_revenue_report(db, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if format == "pdf":
-        pdf = service.generate_revenue_pdf(db, start_date=start_date, end_date=end_date, granularity=granularity)
+        pdf = service.generate_revenue_pdf(db, **filters)
         return Response(content=pdf, media_type="application/pdf")
     return data
 
@@ -43,7 +48,10 @@ def get_patient_history(
     service: ReportService = Depends(get_report_service),
     db: Session = Depends(get_db),
 ):
-    return service.get_patient_history(db, patient_id=patient_id, start_date=start_date, end_date=end_date, status=status)
+    try:
+        return service.get_patient_history(db, patient_id=patient_id, start_date=start_date, end_date=end_date, status=status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/outstanding")
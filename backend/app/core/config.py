@@ -50,6 +50,44 @@ class Settings:
         self.STRIPE_PUBLISHABLE_KEY: str = os.getenv("STRIPE_PUBLISHABLE_KEY", "pk_test_51SDKdvI0OwBnbEX2nzwEPTIE1xscwZEZoJbluvX4hncILO1HxrSdy6WdM8Cwkw7MgJfHjmMWgCKfDdq0Tu4xhrpt00kN5PtJJ9")
         self.STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "sk_test_51SDKdvI0OwBnbEX2mtaeqBTQmpfhnV45MEpnGoJoGdDSbzjLQ7YYADvD2608oNArI600PFpvYmJkaErCbSWGmohY00NBNTSJ8Z")
         self.STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_test_webhook_secret_placeholder")
+        # Stripe gateway: HTTP timeouts/pooling and circuit breaker (see app.services.stripe_gateway)
+        self.STRIPE_TIMEOUT_SECONDS: float = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "8"))
+        self.STRIPE_MAX_NETWORK_RETRIES: int = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "1"))
+        self.STRIPE_POOL_SIZE: int = int(os.getenv("STRIPE_POOL_SIZE", "20"))
+        self.STRIPE_BREAKER_THRESHOLD: int = int(os.getenv("STRIPE_BREAKER_THRESHOLD", "5"))
+        self.STRIPE_BREAKER_RESET_SECONDS: float = float(os.getenv("STRIPE_BREAKER_RESET_SECONDS", "30"))
+
+        # Idempotency-Key handling for POST /payments and /invoices (see app.core.idempotency)
+        self.IDEMPOTENCY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+        # A request still running after this long is assumed dead and its key can be retried
+        self.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "60"))
+        # How long a concurrent duplicate waits for the first request before getting 409
+        self.IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+        # Webhook inbox: stored deliveries are applied by a background worker pool
+        self.WEBHOOK_INBOX_WORKERS: int = int(os.getenv("WEBHOOK_INBOX_WORKERS", "4"))
+        self.WEBHOOK_INBOX_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_INBOX_MAX_ATTEMPTS", "8"))
+        # Stripe retries a delivery for up to 3 days; keep seen event ids well beyond that
+        self.WEBHOOK_DEDUP_RETENTION_DAYS: int = int(os.getenv("WEBHOOK_DEDUP_RETENTION_DAYS", "30"))
+        # Email outbox: queued emails are delivered by a background worker pool
+        self.EMAIL_OUTBOX_WORKERS: int = int(os.getenv("EMAIL_OUTBOX_WORKERS", "4"))
+        self.EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+        # Longest a GET /payments/wait request is parked before answering "pending"
+        self.PAYMENT_WAIT_MAX_SECONDS: float = float(os.getenv("PAYMENT_WAIT_MAX_SECONDS", "30"))
+        # Rendered invoice PDFs, named by content hash (see app.services.invoice_pdf)
+        self.INVOICE_PDF_CACHE_DIR: str = os.getenv("INVOICE_PDF_CACHE_DIR", (backend_dir / "invoice_pdfs").as_posix())
+        self.INVOICE_PDF_WORKERS: int = int(os.getenv("INVOICE_PDF_WORKERS", "2"))
+        # Cached PDFs not served for this long are removed (also superseded versions of an invoice)
+        self.INVOICE_PDF_MAX_AGE_HOURS: float = float(os.getenv("INVOICE_PDF_MAX_AGE_HOURS", "24"))
+        # Overdue invoice scan (see app.services.overdue_invoices); an interval of 0 disables the in-app schedule
+        self.OVERDUE_SCAN_INTERVAL_SECONDS: float = float(os.getenv("OVERDUE_SCAN_INTERVAL_SECONDS", "3600"))
+        self.OVERDUE_SCAN_BATCH_SIZE: int = int(os.getenv("OVERDUE_SCAN_BATCH_SIZE", "500"))
+        # In-memory patient picker index (see app.services.patient_typeahead), about 1 KB
+        # per patient; with more patients suggestions come from the database. 0 disables it
+        self.PATIENT_TYPEAHEAD_MAX_PATIENTS: int = int(os.getenv("PATIENT_TYPEAHEAD_MAX_PATIENTS", "200000"))
+        # Bulk patient import: validation processes (0 validates in the importing thread) and rows per transaction
+        self.PATIENT_IMPORT_WORKERS: int = int(os.getenv("PATIENT_IMPORT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+        self.PATIENT_IMPORT_CHUNK_SIZE: int = int(os.getenv("PATIENT_IMPORT_CHUNK_SIZE", "2000"))
 
 
 
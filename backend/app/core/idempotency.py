@@ -0,0 +1,285 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A POST under one of the configured path prefixes that carries an
+``Idempotency-Key`` header claims the key in the idempotency_keys table
+before the handler runs. The response (anything below 500) is stored with
+the key, and a retry with the same key and request body gets the stored
+response back, marked ``Idempotent-Replayed: true``, without the handler
+running again. A duplicate arriving while the first request is still running
+waits for it (up to IDEMPOTENCY_WAIT_SECONDS, then 409); reusing a key for a
+different request is rejected with 422. Keys are scoped to the caller's
+credentials and expire after IDEMPOTENCY_TTL_HOURS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.db.dialect import insert_ignore
+from app.db.session import SessionLocal
+from app.models.idempotency_key import IdempotencyKey, IdempotencyKeyStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "idempotent-replayed"
+
+
+@dataclass
+class Claim:
+    # "acquired", "replay", "in_progress" or "mismatch"
+    state: str
+    status_code: Optional[int] = None
+    headers: Optional[List[Tuple[str, str]]] = None
+    body: Optional[bytes] = None
+
+
+class IdempotencyStore:
+    """Keyed response store in the idempotency_keys table."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        ttl: Optional[timedelta] = None,
+        lock_timeout: Optional[timedelta] = None,
+        purge_interval: float = 600.0,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl or timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+        self.lock_timeout = lock_timeout or timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS)
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def claim(self, key: str, fingerprint: str) -> Claim:
+        now = datetime.utcnow()
+        with self.session_factory() as db:
+            if time.monotonic() - self._last_purge > self.purge_interval:
+                self._last_purge = time.monotonic()
+                self.purge_expired(db)
+
+            acquired = insert_ignore(
+                db,
+                IdempotencyKey.__table__,
+                {
+                    "key": key,
+                    "request_fingerprint": fingerprint,
+                    "status": IdempotencyKeyStatus.IN_PROGRESS,
+                    "locked_at": now,
+                    "created_at": now,
+                    "expires_at": now + self.ttl,
+                },
+                conflict_columns=["key"],
+            )
+            if not acquired:
+                # Take over an expired key or one whose request died mid-flight
+                acquired = db.execute(
+                    update(IdempotencyKey)
+                    .where(
+                        IdempotencyKey.key == key,
+                        or_(
+                            IdempotencyKey.expires_at < now,
+                            and_(
+                                IdempotencyKey.status == IdempotencyKeyStatus.IN_PROGRESS,
+                                IdempotencyKey.locked_at < now - self.lock_timeout,
+                            ),
+                        ),
+                    )
+                    .values(
+                        request_fingerprint=fingerprint,
+                        status=IdempotencyKeyStatus.IN_PROGRESS,
+                        response_status=None,
+                        response_headers=None,
+                        response_body=None,
+                        locked_at=now,
+                        created_at=now,
+                        expires_at=now + self.ttl,
+                    ),
+                    execution_options={"synchronize_session": False},
+                ).rowcount == 1
+            db.commit()
+            if acquired:
+                return Claim("acquired")
+
+            row = db.get(IdempotencyKey, key)
+            if row is None:
+                # Released between our insert and the lookup; the caller retries
+                return Claim("in_progress")
+            if row.request_fingerprint != fingerprint:
+                return Claim("mismatch")
+            if row.status == IdempotencyKeyStatus.COMPLETED:
+                return Claim(
+                    "replay",
+                    status_code=row.response_status,
+                    headers=[tuple(h) for h in row.response_headers or []],
+                    body=row.response_body or b"",
+                )
+            return Claim("in_progress")
+
+    def complete(self, key: str, status_code: int, headers: Sequence[Tuple[str, str]], body: bytes) -> None:
+        with self.session_factory() as db:
+            db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update(
+                {
+                    "status": IdempotencyKeyStatus.COMPLETED,
+                    "response_status": status_code,
+                    "response_headers": [list(h) for h in headers],
+                    "response_body": body,
+                    "locked_at": None,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+
+    def release(self, key: str) -> None:
+        """Forget a key whose request failed, so a retry runs the handler again."""
+        with self.session_factory() as db:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key, IdempotencyKey.status == IdempotencyKeyStatus.IN_PROGRESS
+            ).delete(synchronize_session=False)
+            db.commit()
+
+    def purge_expired(self, db: Session) -> int:
+        deleted = (
+            db.query(IdempotencyKey)
+            .filter(IdempotencyKey.expires_at < datetime.utcnow())
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        if deleted:
+            logger.info("Purged %d expired idempotency keys", deleted)
+        return deleted
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying Idempotency-Key to POSTs under ``path_prefixes``."""
+
+    def __init__(
+        self,
+        app: Any,
+        path_prefixes: Sequence[str] = (),
+        store: Optional[IdempotencyStore] = None,
+        wait_seconds: Optional[float] = None,
+        poll_interval: float = 0.1,
+    ):
+        self.app = app
+        self.path_prefixes = tuple(path_prefixes)
+        # Resolved per request so tests can point the module store at their database
+        self._store = store
+        self.wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.poll_interval = poll_interval
+
+    @property
+    def store(self) -> IdempotencyStore:
+        return self._store or idempotency_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefixes):
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        client_key = headers.get("idempotency-key")
+        if not client_key:
+            return await self.app(scope, receive, send)
+        if len(client_key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"}, status_code=400)
+            return await response(scope, receive, send)
+
+        body = await self._read_body(receive)
+        key = _sha256(headers.get("authorization", "").encode(), client_key.encode())
+        fingerprint = _sha256(scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body)
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            claim = await run_in_threadpool(self.store.claim, key, fingerprint)
+            if claim.state == "acquired":
+                break
+            if claim.state == "replay":
+                return await self._replay(claim, send)
+            if claim.state == "mismatch":
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+                )
+                return await response(scope, receive, send)
+            if time.monotonic() >= deadline:
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still being processed"}, status_code=409
+                )
+                return await response(scope, receive, send)
+            await asyncio.sleep(self.poll_interval)
+
+        await self._run_and_store(scope, receive, send, body, key)
+
+    async def _read_body(self, receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    async def _replay(self, claim: Claim, send) -> None:
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in claim.headers]
+        headers.append((REPLAY_HEADER.encode(), b"true"))
+        await send({"type": "http.response.start", "status": claim.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": claim.body})
+
+    async def _run_and_store(self, scope, receive, send, body: bytes, key: str) -> None:
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        response_headers: List[Tuple[str, str]] = []
+        response_body: List[bytes] = []
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers.extend(
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        if status_code < 500:
+            await run_in_threadpool(self.store.complete, key, status_code, response_headers, b"".join(response_body))
+        else:
+            await run_in_threadpool(self.store.release, key)
@@ -0,0 +1,35 @@
+"""
+Keyset (cursor) pagination helpers.
+
+List endpoints ordered by ``(timestamp, id)`` descending hand out an opaque
+cursor for the last row of a page; the next page continues strictly after it
+with a ``(timestamp, id) < (cursor)`` predicate that an index on the same
+columns can seek to, so every page costs the same regardless of depth.
+
+The timestamp columns must be written from Python (a ``default=`` or an
+explicit value), not only by ``server_default=func.now()``: SQLite stores
+now() as text without fractional seconds, which sorts below the
+``.ffffff`` form a cursor is bound in, so the cursor row and its
+same-second neighbours would match the predicate again and pages repeat.
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(timestamp: datetime, row_id: uuid.UUID) -> str:
+    raw = json.dumps([timestamp.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of encode_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -101,13 +101,13 @@ class InputValidator:
         return True
     
     @staticmethod
-    def validate_email_address(email: str) -> bool:
-        """Validate email address format."""
+    def validate_email_address(email: str, check_deliverability: bool = True) -> bool:
+        """Validate email address format (and with check_deliverability, that its domain accepts mail)."""
         if not email or len(email.strip()) == 0:
             raise ValidationError("email", email, "Email address is required")
         
         try:
-            validate_email(email)
+            validate_email(email, check_deliverability=check_deliverability)
             return True
         except EmailNotValidError as e:
             raise ValidationError("email", email, f"Invalid email format: {str(e)}")
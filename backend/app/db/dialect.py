@@ -0,0 +1,23 @@
+"""Small helpers for statements whose syntax differs between SQLite and Postgres."""
+
+from typing import Any, Dict, Iterable
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, table: Table, values: Dict[str, Any], conflict_columns: Iterable[str]) -> bool:
+    """INSERT a row unless it conflicts on ``conflict_columns``.
+
+    Returns True when the row was inserted and False when it already existed.
+    Runs inside the session's current transaction.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).values(**values).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).values(**values).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    else:
+        raise NotImplementedError(f"insert_ignore is not supported on {dialect}")
+    return db.execute(stmt).rowcount == 1
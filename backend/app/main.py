@@ -10,8 +10,16 @@ from app.api.api_v1.api import api_router
 from app.db.session import Base, engine
 from app.agents.simple_clinic_agent import agent_app
 from app.services.etl_service import ETLService
+from app.services.webhook_inbox import webhook_inbox
+from app.services.email_outbox import email_outbox
+from app.services.invoice_pdf import invoice_pdf_cache
+from app.services.overdue_invoices import overdue_scanner
+from app.services.patient_typeahead import patient_typeahead
+from app.services.patient_import import patient_importer
+from app.services.bulk_payment_links import payment_link_dispatcher
 from app.core.websocket import websocket_endpoint
 from app.core.exceptions import setup_exception_handlers
+from app.core.idempotency import IdempotencyMiddleware
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -26,6 +34,13 @@ app = FastAPI(
 # Log resolved DATABASE_URL on startup for easier debugging of relative paths
 logging.getLogger("uvicorn.error").info(f"Resolved DATABASE_URL: {settings.DATABASE_URL}")
 
+# Idempotency-Key replay for payment and invoice mutations; added first so it
+# runs innermost and replayed responses still get CORS and security headers
+app.add_middleware(
+    IdempotencyMiddleware,
+    path_prefixes=[f"{settings.API_V1_STR}/payments", f"{settings.API_V1_STR}/invoices"],
+)
+
 # Set up CORS with security headers
 app.add_middleware(
     CORSMiddleware,
@@ -33,7 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["X-Process-Time", "X-Server-Info"]
+    expose_headers=["X-Process-Time", "X-Server-Info", "X-Next-Cursor", "Idempotent-Replayed"]
 )
 
 # Add security headers middleware
@@ -85,6 +100,15 @@ async def startup_event():
         logger = logging.getLogger("uvicorn.error")
         logger.info("Starting application initialization...")
         logger.info(f"Database URL: {settings.DATABASE_URL}")
+
+        # Background workers applying stored Stripe webhook deliveries
+        webhook_inbox.start()
+        # Background workers delivering queued emails
+        email_outbox.start()
+        # Periodic scan flagging invoices past their due date
+        overdue_scanner.start()
+        # In-memory index answering GET /patients/suggest
+        patient_typeahead.start()
         
         # Check if we're in production
         if settings.ENVIRONMENT != "local":
@@ -103,6 +127,15 @@ async def startup_event():
         # Don't fail startup if ETL fails
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    webhook_inbox.stop()
+    email_outbox.stop()
+    overdue_scanner.stop()
+    invoice_pdf_cache.stop()
+    patient_importer.stop()
+    payment_link_dispatcher.stop()
+
 
 @app.get("/")
 async def root():
@@ -1,13 +1,35 @@
 from .staff import Staff
 from .patient import Patient
 from .invoice import Invoice, InvoiceItem
-from .payment import Payment
+from .invoice_summary import InvoiceSummary
+from .invoice_search import InvoiceSearchDocument
+from .payment import Payment, PaymentRawEvent
 from .audit_log import AuditLog
 from .room import Room, RoomType, RoomStatus
 from .admission import Admission, AdmissionStatus
 from .etl_status import ETLProcessStatus
+from .inbound_event import InboundEvent, InboundEventStatus
+from .processed_webhook_event import ProcessedWebhookEvent
+from .outbox_email import OutboxEmail, OutboxEmailStatus
+from .idempotency_key import IdempotencyKey, IdempotencyKeyStatus
+from .invoice_number_counter import InvoiceNumberCounter
+from .reconciliation import ReconciliationRun, ReconciliationRunStatus, ReconciliationDiscrepancy, DiscrepancyKind
+from .patient_import import PatientImport, PatientImportStatus, PatientImportError, PatientImportIssue
+from .payment_link_run import PaymentLinkRun, PaymentLinkRunStatus, PaymentLinkResult
+from .reporting import revenue_metrics, patient_payment_history, outstanding_payments
+
+# Registers the Session listeners that keep invoice_summary and invoice_search
+# current, so every ORM writer that loads the models maintains them
+from app.services import invoice_summary as _invoice_summary  # noqa: E402,F401
 
 __all__ = [
-    "Staff", "Patient", "Invoice", "InvoiceItem", "Payment", "AuditLog",
-    "Room", "RoomType", "RoomStatus", "Admission", "AdmissionStatus", "ETLProcessStatus"
+    "Staff", "Patient", "Invoice", "InvoiceItem", "Payment", "PaymentRawEvent", "AuditLog",
+    "Room", "RoomType", "RoomStatus", "Admission", "AdmissionStatus", "ETLProcessStatus",
+    "InboundEvent", "InboundEventStatus", "ProcessedWebhookEvent",
+    "OutboxEmail", "OutboxEmailStatus",
+    "IdempotencyKey", "IdempotencyKeyStatus",
+    "ReconciliationRun", "ReconciliationRunStatus", "ReconciliationDiscrepancy", "DiscrepancyKind",
+    "PatientImport", "PatientImportStatus", "PatientImportError", "PatientImportIssue",
+    "PaymentLinkRun", "PaymentLinkRunStatus", "PaymentLinkResult",
+    "revenue_metrics", "patient_payment_history", "outstanding_payments"
 ]
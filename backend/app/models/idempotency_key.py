@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, JSON, LargeBinary
+from sqlalchemy.sql import func
+import enum
+from app.db.session import Base
+
+
+class IdempotencyKeyStatus(str, enum.Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class IdempotencyKey(Base):
+    """Response stored for an Idempotency-Key so a retried request is answered
+    without running the handler again (see app.core.idempotency)."""
+
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the caller's credentials and the client-supplied key
+    key = Column(String(64), primary_key=True)
+    # sha256 of method, path, query and body; a reused key with another request is rejected
+    request_fingerprint = Column(String(64), nullable=False)
+    status = Column(Enum(IdempotencyKeyStatus), nullable=False, default=IdempotencyKeyStatus.IN_PROGRESS)
+    response_status = Column(Integer, nullable=True)
+    response_headers = Column(JSON, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, JSON, Text
+from sqlalchemy.sql import func
+import enum
+from app.db.session import Base
+
+
+class InboundEventStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    DEAD = "dead"
+
+
+class InboundEvent(Base):
+    """Raw webhook delivery stored by the webhook handler and applied later by
+    the inbox workers (see app.services.webhook_inbox)."""
+
+    __tablename__ = "inbound_events"
+
+    # Autoincrement id doubles as the arrival order
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String, nullable=False, default="stripe")
+    event_id = Column(String, nullable=True)
+    event_type = Column(String, nullable=False)
+    # Events sharing an ordering key (the invoice id) are applied one at a time, in order
+    ordering_key = Column(String, nullable=True, index=True)
+    payload = Column(JSON, nullable=False)
+    status = Column(Enum(InboundEventStatus), nullable=False, default=InboundEventStatus.PENDING, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, DateTime, Date, Integer, ForeignKey, Enum
+from sqlalchemy import Column, String, DateTime, Date, Integer, ForeignKey, Enum, Index, event, inspect
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from datetime import datetime
 import uuid
 import enum
 from app.db.session import Base
@@ -13,8 +14,22 @@ class InvoiceStatus(str, enum.Enum):
     PARTIALLY_PAID = "partially_paid"
     CANCELLED = "cancelled"
 
+def _initial_balance(context):
+    return context.get_current_parameters().get("total_amount_cents") or 0
+
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Outstanding invoices are found by balance instead of aggregating payments
+        Index("ix_invoices_balance_cents", "balance_cents"),
+        # Keyset pagination of the invoice list on (created_at, id), unfiltered
+        # and filtered by patient or status
+        Index("ix_invoices_created_at_id", "created_at", "id"),
+        Index("ix_invoices_patient_id_created_at", "patient_id", "created_at", "id"),
+        Index("ix_invoices_status_created_at", "status", "created_at", "id"),
+        # Batches of the overdue scan (app.services.overdue_invoices), keyset on (due_date, id)
+        Index("ix_invoices_status_due_date", "status", "due_date", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     invoice_number = Column(String, unique=True, index=True, nullable=False)
@@ -22,13 +37,25 @@ class Invoice(Base):
     staff_id = Column(UUID(as_uuid=True), ForeignKey("staff.id"), nullable=False)
     currency = Column(String, nullable=False, default="USD")
     total_amount_cents = Column(Integer, nullable=False, default=0)
+    # Maintained by app.services.invoice_balance.apply_payment with every payment/refund
+    paid_cents = Column(Integer, nullable=False, default=0, server_default="0")
+    balance_cents = Column(Integer, nullable=False, default=_initial_balance, server_default="0")
+    last_payment_at = Column(DateTime(timezone=True), nullable=True)
     payment_method = Column(String, nullable=True)  # 'online' or 'cash'
     status = Column(Enum(InvoiceStatus), nullable=False, default=InvoiceStatus.DRAFT)
     issued_at = Column(DateTime(timezone=True), nullable=True)
     due_date = Column(Date, nullable=True)
+    # Set by the overdue scan when an issued/partially paid invoice passes its due date;
+    # cleared when it is paid, cancelled or given a new due date
+    overdue_at = Column(DateTime(timezone=True), nullable=True)
     stripe_payment_link_id = Column(String, nullable=True)
     stripe_checkout_session_id = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Stored with the session so a still-valid link can be re-sent without calling Stripe
+    stripe_checkout_url = Column(String, nullable=True)
+    stripe_checkout_expires_at = Column(DateTime(timezone=True), nullable=True)
+    stripe_checkout_amount_cents = Column(Integer, nullable=True)
+    # Keyset cursors need a Python-side value; see app.core.pagination
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
@@ -38,11 +65,20 @@ class Invoice(Base):
     payments = relationship("Payment", back_populates="invoice")
     admission = relationship("Admission", back_populates="invoice")
 
+@event.listens_for(Invoice, "before_update")
+def _clear_overdue(mapper, connection, target):
+    # The scan flags the invoice again if it is still past due. Payments update
+    # in SQL and clear the flag there (app.services.invoice_balance).
+    state = inspect(target)
+    settled = state.attrs.status.history.has_changes() and target.status in (InvoiceStatus.PAID, InvoiceStatus.CANCELLED)
+    if settled or state.attrs.due_date.history.has_changes():
+        target.overdue_at = None
+
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False)
+    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False, index=True)
     description = Column(String, nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     unit_price_cents = Column(Integer, nullable=False)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class InvoiceNumberCounter(Base):
+    """Last invoice sequence number handed out per month (see app.services.invoice_numbers)."""
+
+    __tablename__ = "invoice_number_counters"
+
+    # "YYYYMM", the month part of CLINIC-YYYYMM-NNNN
+    period = Column(String(6), primary_key=True)
+    last_value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Text, DDL, event
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.session import Base
+
+
+class InvoiceSearchDocument(Base):
+    """Searchable text of an invoice: number, patient name and item descriptions.
+
+    Rewritten with the invoice_summary row (see app.services.invoice_search).
+    The full-text index over ``document`` is dialect specific and created with
+    the table: a generated tsvector column with a GIN index on Postgres, an
+    external-content FTS5 table kept in sync by triggers on SQLite.
+    """
+
+    __tablename__ = "invoice_search"
+
+    invoice_id = Column(UUID(as_uuid=True), primary_key=True)
+    document = Column(Text, nullable=False)
+
+
+_table = InvoiceSearchDocument.__table__
+
+for statement in (
+    "ALTER TABLE invoice_search ADD COLUMN document_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED",
+    "CREATE INDEX ix_invoice_search_document_tsv ON invoice_search USING GIN (document_tsv)",
+):
+    event.listen(_table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search_fts "
+    "USING fts5(document, content='invoice_search', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS invoice_search_ai AFTER INSERT ON invoice_search BEGIN "
+    "INSERT INTO invoice_search_fts(rowid, document) VALUES (new.rowid, new.document); END",
+    "CREATE TRIGGER IF NOT EXISTS invoice_search_ad AFTER DELETE ON invoice_search BEGIN "
+    "INSERT INTO invoice_search_fts(invoice_search_fts, rowid, document) VALUES ('delete', old.rowid, old.document); END",
+    "CREATE TRIGGER IF NOT EXISTS invoice_search_au AFTER UPDATE ON invoice_search BEGIN "
+    "INSERT INTO invoice_search_fts(invoice_search_fts, rowid, document) VALUES ('delete', old.rowid, old.document); "
+    "INSERT INTO invoice_search_fts(rowid, document) VALUES (new.rowid, new.document); END",
+):
+    event.listen(_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(_table, "before_drop", DDL("DROP TABLE IF EXISTS invoice_search_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, String, DateTime, Date, Integer, Enum, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.session import Base
+from app.models.invoice import InvoiceStatus
+
+
+class InvoiceSummary(Base):
+    """One row per invoice with the patient and balance fields list views show.
+
+    A read model kept current by app.services.invoice_summary in the same
+    transaction as every invoice, payment or patient write, so list views read
+    this table alone instead of joining invoices, patients and payments.
+    """
+
+    __tablename__ = "invoice_summary"
+    __table_args__ = (
+        Index("ix_invoice_summary_created_at_id", "created_at", "invoice_id"),
+        Index("ix_invoice_summary_status_created_at", "status", "created_at", "invoice_id"),
+        Index("ix_invoice_summary_patient_id_created_at", "patient_id", "created_at", "invoice_id"),
+        Index("ix_invoice_summary_balance_cents", "balance_cents"),
+        Index("ix_invoice_summary_overdue_at", "overdue_at"),
+    )
+
+    # No foreign key: a deleted invoice's row is removed after the invoice itself, in the same flush
+    invoice_id = Column(UUID(as_uuid=True), primary_key=True)
+    invoice_number = Column(String, nullable=False)
+    patient_id = Column(UUID(as_uuid=True), nullable=False)
+    patient_name = Column(String, nullable=True)
+    patient_email = Column(String, nullable=True)
+    currency = Column(String, nullable=False)
+    total_amount_cents = Column(Integer, nullable=False)
+    paid_cents = Column(Integer, nullable=False)
+    balance_cents = Column(Integer, nullable=False)
+    last_payment_at = Column(DateTime(timezone=True), nullable=True)
+    status = Column(Enum(InvoiceStatus), nullable=False)
+    due_date = Column(Date, nullable=True)
+    overdue_at = Column(DateTime(timezone=True), nullable=True)
+    # Copied from invoices.created_at, which is stamped in Python so that keyset
+    # cursors compare equal to it on SQLite (see app.core.pagination)
+    created_at = Column(DateTime(timezone=True), nullable=True)
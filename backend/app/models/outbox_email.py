@@ -0,0 +1,40 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, Text, Index
+from sqlalchemy.sql import func
+import enum
+from app.db.session import Base
+
+
+class OutboxEmailStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboxEmail(Base):
+    """Email queued in the same transaction as the change that triggers it and
+    delivered later by the outbox workers (see app.services.email_outbox)."""
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Workers pick due messages by status, oldest first
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    to_address = Column(String, nullable=False)
+    from_address = Column(String, nullable=True)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    html_body = Column(Text, nullable=True)
+    # What the message is about, e.g. ("invoice", <invoice id>)
+    related_type = Column(String, nullable=True)
+    related_id = Column(String, nullable=True, index=True)
+    status = Column(Enum(OutboxEmailStatus), nullable=False, default=OutboxEmailStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,10 +1,28 @@
-from sqlalchemy import Column, String, DateTime, Date, JSON
+from sqlalchemy import Column, String, DateTime, Date, JSON, DDL, Index, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+import re
+import unicodedata
 import uuid
 from app.db.session import Base
 
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize_search_text(text):
+    """Lowercase, accent-free words of ``text`` joined by single spaces ("José O'Brien" -> "jose o brien")."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def patient_search_text(name, email=None, phone=None):
+    """The patients.search_text value: normalized name and email, then the phone's digits."""
+    parts = [normalize_search_text(name), normalize_search_text(email), re.sub(r"\D", "", phone or "")]
+    return " ".join(part for part in parts if part)
+
+
 class Patient(Base):
     __tablename__ = "patients"
     
@@ -14,8 +32,47 @@ class Patient(Base):
     phone = Column(String, nullable=True)
     dob = Column(Date, nullable=True)
     patient_metadata = Column(JSON, nullable=True)
+    # Maintained on every ORM write (see _set_search_text); indexed for
+    # app.services.patient_search, per dialect below
+    search_text = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     invoices = relationship("Invoice", back_populates="patient")
+
+
+# Duplicate checks of the bulk import (app.services.patient_import)
+Index("ix_patients_email_lower", func.lower(Patient.email))
+Index("ix_patients_name_lower_dob", func.lower(Patient.name), Patient.dob)
+
+
+@event.listens_for(Patient, "before_insert")
+@event.listens_for(Patient, "before_update")
+def _set_search_text(mapper, connection, target):
+    target.search_text = patient_search_text(target.name, target.email, target.phone)
+
+
+_table = Patient.__table__
+
+# Postgres: trigram GIN index, so substring LIKE on search_text is indexed
+for statement in (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_patients_search_text_trgm ON patients USING GIN (search_text gin_trgm_ops)",
+):
+    event.listen(_table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+# SQLite: external-content FTS5 table with the trigram tokenizer, kept in sync by triggers
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search_fts "
+    "USING fts5(search_text, content='patients', content_rowid='rowid', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ai AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patient_search_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ad AFTER DELETE ON patients BEGIN "
+    "INSERT INTO patient_search_fts(patient_search_fts, rowid, search_text) VALUES ('delete', old.rowid, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_au AFTER UPDATE OF search_text ON patients BEGIN "
+    "INSERT INTO patient_search_fts(patient_search_fts, rowid, search_text) VALUES ('delete', old.rowid, old.search_text); "
+    "INSERT INTO patient_search_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+):
+    event.listen(_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(_table, "before_drop", DDL("DROP TABLE IF EXISTS patient_search_fts").execute_if(dialect="sqlite"))
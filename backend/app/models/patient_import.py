@@ -0,0 +1,62 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+import enum
+from app.db.session import Base
+
+
+class PatientImportStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PatientImportIssue(str, enum.Enum):
+    # Row failed validation and was not imported
+    INVALID = "invalid"
+    # Row matches an existing patient (or an earlier row) and was not imported
+    DUPLICATE = "duplicate"
+
+
+class PatientImport(Base):
+    """One bulk import of a CSV or NDJSON patient file (see app.services.patient_import).
+
+    The counters are committed with every chunk, so they show the progress of
+    a running import.
+    """
+
+    __tablename__ = "patient_imports"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    source = Column(String, nullable=False)
+    format = Column(String(10), nullable=False)
+    status = Column(Enum(PatientImportStatus), nullable=False, default=PatientImportStatus.PENDING)
+    staff_id = Column(UUID(as_uuid=True), ForeignKey("staff.id"), nullable=True)
+    rows_read = Column(Integer, nullable=False, default=0)
+    created = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class PatientImportError(Base):
+    """A row of an import that was not imported, for the import's error report."""
+
+    __tablename__ = "patient_import_errors"
+    __table_args__ = (
+        Index("ix_patient_import_errors_import_row", "import_id", "row"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    import_id = Column(UUID(as_uuid=True), ForeignKey("patient_imports.id", ondelete="CASCADE"), nullable=False)
+    # 1-based position of the record in the file
+    row = Column(Integer, nullable=False)
+    issue = Column(Enum(PatientImportIssue), nullable=False)
+    field = Column(String, nullable=True)
+    message = Column(String, nullable=False)
+    value = Column(String, nullable=True)
+    existing_patient_id = Column(UUID(as_uuid=True), nullable=True)
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Enum, JSON
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Enum, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from datetime import datetime
+from typing import Any, Dict, Optional
+import json
 import uuid
 import enum
+import zlib
 from app.db.session import Base
 
 class PaymentStatus(str, enum.Enum):
@@ -13,15 +17,77 @@ class PaymentStatus(str, enum.Enum):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # ETL extraction and revenue queries filter on status over a received_at range;
+        # id makes it also serve the status-filtered keyset pages of the payments list
+        Index("ix_payments_status_received_at", "status", "received_at", "id"),
+        # Keyset pagination of the payments list on (received_at, id)
+        Index("ix_payments_received_at_id", "received_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False)
+    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False, index=True)
     stripe_payment_id = Column(String, nullable=False, unique=True)
     amount_cents = Column(Integer, nullable=False)
     currency = Column(String, nullable=False)
     status = Column(Enum(PaymentStatus), nullable=False)
-    received_at = Column(DateTime(timezone=True), server_default=func.now())
-    raw_event = Column(JSON, nullable=True)
+    # Set in Python as well: SQLite stores now() without fractional seconds, which
+    # would not compare equal to keyset cursors bound from Python datetimes
+    received_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     
     # Relationships
     invoice = relationship("Invoice", back_populates="payments")
+    # The raw provider payload lives in a side table so payment scans and loads stay narrow
+    raw_event_record = relationship(
+        "PaymentRawEvent", uselist=False, lazy="select", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    @property
+    def raw_event(self) -> Optional[Dict[str, Any]]:
+        """The stored provider payload, loaded and decompressed on access."""
+        record = self.raw_event_record
+        return record.payload if record is not None else None
+
+    @raw_event.setter
+    def raw_event(self, payload: Optional[Dict[str, Any]]) -> None:
+        if payload is None:
+            self.raw_event_record = None
+        elif self.raw_event_record is not None:
+            self.raw_event_record.payload = payload
+        else:
+            self.raw_event_record = PaymentRawEvent(payload=payload)
+
+
+class PaymentRawEvent(Base):
+    """zlib-compressed JSON payload of a payment (Stripe event, manual entry note)."""
+
+    __tablename__ = "payment_raw_events"
+
+    payment_id = Column(UUID(as_uuid=True), ForeignKey("payments.id", ondelete="CASCADE"), primary_key=True)
+    encoding = Column(String, nullable=False, default="zlib")
+    data = Column(LargeBinary, nullable=False)
+    # Uncompressed size, for storage accounting
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __init__(self, payload: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        if payload is not None:
+            self.payload = payload
+
+    @staticmethod
+    def encode(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Column values storing ``payload``; also used for bulk inserts."""
+        raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        return {"encoding": "zlib", "data": zlib.compress(raw, 6), "size_bytes": len(raw)}
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        if self.encoding != "zlib":
+            raise ValueError(f"Unknown payload encoding {self.encoding!r}")
+        return json.loads(zlib.decompress(self.data))
+
+    @payload.setter
+    def payload(self, payload: Dict[str, Any]) -> None:
+        for column, value in self.encode(payload).items():
+            setattr(self, column, value)
@@ -0,0 +1,55 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+import enum
+from app.db.session import Base
+
+
+class PaymentLinkRunStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PaymentLinkRun(Base):
+    """One bulk payment-link dispatch started through the API (see app.services.bulk_payment_links).
+
+    The counters are committed with every chunk, so they show the progress of
+    a running dispatch.
+    """
+
+    __tablename__ = "payment_link_runs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status = Column(Enum(PaymentLinkRunStatus), nullable=False, default=PaymentLinkRunStatus.PENDING)
+    staff_id = Column(UUID(as_uuid=True), ForeignKey("staff.id"), nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class PaymentLinkResult(Base):
+    """Outcome for one invoice of a payment-link run."""
+
+    __tablename__ = "payment_link_results"
+    __table_args__ = (
+        Index("ix_payment_link_results_run_id", "run_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(UUID(as_uuid=True), ForeignKey("payment_link_runs.id", ondelete="CASCADE"), nullable=False)
+    invoice_id = Column(UUID(as_uuid=True), nullable=False)
+    invoice_number = Column(String, nullable=True)
+    # sent, failed or skipped
+    status = Column(String(10), nullable=False)
+    error = Column(String, nullable=True)
+    session_id = Column(String, nullable=True)
+    checkout_url = Column(String, nullable=True)
+    sent_to = Column(String, nullable=True)
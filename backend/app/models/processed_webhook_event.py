@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class ProcessedWebhookEvent(Base):
+    """Provider event ids already accepted by the webhook handler.
+
+    The primary key makes de-duplication a single insert-or-ignore that is
+    safe across workers; rows older than WEBHOOK_DEDUP_RETENTION_DAYS are
+    purged by the webhook inbox.
+    """
+
+    __tablename__ = "processed_webhook_events"
+
+    event_id = Column(String, primary_key=True)
+    source = Column(String, nullable=False, default="stripe")
+    event_type = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -0,0 +1,63 @@
+from sqlalchemy import Column, String, DateTime, Integer, Enum, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+import enum
+from app.db.session import Base
+
+
+class ReconciliationRunStatus(str, enum.Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class DiscrepancyKind(str, enum.Enum):
+    # Export entry with no payment of that id
+    UNMATCHED = "unmatched"
+    # Stripe payment recorded in the period but absent from the export
+    MISSING = "missing"
+    AMOUNT_MISMATCH = "amount_mismatch"
+    # Export entry seen more than once
+    DUPLICATE = "duplicate"
+    # Refund in the export for a payment not marked refunded (or the reverse)
+    STATUS_MISMATCH = "status_mismatch"
+
+
+class ReconciliationRun(Base):
+    """One reconciliation of a Stripe balance-transaction export against payments
+    (see app.services.reconciliation)."""
+
+    __tablename__ = "reconciliation_runs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    source = Column(String, nullable=False)
+    period_start = Column(DateTime(timezone=True), nullable=True)
+    period_end = Column(DateTime(timezone=True), nullable=True)
+    status = Column(Enum(ReconciliationRunStatus), nullable=False, default=ReconciliationRunStatus.RUNNING)
+    entries_total = Column(Integer, nullable=False, default=0)
+    entries_matched = Column(Integer, nullable=False, default=0)
+    entries_ignored = Column(Integer, nullable=False, default=0)
+    # Discrepancy count per DiscrepancyKind value
+    summary = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ReconciliationDiscrepancy(Base):
+    __tablename__ = "reconciliation_discrepancies"
+    __table_args__ = (
+        Index("ix_reconciliation_discrepancies_run_kind", "run_id", "kind"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(UUID(as_uuid=True), ForeignKey("reconciliation_runs.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(Enum(DiscrepancyKind), nullable=False)
+    stripe_payment_id = Column(String, nullable=True, index=True)
+    balance_transaction_id = Column(String, nullable=True)
+    payment_id = Column(UUID(as_uuid=True), nullable=True)
+    expected_amount_cents = Column(Integer, nullable=True)
+    actual_amount_cents = Column(Integer, nullable=True)
+    currency = Column(String, nullable=True)
+    details = Column(JSON, nullable=True)
@@ -0,0 +1,52 @@
+"""
+Reporting schema tables populated by the ETL.
+
+These are plain Core tables (no ORM classes): they are written with bulk
+statements by ETLService and read by ReportService. The definitions mirror
+migrations 004 and 008 so the schema can be created from metadata in tests.
+"""
+
+from sqlalchemy import Table, Column, Integer, String, Date, DateTime, Numeric, Index
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+
+revenue_metrics = Table(
+    "revenue_metrics",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("date_key", Date, nullable=False, index=True),
+    Column("total_revenue", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("payment_count", Integer, nullable=False, server_default="0"),
+    Column("average_payment", Numeric(10, 2), nullable=False, server_default="0"),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), nullable=True),
+)
+
+patient_payment_history = Table(
+    "patient_payment_history",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", String(50), nullable=False, index=True),
+    Column("payment_date", Date, nullable=False, index=True),
+    Column("amount", Numeric(10, 2), nullable=False),
+    Column("payment_status", String(20), nullable=False, index=True),
+    Column("invoice_id", String(50), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_patient_payment_history_patient_date", "patient_id", "payment_date"),
+)
+
+outstanding_payments = Table(
+    "outstanding_payments",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", String(50), nullable=False, index=True),
+    Column("invoice_id", String(50), nullable=False),
+    Column("amount_due", Numeric(10, 2), nullable=False),
+    Column("days_overdue", Integer, nullable=False, index=True),
+    Column("last_payment_date", Date, nullable=True),
+    Column("payment_status", String(20), nullable=False, index=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), nullable=True),
+)
@@ -27,7 +27,13 @@ class InvoiceCreate(BaseModel):
     payment_method: Optional[str] = None
     items: List[InvoiceItemCreate]
 
-class InvoiceResponse(BaseModel):
+class BulkInvoiceCreate(BaseModel):
+    """A batch of invoices, e.g. end-of-month room charges."""
+    invoices: List[InvoiceCreate]
+    # Create nothing if any entry is invalid (default: create the valid entries)
+    all_or_nothing: bool = False
+
+class InvoiceSummaryResponse(BaseModel):
     id: uuid.UUID
     invoice_number: str
     patient_id: uuid.UUID
@@ -35,14 +41,48 @@ class InvoiceResponse(BaseModel):
     currency: str
     payment_method: Optional[str] = None
     total_amount_cents: int
+    paid_cents: int = 0
+    balance_cents: int = 0
+    last_payment_at: Optional[datetime] = None
     status: InvoiceStatus
     issued_at: Optional[datetime] = None
     due_date: Optional[date] = None
+    overdue_at: Optional[datetime] = None
     stripe_payment_link_id: Optional[str] = None
     stripe_checkout_session_id: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class InvoiceResponse(InvoiceSummaryResponse):
     items: List[InvoiceItemResponse] = []
-    
+
+class InvoiceListItem(InvoiceSummaryResponse):
+    # None when the list was requested with include_items=false
+    items: Optional[List[InvoiceItemResponse]] = None
+
+class InvoiceSummaryRow(BaseModel):
+    """A row of the invoice_summary read model."""
+    invoice_id: uuid.UUID
+    invoice_number: str
+    patient_id: uuid.UUID
+    patient_name: Optional[str] = None
+    patient_email: Optional[str] = None
+    currency: str
+    total_amount_cents: int
+    paid_cents: int
+    balance_cents: int
+    last_payment_at: Optional[datetime] = None
+    status: InvoiceStatus
+    due_date: Optional[date] = None
+    overdue_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
     class Config:
         from_attributes = True
+
+class InvoiceSearchResult(InvoiceSummaryRow):
+    # Relevance of the match, higher is better
+    rank: float
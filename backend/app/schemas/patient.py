@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from datetime import datetime, date
 import uuid
+from app.models.patient_import import PatientImportStatus
 
 class PatientCreate(BaseModel):
     name: str
@@ -17,6 +18,16 @@ class PatientUpdate(BaseModel):
     dob: Optional[date] = None
     patient_metadata: Optional[Dict[str, Any]] = None
 
+class PatientSuggestion(BaseModel):
+    """A patient picker entry from GET /patients/suggest."""
+    id: uuid.UUID
+    name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class PatientResponse(BaseModel):
     id: uuid.UUID
     name: str
@@ -29,3 +40,20 @@ class PatientResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+class PatientImportResponse(BaseModel):
+    """Progress and outcome of a bulk patient import."""
+    id: uuid.UUID
+    source: str
+    format: str
+    status: PatientImportStatus
+    rows_read: int
+    created: int
+    duplicates: int
+    failed: int
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
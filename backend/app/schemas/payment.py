@@ -1,7 +1,10 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-from datetime import datetime
+from typing import Optional, Dict, Any, List
+from datetime import date, datetime
+from app.models.invoice import InvoiceStatus
 from app.models.payment import PaymentStatus
+from app.models.payment_link_run import PaymentLinkRunStatus
+import uuid
 
 
 class PaymentCreate(BaseModel):
@@ -13,6 +16,13 @@ class PaymentCreate(BaseModel):
     received_at: Optional[datetime] = None
 
 
+class BulkPaymentCreate(BaseModel):
+    """A batch of manual payments; each invoice_id may also be an invoice number."""
+    payments: List[PaymentCreate]
+    # Post nothing if any row is invalid (default: post the valid rows)
+    all_or_nothing: bool = False
+
+
 class PaymentResponse(BaseModel):
     id: str
     invoice_id: str
@@ -42,3 +52,45 @@ class PaymentListItem(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BulkPaymentLinkRequest(BaseModel):
+    """Either explicit invoice_ids or a filter selecting the invoices to send links for."""
+    invoice_ids: Optional[List[str]] = None
+    status: Optional[InvoiceStatus] = None
+    patient_id: Optional[str] = None
+    due_date_from: Optional[date] = None
+    due_date_to: Optional[date] = None
+    concurrency: int = 8
+
+
+class PaymentLinkResultResponse(BaseModel):
+    invoice_id: uuid.UUID
+    invoice_number: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    session_id: Optional[str] = None
+    checkout_url: Optional[str] = None
+    sent_to: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class PaymentLinkRunResponse(BaseModel):
+    """Progress and outcome of a bulk payment-link dispatch."""
+    id: uuid.UUID
+    status: PaymentLinkRunStatus
+    total: int
+    processed: int
+    sent: int
+    failed: int
+    skipped: int
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    # Filled in by GET when include_results is set
+    results: Optional[List[PaymentLinkResultResponse]] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,147 @@
+"""
+Bulk invoice creation.
+
+Batch billing (for example end-of-month room charges) submits many invoices
+at once. Patients are checked with one IN query, invoice numbers for the
+valid entries are reserved as one block from the month's counter
+(invoice_numbers.allocate_invoice_numbers) and the invoices and their line
+items are bulk inserted in one transaction.
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice, InvoiceItem, InvoiceStatus
+from app.models.patient import Patient
+from app.services.invoice_numbers import allocate_invoice_numbers
+from app.services.invoice_summary import refresh_invoice_summaries
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_INVOICES = 10000
+
+
+@dataclass
+class BulkInvoiceResult:
+    total: int = 0
+    created: int = 0
+    failed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "created": self.created,
+            "failed": self.failed,
+            "results": self.results,
+        }
+
+
+def _validate(entry: Any, patient_ids: set) -> Optional[str]:
+    if entry.patient_id not in patient_ids:
+        return "Patient not found"
+    if not entry.items:
+        return "Invoice has no items"
+    for item in entry.items:
+        if item.quantity < 1:
+            return "Item quantity must be at least 1"
+        if item.unit_price_cents < 0 or item.tax_cents < 0:
+            return "Item amounts must not be negative"
+    return None
+
+
+def create_invoices(
+    db: Session,
+    entries: Sequence[Any],
+    staff_id: Any,
+    all_or_nothing: bool = False,
+) -> BulkInvoiceResult:
+    """Validate and create ``entries`` (objects shaped like schemas.InvoiceCreate) as draft invoices.
+
+    Every entry gets one item in ``results``, in input order. Invalid entries
+    are reported and skipped, or with ``all_or_nothing`` nothing is created
+    when any entry is invalid. Commits once.
+    """
+    outcome = BulkInvoiceResult(total=len(entries))
+    requested = {entry.patient_id for entry in entries}
+    patient_ids = {row.id for row in db.query(Patient.id).filter(Patient.id.in_(list(requested)))} if requested else set()
+
+    valid = []
+    for index, entry in enumerate(entries):
+        error = _validate(entry, patient_ids)
+        if error:
+            outcome.failed += 1
+            outcome.results.append({"index": index, "patient_id": str(entry.patient_id), "status": "failed", "error": error})
+        else:
+            valid.append((index, entry))
+            outcome.results.append(None)
+
+    if all_or_nothing and outcome.failed:
+        for index, entry in valid:
+            outcome.results[index] = {
+                "index": index,
+                "patient_id": str(entry.patient_id),
+                "status": "skipped",
+                "invoice_id": None,
+                "error": "Batch has invalid rows",
+            }
+        return outcome
+    if not valid:
+        return outcome
+
+    numbers = allocate_invoice_numbers(db, len(valid))
+    # One timestamp for the batch, set here so keyset cursors can page it (see app.core.pagination)
+    now = datetime.utcnow()
+    invoices: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    for (index, entry), number in zip(valid, numbers):
+        invoice_id = uuid.uuid4()
+        total = sum(item.quantity * item.unit_price_cents + item.tax_cents for item in entry.items)
+        invoices.append({
+            "id": invoice_id,
+            "invoice_number": number,
+            "patient_id": entry.patient_id,
+            "staff_id": staff_id,
+            "currency": entry.currency,
+            "total_amount_cents": total,
+            "paid_cents": 0,
+            "balance_cents": total,
+            "payment_method": entry.payment_method,
+            "status": InvoiceStatus.DRAFT,
+            "due_date": entry.due_date,
+            "created_at": now,
+        })
+        items.extend(
+            {
+                "id": uuid.uuid4(),
+                "invoice_id": invoice_id,
+                "description": item.description,
+                "quantity": item.quantity,
+                "unit_price_cents": item.unit_price_cents,
+                "tax_cents": item.tax_cents,
+            }
+            for item in entry.items
+        )
+        outcome.results[index] = {
+            "index": index,
+            "patient_id": str(entry.patient_id),
+            "status": "created",
+            "invoice_id": str(invoice_id),
+            "invoice_number": number,
+            "total_amount_cents": total,
+        }
+    outcome.created = len(invoices)
+
+    db.bulk_insert_mappings(Invoice, invoices)
+    db.bulk_insert_mappings(InvoiceItem, items)
+    refresh_invoice_summaries(db, [invoice["id"] for invoice in invoices])
+    db.commit()
+    logger.info("Created %d invoices with %d items (%d rejected)", outcome.created, len(items), outcome.failed)
+    return outcome
@@ -0,0 +1,191 @@
+"""
+Bulk posting of manual (cash, cheque, card terminal) payments.
+
+A batch such as the front desk's end-of-day cash is validated row by row
+against invoices resolved with one IN query (by id or invoice number). The
+valid rows are posted in one transaction: payments, their raw payloads and
+audit records are bulk inserted and the invoices' paid balances and statuses are updated
+with one executemany through invoice_balance.apply_payments().
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.audit_log import ActorType, AuditLog
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.payment import Payment, PaymentRawEvent, PaymentStatus
+from app.services.invoice_balance import apply_payments
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_PAYMENTS = 10000
+
+
+@dataclass
+class BulkPaymentResult:
+    total: int = 0
+    created: int = 0
+    failed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    invoices: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "created": self.created,
+            "failed": self.failed,
+            "results": self.results,
+            "invoices": self.invoices,
+        }
+
+
+def _parse_uuid(value: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _resolve_invoices(db: Session, references: Sequence[str]) -> Dict[str, Any]:
+    """Map each reference (invoice id or invoice number) to its invoice row."""
+    ids = {ref: _parse_uuid(ref) for ref in set(references)}
+    uuids = [value for value in ids.values() if value is not None]
+    numbers = [ref for ref, value in ids.items() if value is None]
+    if not ids:
+        return {}
+    rows = (
+        db.query(Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.currency)
+        .filter(or_(Invoice.id.in_(uuids), Invoice.invoice_number.in_(numbers)))
+        .all()
+    )
+    by_id = {row.id: row for row in rows}
+    by_number = {row.invoice_number: row for row in rows}
+    return {
+        ref: by_id.get(value) if value is not None else by_number.get(ref)
+        for ref, value in ids.items()
+    }
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Naive UTC, like the datetime.utcnow() timestamps written elsewhere
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _validate(entry: Any, invoice: Any) -> Optional[str]:
+    if invoice is None:
+        return "Invoice not found"
+    if invoice.status == InvoiceStatus.CANCELLED:
+        return "Cannot add payment to cancelled invoice"
+    if entry.amount_cents <= 0:
+        return "amount_cents must be positive"
+    if (entry.currency or "").upper() != (invoice.currency or "USD").upper():
+        return f"Currency {entry.currency} does not match invoice currency {invoice.currency}"
+    return None
+
+
+def post_manual_payments(
+    db: Session,
+    entries: Sequence[Any],
+    actor_id: Optional[Any] = None,
+    all_or_nothing: bool = False,
+) -> BulkPaymentResult:
+    """Validate and post ``entries`` (objects shaped like schemas.PaymentCreate).
+
+    Every entry gets one item in ``results``, in input order. Invalid entries
+    are reported and skipped, or with ``all_or_nothing`` nothing is posted
+    when any entry is invalid. Commits once.
+    """
+    outcome = BulkPaymentResult(total=len(entries))
+    invoices = _resolve_invoices(db, [str(entry.invoice_id) for entry in entries])
+
+    now = datetime.utcnow()
+    payments: List[Dict[str, Any]] = []
+    raw_events: List[Dict[str, Any]] = []
+    audits: List[Dict[str, Any]] = []
+    totals: Dict[Any, Tuple[int, datetime]] = {}
+    for index, entry in enumerate(entries):
+        invoice = invoices.get(str(entry.invoice_id))
+        error = _validate(entry, invoice)
+        if error:
+            outcome.failed += 1
+            outcome.results.append({"index": index, "invoice_id": str(entry.invoice_id), "status": "failed", "error": error})
+            continue
+
+        payment_id = uuid.uuid4()
+        received_at = _utc(entry.received_at) or now
+        payments.append({
+            "id": payment_id,
+            "invoice_id": invoice.id,
+            "stripe_payment_id": f"manual_{uuid.uuid4().hex}",
+            "amount_cents": entry.amount_cents,
+            "currency": entry.currency.upper(),
+            "status": PaymentStatus.SUCCEEDED,
+            "received_at": received_at,
+        })
+        raw_events.append({"payment_id": payment_id, **PaymentRawEvent.encode({"method": entry.method, "note": entry.note})})
+        audits.append({
+            "id": uuid.uuid4(),
+            "actor_type": ActorType.STAFF,
+            "actor_id": actor_id,
+            "action": "create_payment",
+            "target_type": "payment",
+            "target_id": payment_id,
+            "details": {
+                "invoice_id": str(invoice.id),
+                "invoice_number": invoice.invoice_number,
+                "amount_cents": entry.amount_cents,
+                "method": entry.method,
+                "bulk": True,
+            },
+        })
+        amount, latest = totals.get(invoice.id, (0, received_at))
+        totals[invoice.id] = (amount + entry.amount_cents, max(latest, received_at))
+        outcome.created += 1
+        outcome.results.append({
+            "index": index,
+            "invoice_id": str(invoice.id),
+            "invoice_number": invoice.invoice_number,
+            "status": "created",
+            "payment_id": str(payment_id),
+            "amount_cents": entry.amount_cents,
+        })
+
+    if all_or_nothing and outcome.failed:
+        for result in outcome.results:
+            if result["status"] == "created":
+                result.update(status="skipped", payment_id=None, error="Batch has invalid rows")
+        outcome.created = 0
+        return outcome
+    if not payments:
+        return outcome
+
+    db.bulk_insert_mappings(Payment, payments)
+    db.bulk_insert_mappings(PaymentRawEvent, raw_events)
+    apply_payments(db, totals)
+    db.bulk_insert_mappings(AuditLog, audits)
+    db.commit()
+
+    outcome.invoices = [
+        {
+            "invoice_id": str(row.id),
+            "invoice_number": row.invoice_number,
+            "status": row.status.value,
+            "paid_cents": row.paid_cents,
+            "balance_cents": row.balance_cents,
+        }
+        for row in db.query(
+            Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.paid_cents, Invoice.balance_cents
+        ).filter(Invoice.id.in_(list(totals)))
+    ]
+    logger.info("Posted %d manual payments to %d invoices (%d rejected)", outcome.created, len(totals), outcome.failed)
+    return outcome
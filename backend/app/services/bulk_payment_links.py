@@ -0,0 +1,339 @@
+"""
+Bulk payment-link dispatch.
+
+Issues and sends payment links for many invoices at once. Invoices are
+processed in chunks: drafts in a chunk are issued with one UPDATE, Stripe
+checkout sessions are created (or reused) concurrently (bounded by
+``concurrency``), sessions are written back with one executemany UPDATE and the emails are
+queued in the email outbox, all committed once per chunk.
+
+The API runs dispatches in the background through payment_link_dispatcher:
+POST /payments/invoices/bulk-send-payment-links records a PaymentLinkRun and
+returns it at once, and each chunk commits the run's counters and its
+per-invoice PaymentLinkResult rows, which GET
+/payments/invoices/bulk-send-payment-links/{id} reports. send_payment_links.py
+runs a dispatch from the command line.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.outbox_email import OutboxEmail, OutboxEmailStatus
+from app.models.patient import Patient
+from app.models.payment_link_run import PaymentLinkResult, PaymentLinkRun, PaymentLinkRunStatus
+from app.services.audit_service import create_audit_log
+from app.services.email_templates import payment_link_email
+from app.services.invoice_summary import refresh_invoice_summaries
+from app.services.stripe_gateway import checkout_session_fields, invoice_checkout_amount
+
+logger = logging.getLogger(__name__)
+
+SENDABLE_STATUSES = (InvoiceStatus.DRAFT, InvoiceStatus.ISSUED, InvoiceStatus.PARTIALLY_PAID)
+
+
+@dataclass
+class BulkDispatchResult:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "results": self.results,
+        }
+
+
+def select_invoice_ids(
+    db: Session,
+    invoice_ids: Optional[Sequence[str]] = None,
+    status: Optional[InvoiceStatus] = None,
+    patient_id: Optional[str] = None,
+    due_date_from: Optional[date] = None,
+    due_date_to: Optional[date] = None,
+) -> List[Any]:
+    """Resolve an explicit id list or a filter to invoice ids, oldest first.
+
+    Without ids or a status only invoices that can still be paid are selected.
+    Raises ValueError for malformed ids.
+    """
+    query = db.query(Invoice.id)
+    if invoice_ids:
+        query = query.filter(Invoice.id.in_([uuid.UUID(str(i)) for i in invoice_ids]))
+    if status:
+        query = query.filter(Invoice.status == status)
+    elif not invoice_ids:
+        query = query.filter(Invoice.status.in_(SENDABLE_STATUSES))
+    if patient_id:
+        query = query.filter(Invoice.patient_id == uuid.UUID(str(patient_id)))
+    if due_date_from:
+        query = query.filter(Invoice.due_date >= due_date_from)
+    if due_date_to:
+        query = query.filter(Invoice.due_date <= due_date_to)
+    return [row.id for row in query.order_by(Invoice.created_at.asc(), Invoice.id.asc())]
+
+
+def dispatch_payment_links(
+    db: Session,
+    invoice_ids: Sequence[Any],
+    create_session: Callable[[Any], Any],
+    concurrency: int = 8,
+    chunk_size: int = 200,
+    progress: Optional[Callable[[int, int], None]] = None,
+    run: Optional[PaymentLinkRun] = None,
+) -> BulkDispatchResult:
+    """Issue, create checkout sessions for and queue payment-link emails for ``invoice_ids``.
+
+    ``create_session(invoice)`` must return a CheckoutSession; it is called from worker threads with a detached snapshot of the invoice.
+    Invoices that are paid or cancelled are skipped, invoices whose patient has
+    no email or whose session creation fails are reported as failed. Every
+    invoice gets one entry in ``results``. With ``run``, each chunk also
+    commits the run's counters and its PaymentLinkResult rows.
+    """
+    outcome = BulkDispatchResult(total=len(invoice_ids))
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="payment-links") as pool:
+        for start in range(0, len(invoice_ids), chunk_size):
+            chunk = list(invoice_ids[start:start + chunk_size])
+            reported = len(outcome.results)
+            _dispatch_chunk(db, chunk, create_session, pool, outcome)
+            if run is not None:
+                _record_chunk(db, run, outcome, outcome.results[reported:], len(chunk))
+            db.commit()
+            if progress:
+                progress(min(start + chunk_size, len(invoice_ids)), len(invoice_ids))
+    logger.info(
+        "Bulk payment links: %d sent, %d failed, %d skipped of %d",
+        outcome.sent, outcome.failed, outcome.skipped, outcome.total,
+    )
+    return outcome
+
+
+def _dispatch_chunk(db, chunk, create_session, pool, outcome: BulkDispatchResult) -> None:
+    rows = (
+        db.query(Invoice, Patient.email)
+        .join(Patient, Invoice.patient_id == Patient.id)
+        .filter(Invoice.id.in_(chunk))
+        .all()
+    )
+    found = {invoice.id: (invoice, email) for invoice, email in rows}
+
+    sendable = []
+    for invoice_id in chunk:
+        if invoice_id not in found:
+            outcome.failed += 1
+            outcome.results.append({"invoice_id": str(invoice_id), "status": "failed", "error": "Invoice not found"})
+            continue
+        invoice, email = found[invoice_id]
+        if invoice.status not in SENDABLE_STATUSES:
+            outcome.skipped += 1
+            outcome.results.append(_result(invoice, "skipped", error=f"Invoice is {invoice.status.value}"))
+        elif not email:
+            outcome.failed += 1
+            outcome.results.append(_result(invoice, "failed", error="Patient has no email address"))
+        else:
+            sendable.append((invoice, email))
+    if not sendable:
+        return
+
+    # Issue every draft of the chunk with one statement
+    now = datetime.utcnow()
+    draft_ids = [invoice.id for invoice, _ in sendable if invoice.status == InvoiceStatus.DRAFT]
+    if draft_ids:
+        db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(draft_ids), Invoice.status == InvoiceStatus.DRAFT)
+            .values(status=InvoiceStatus.ISSUED, issued_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        refresh_invoice_summaries(db, draft_ids, search_documents=False)
+
+    # Stripe calls run concurrently on plain snapshots, never touching the session
+    snapshots = [_snapshot(invoice) for invoice, _ in sendable]
+    futures = [pool.submit(create_session, snapshot) for snapshot in snapshots]
+
+    session_updates = []
+    emails = []
+    for (invoice, email), snapshot, future in zip(sendable, snapshots, futures):
+        try:
+            checkout_session = future.result()
+        except Exception as e:
+            logger.warning("Payment link for invoice %s failed: %s", invoice.invoice_number, e)
+            outcome.failed += 1
+            outcome.results.append(_result(invoice, "failed", error=str(e)))
+            continue
+        session_updates.append(
+            {"id": invoice.id, **checkout_session_fields(checkout_session, invoice_checkout_amount(snapshot))}
+        )
+        subject, plain_body, html_body = payment_link_email(snapshot, checkout_session.url)
+        emails.append({
+            "to_address": email,
+            "from_address": settings.EMAIL_FROM_ADDRESS,
+            "subject": subject,
+            "body": plain_body,
+            "html_body": html_body,
+            "related_type": "invoice",
+            "related_id": str(invoice.id),
+            "status": OutboxEmailStatus.PENDING,
+            "attempts": 0,
+        })
+        outcome.sent += 1
+        outcome.results.append(
+            _result(invoice, "sent", session_id=checkout_session.id, checkout_url=checkout_session.url, sent_to=email)
+        )
+
+    if session_updates:
+        db.execute(update(Invoice), session_updates)
+    if emails:
+        db.bulk_insert_mappings(OutboxEmail, emails)
+
+
+def _record_chunk(db: Session, run: PaymentLinkRun, outcome: BulkDispatchResult,
+                  results: List[Dict[str, Any]], processed: int) -> None:
+    if results:
+        db.execute(insert(PaymentLinkResult), [
+            {
+                "run_id": run.id,
+                "invoice_id": uuid.UUID(result["invoice_id"]),
+                "invoice_number": result.get("invoice_number"),
+                "status": result["status"],
+                "error": result.get("error"),
+                "session_id": result.get("session_id"),
+                "checkout_url": result.get("checkout_url"),
+                "sent_to": result.get("sent_to"),
+            }
+            for result in results
+        ])
+    run.processed += processed
+    run.sent, run.failed, run.skipped = outcome.sent, outcome.failed, outcome.skipped
+
+
+def _snapshot(invoice: Invoice) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=invoice.id,
+        invoice_number=invoice.invoice_number,
+        total_amount_cents=invoice.total_amount_cents,
+        balance_cents=invoice.balance_cents,
+        currency=invoice.currency,
+        due_date=invoice.due_date,
+        stripe_checkout_session_id=invoice.stripe_checkout_session_id,
+        stripe_checkout_url=invoice.stripe_checkout_url,
+        stripe_checkout_expires_at=invoice.stripe_checkout_expires_at,
+        stripe_checkout_amount_cents=invoice.stripe_checkout_amount_cents,
+    )
+
+
+def _result(invoice: Invoice, status: str, **extra: Any) -> Dict[str, Any]:
+    return {"invoice_id": str(invoice.id), "invoice_number": invoice.invoice_number, "status": status, **extra}
+
+
+def start_payment_link_run(db: Session, total: int, staff_id: Any = None) -> PaymentLinkRun:
+    """Record a pending dispatch of ``total`` invoices; commits."""
+    run = PaymentLinkRun(total=total, staff_id=staff_id, status=PaymentLinkRunStatus.PENDING)
+    db.add(run)
+    db.commit()
+    return run
+
+
+def run_payment_links(
+    db: Session,
+    run: PaymentLinkRun,
+    invoice_ids: Sequence[Any],
+    create_session: Callable[[Any], Any],
+    concurrency: int = 8,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> BulkDispatchResult:
+    """dispatch_payment_links() under ``run``. A failing dispatch is marked FAILED and the error re-raised."""
+    run.status = PaymentLinkRunStatus.RUNNING
+    db.commit()
+    try:
+        outcome = dispatch_payment_links(
+            db, invoice_ids, create_session, concurrency=concurrency, progress=progress, run=run
+        )
+        run.status = PaymentLinkRunStatus.COMPLETED
+        run.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        run.status = PaymentLinkRunStatus.FAILED
+        run.error = f"{e.__class__.__name__}: {e}"
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        logger.exception("Payment-link run %s failed after %d invoices", run.id, run.processed)
+        raise
+    return outcome
+
+
+class PaymentLinkDispatcher:
+    """Runs dispatches started through the API in a background thread, one at a time."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        run_id: uuid.UUID,
+        invoice_ids: Sequence[Any],
+        create_session: Callable[[Any], Any],
+        concurrency: int = 8,
+        wake: Optional[Callable[[], None]] = None,
+    ) -> Future:
+        """Dispatch ``invoice_ids`` under the pending run ``run_id``; ``wake`` is called after each chunk."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="payment-link-run")
+            return self._executor.submit(self._run, run_id, list(invoice_ids), create_session, concurrency, wake)
+
+    def _run(self, run_id, invoice_ids, create_session, concurrency, wake) -> None:
+        try:
+            with self.session_factory() as db:
+                run = db.get(PaymentLinkRun, run_id)
+                outcome = run_payment_links(
+                    db, run, invoice_ids, create_session, concurrency=concurrency,
+                    progress=(lambda done, total: wake()) if wake else None,
+                )
+                try:
+                    create_audit_log(
+                        db,
+                        actor_id=run.staff_id,
+                        actor_type='staff' if run.staff_id else None,
+                        action='bulk_send_payment_links',
+                        target_type='payment_link_run',
+                        target_id=run.id,
+                        details={'total': outcome.total, 'sent': outcome.sent, 'failed': outcome.failed, 'skipped': outcome.skipped}
+                    )
+                except Exception:
+                    logger.exception("[AUDIT ERROR] failed to create audit log for payment-link run %s", run_id)
+        except Exception:
+            # Already recorded on the run by run_payment_links()
+            logger.exception("Background payment-link run %s failed", run_id)
+
+    def stop(self) -> None:
+        """Wait for queued dispatches to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+payment_link_dispatcher = PaymentLinkDispatcher()
@@ -0,0 +1,238 @@
+"""
+Transactional email outbox.
+
+Request handlers call enqueue_email() inside the transaction that makes the
+change the email is about, so the message is stored if and only if that
+change commits. An EmailOutbox worker pool delivers stored messages in the
+background through the configured mailer, at most EMAIL_OUTBOX_WORKERS at a
+time, retrying failures with exponential backoff and marking a message
+FAILED after EMAIL_OUTBOX_MAX_ATTEMPTS attempts. A slow or unavailable mail
+provider therefore never holds an API request.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.outbox_email import OutboxEmail, OutboxEmailStatus
+from app.services.mailer import Mailer, get_mailer
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(
+    db: Session,
+    to: str,
+    subject: str,
+    body: str,
+    html_body: Optional[str] = None,
+    from_address: Optional[str] = None,
+    related_type: Optional[str] = None,
+    related_id: Optional[str] = None,
+) -> OutboxEmail:
+    """Queue an email in the caller's transaction. Does not commit."""
+    message = OutboxEmail(
+        to_address=to,
+        from_address=from_address,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        related_type=related_type,
+        related_id=related_id,
+        status=OutboxEmailStatus.PENDING,
+    )
+    db.add(message)
+    return message
+
+
+class EmailOutbox:
+    """Background worker pool draining the email_outbox table."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        mailer_factory: Callable[[], Mailer] = lambda: get_mailer(retries=1),
+        workers: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        poll_interval: float = 1.0,
+        base_backoff: float = 5.0,
+        lock_timeout: float = 300.0,
+    ):
+        self.session_factory = session_factory
+        # Retries are scheduled by the outbox, so the mailer itself only tries once
+        self.mailer_factory = mailer_factory
+        self.workers = settings.EMAIL_OUTBOX_WORKERS if workers is None else workers
+        self.max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.lock_timeout = lock_timeout
+        # Claims are tagged so several processes can share the table safely
+        self.instance_id = uuid.uuid4().hex
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.workers <= 0:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-outbox")
+        self._thread = threading.Thread(target=self._run, name="email-outbox-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("Email outbox started with %d workers", self.workers)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def wake(self) -> None:
+        """Signal the dispatcher that new messages were queued."""
+        self._wake.set()
+
+    def drain(self, db: Optional[Session] = None) -> int:
+        """Deliver every due message synchronously and return how many were handled.
+
+        Used by tests and maintenance scripts; the running app relies on the
+        background dispatcher instead.
+        """
+        own_session = db is None
+        db = db or self.session_factory()
+        handled = 0
+        try:
+            while True:
+                ids = self._claim_due(db, limit=100)
+                if not ids:
+                    break
+                for message_id in ids:
+                    self._deliver(db, message_id)
+                handled += len(ids)
+        finally:
+            if own_session:
+                db.close()
+        return handled
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch_once()
+            except Exception:
+                logger.exception("Email outbox dispatch failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _dispatch_once(self) -> None:
+        # Only claim what the pool can start now, so other instances can take the rest
+        with self._lock:
+            free = self.workers - self._inflight
+        if free <= 0:
+            return
+        with self.session_factory() as db:
+            ids = self._claim_due(db, limit=free)
+        for message_id in ids:
+            with self._lock:
+                self._inflight += 1
+            self._executor.submit(self._run_one, message_id)
+
+    def _run_one(self, message_id: int) -> None:
+        try:
+            with self.session_factory() as db:
+                self._deliver(db, message_id)
+        except Exception:
+            logger.exception("Email outbox worker failed on message %s", message_id)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+            self._wake.set()
+
+    def _claim_due(self, db: Session, limit: int) -> List[int]:
+        now = datetime.utcnow()
+        db.query(OutboxEmail).filter(
+            OutboxEmail.status == OutboxEmailStatus.SENDING,
+            OutboxEmail.locked_at < now - timedelta(seconds=self.lock_timeout),
+        ).update(
+            {"status": OutboxEmailStatus.PENDING, "locked_at": None, "locked_by": None},
+            synchronize_session=False,
+        )
+
+        ids = [
+            message_id
+            for (message_id,) in db.query(OutboxEmail.id)
+            .filter(
+                OutboxEmail.status == OutboxEmailStatus.PENDING,
+                or_(OutboxEmail.next_attempt_at.is_(None), OutboxEmail.next_attempt_at <= now),
+            )
+            .order_by(OutboxEmail.id.asc())
+            .limit(limit)
+        ]
+        if ids:
+            db.query(OutboxEmail).filter(
+                OutboxEmail.id.in_(ids),
+                OutboxEmail.status == OutboxEmailStatus.PENDING,
+            ).update(
+                {"status": OutboxEmailStatus.SENDING, "locked_at": now, "locked_by": self.instance_id},
+                synchronize_session=False,
+            )
+        db.commit()
+        if not ids:
+            return []
+        # Another instance may have claimed some of them between the select and the update
+        return [
+            message_id
+            for (message_id,) in db.query(OutboxEmail.id).filter(
+                OutboxEmail.id.in_(ids), OutboxEmail.locked_by == self.instance_id
+            )
+        ]
+
+    def _deliver(self, db: Session, message_id: int) -> None:
+        message = db.get(OutboxEmail, message_id)
+        if message is None or message.status != OutboxEmailStatus.SENDING or message.locked_by != self.instance_id:
+            return
+        message.attempts += 1
+        message.locked_at = None
+        message.locked_by = None
+        try:
+            self.mailer_factory().send_email(
+                to=message.to_address,
+                subject=message.subject,
+                body=message.body,
+                html_body=message.html_body,
+                from_address=message.from_address,
+            )
+        except Exception as e:
+            message.last_error = f"{e.__class__.__name__}: {e}"
+            if message.attempts >= self.max_attempts:
+                message.status = OutboxEmailStatus.FAILED
+                logger.error("Email %s to %s failed after %d attempts: %s", message.id, message.to_address, message.attempts, e)
+            else:
+                message.status = OutboxEmailStatus.PENDING
+                message.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.base_backoff * (2 ** (message.attempts - 1)))
+                logger.warning("Email %s to %s failed (attempt %d), retrying: %s", message.id, message.to_address, message.attempts, e)
+            db.commit()
+            return
+
+        message.status = OutboxEmailStatus.SENT
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+        db.commit()
+
+
+email_outbox = EmailOutbox()
@@ -0,0 +1,121 @@
+"""Email bodies sent by the billing endpoints."""
+
+from typing import Tuple
+
+from app.models.invoice import Invoice
+
+
+def payment_link_email(invoice: Invoice, checkout_url: str) -> Tuple[str, str, str]:
+    """Return (subject, plain text body, HTML body) of the payment request for an invoice."""
+    amount_display = f"{(invoice.total_amount_cents or 0) / 100:.2f}"
+    html_body = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Payment Request - Invoice {invoice.invoice_number}</title>
+        <style>
+            body {{
+                font-family: Arial, sans-serif;
+                line-height: 1.6;
+                color: #333;
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+            }}
+            .header {{
+                background-color: #f8f9fa;
+                padding: 20px;
+                border-radius: 8px;
+                margin-bottom: 20px;
+            }}
+            .invoice-details {{
+                background-color: #ffffff;
+                border: 1px solid #dee2e6;
+                border-radius: 8px;
+                padding: 20px;
+                margin-bottom: 20px;
+            }}
+            .payment-button {{
+                display: inline-block;
+                background-color: #007bff;
+                color: white;
+                padding: 15px 30px;
+                text-decoration: none;
+                border-radius: 5px;
+                font-weight: bold;
+                font-size: 16px;
+                margin: 20px 0;
+                text-align: center;
+            }}
+            .payment-button:hover {{
+                background-color: #0056b3;
+            }}
+            .footer {{
+                margin-top: 30px;
+                padding-top: 20px;
+                border-top: 1px solid #dee2e6;
+                font-size: 14px;
+                color: #6c757d;
+            }}
+            .amount {{
+                font-size: 24px;
+                font-weight: bold;
+                color: #28a745;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>Payment Request</h1>
+            <p>You have an outstanding invoice that requires payment.</p>
+        </div>
+        
+        <div class="invoice-details">
+            <h2>Invoice Details</h2>
+            <p><strong>Invoice Number:</strong> {invoice.invoice_number}</p>
+            <p><strong>Amount Due:</strong> <span class="amount">${amount_display} {invoice.currency}</span></p>
+            <p><strong>Due Date:</strong> {invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'Not specified'}</p>
+        </div>
+        
+        <div style="text-align: center;">
+            <a href="{checkout_url}" class="payment-button" target="_blank">
+                Complete Payment
+            </a>
+        </div>
+        
+        <p>Click the button above to securely complete your payment. You will be redirected to our secure payment processor.</p>
+        
+        <p>If the button doesn't work, you can copy and paste this link into your browser:</p>
+        <p style="word-break: break-all; background-color: #f8f9fa; padding: 10px; border-radius: 4px;">
+            {checkout_url}
+        </p>
+        
+        <div class="footer">
+            <p>This is an automated message. Please do not reply to this email.</p>
+            <p>If you have any questions about this invoice, please contact our billing department.</p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Plain text version for email clients that don't support HTML
+    plain_body = f"""
+Payment Request - Invoice {invoice.invoice_number}
+
+You have an outstanding invoice that requires payment.
+
+Invoice Details:
+- Invoice Number: {invoice.invoice_number}
+- Amount Due: ${amount_display} {invoice.currency}
+- Due Date: {invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'Not specified'}
+
+To complete your payment, please visit:
+{checkout_url}
+
+This is an automated message. Please do not reply to this email.
+If you have any questions about this invoice, please contact our billing department.
+    """
+
+    return f'Payment Request - Invoice {invoice.invoice_number}', plain_body, html_body
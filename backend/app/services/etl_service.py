@@ -145,36 +145,19 @@ class ETLService:
     def _load_outstanding_payments(self, db: Session) -> None:
         """Rebuild outstanding_payments snapshot from operational tables.
 
-        Definition (initial): invoices where total_amount_cents - sum(succeeded payments) > 0
-        days_overdue from invoice.due_date; last_payment_date from max(payment.received_at)
+        Definition (initial): invoices with a positive balance_cents (kept up to
+        date by app.services.invoice_balance, so payments are not aggregated here)
+        days_overdue from invoice.due_date; last_payment_date from invoice.last_payment_at
         status: 'overdue' when days_overdue > 0 else 'overdue' (kept simple for MVP)
         """
         # Clear existing snapshot
         db.execute(text("DELETE FROM outstanding_payments"))
 
-        # Aggregate payments per invoice
-        payment_rows = db.execute(
-            text(
-                """
-                SELECT invoice_id,
-                       COALESCE(SUM(CASE WHEN status = 'SUCCEEDED' THEN amount_cents ELSE 0 END), 0) AS paid_cents,
-                       MAX(CASE WHEN status = 'SUCCEEDED' THEN received_at END) AS last_paid_at
-                FROM payments
-                GROUP BY invoice_id
-                """
-            )
-        ).fetchall()
-        paid_by_invoice: Dict[str, Tuple[int, datetime | None]] = {}
-        for r in payment_rows:
-            paid_by_invoice[str(r[0])] = (int(r[1] or 0), r[2])
-
         today = datetime.utcnow().date()
-        inv_query = db.query(Invoice)
+        inv_query = db.query(Invoice).filter(Invoice.balance_cents > 0)
         for inv in inv_query.all():
-            paid_cents, last_paid_at = paid_by_invoice.get(str(inv.id), (0, None))
-            due_cents = max((inv.total_amount_cents or 0) - paid_cents, 0)
-            if due_cents <= 0:
-                continue
+            due_cents = inv.balance_cents
+            last_paid_at = inv.last_payment_at
             days_overdue = 0
             if inv.due_date:
                 days_overdue = max((today - inv.due_date).days, 0)
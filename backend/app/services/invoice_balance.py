@@ -0,0 +1,193 @@
+"""
+Denormalized paid balance on invoices.
+
+Invoice.paid_cents, balance_cents and last_payment_at are maintained by
+apply_payment() (apply_payments() for a batch) inside the same transaction that records (or refunds) the
+payment, so reading an invoice's balance or status never has to aggregate
+the payments table. find_balance_drift()/repair_balances() compare the
+counters with the payments they summarize and fix any drift.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, func, literal, null, or_, update
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.payment import Payment, PaymentStatus
+from app.services.invoice_summary import refresh_invoice_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def _status(value: InvoiceStatus):
+    # Bind through the column's Enum type so the stored enum name is used
+    return literal(value, Invoice.status.type)
+
+
+def _status_for(paid: Any):
+    # Status of an invoice with ``paid`` cents paid; cancelled invoices keep their status
+    return case(
+        (Invoice.status == InvoiceStatus.CANCELLED, Invoice.status),
+        (
+            paid <= 0,
+            case(
+                # Not in_(): an expanding IN can't be used by apply_payments()' executemany
+                (
+                    or_(Invoice.status == InvoiceStatus.PAID, Invoice.status == InvoiceStatus.PARTIALLY_PAID),
+                    _status(InvoiceStatus.ISSUED),
+                ),
+                else_=Invoice.status,
+            ),
+        ),
+        (paid >= Invoice.total_amount_cents, _status(InvoiceStatus.PAID)),
+        else_=_status(InvoiceStatus.PARTIALLY_PAID),
+    )
+
+
+def _balance_values(amount_cents: Any) -> Dict[str, Any]:
+    # New counters and status for adding amount_cents (a value or bind parameter);
+    # a fully paid invoice is no longer overdue
+    new_paid = Invoice.paid_cents + amount_cents
+    return {
+        "overdue_at": case((new_paid >= Invoice.total_amount_cents, null()), else_=Invoice.overdue_at),
+        "paid_cents": new_paid,
+        "balance_cents": Invoice.total_amount_cents - new_paid,
+        "status": _status_for(new_paid),
+    }
+
+
+def _last_payment_value(received_at: Any):
+    return case(
+        (or_(Invoice.last_payment_at.is_(None), Invoice.last_payment_at < received_at), received_at),
+        else_=Invoice.last_payment_at,
+    )
+
+
+def apply_payment(
+    db: Session,
+    invoice: Invoice,
+    amount_cents: int,
+    received_at: Optional[datetime] = None,
+) -> None:
+    """Add ``amount_cents`` (negative for a refund) to the invoice's paid balance.
+
+    The counters are incremented in SQL rather than read-modify-written, so
+    concurrent payments for the same invoice serialize on the row lock
+    instead of losing updates. The invoice status follows the new balance;
+    cancelled invoices keep their status. Does not commit.
+    """
+    values = _balance_values(amount_cents)
+    if amount_cents > 0:
+        values["last_payment_at"] = _last_payment_value(received_at or datetime.utcnow())
+
+    db.execute(
+        update(Invoice).where(Invoice.id == invoice.id).values(**values),
+        execution_options={"synchronize_session": "fetch"},
+    )
+    refresh_invoice_summaries(db, [invoice.id], search_documents=False)
+
+
+def apply_payments(db: Session, totals: Dict[Any, Tuple[int, datetime]]) -> None:
+    """Add received payments to many invoices at once.
+
+    ``totals`` maps invoice id to (amount_cents > 0, latest received_at). The
+    same statement as apply_payment() is run once as an executemany, so a
+    batch costs one round trip rather than one per invoice. Invoices of
+    ``totals`` already loaded in the session are expired. Does not commit.
+    """
+    if not totals:
+        return
+    values = _balance_values(bindparam("b_amount", type_=Invoice.paid_cents.type))
+    values["last_payment_at"] = _last_payment_value(bindparam("b_received_at", type_=Invoice.last_payment_at.type))
+    stmt = update(Invoice).where(Invoice.id == bindparam("b_id", type_=Invoice.id.type)).values(**values)
+    db.connection().execute(
+        stmt,
+        [
+            {"b_id": invoice_id, "b_amount": amount, "b_received_at": received_at}
+            for invoice_id, (amount, received_at) in totals.items()
+        ],
+    )
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, Invoice) and obj.id in totals:
+            db.expire(obj)
+    refresh_invoice_summaries(db, totals, search_documents=False)
+
+
+def _payment_totals(db: Session):
+    return (
+        db.query(
+            Payment.invoice_id.label("invoice_id"),
+            func.coalesce(
+                func.sum(case((Payment.status == PaymentStatus.SUCCEEDED, Payment.amount_cents), else_=0)), 0
+            ).label("paid_cents"),
+            func.max(case((Payment.status == PaymentStatus.SUCCEEDED, Payment.received_at))).label("last_payment_at"),
+        )
+        .group_by(Payment.invoice_id)
+        .subquery()
+    )
+
+
+def find_balance_drift(db: Session) -> List[Dict[str, Any]]:
+    """Invoices whose stored paid/balance counters or status disagree with their payments."""
+    totals = _payment_totals(db)
+    expected_paid = func.coalesce(totals.c.paid_cents, 0)
+    expected_status = _status_for(expected_paid)
+    rows = (
+        db.query(Invoice, expected_paid.label("expected_paid"), totals.c.last_payment_at, expected_status.label("expected_status"))
+        .outerjoin(totals, totals.c.invoice_id == Invoice.id)
+        .filter(
+            or_(
+                Invoice.paid_cents != expected_paid,
+                Invoice.balance_cents != Invoice.total_amount_cents - expected_paid,
+                Invoice.status != expected_status,
+            )
+        )
+        .all()
+    )
+    return [
+        {
+            "invoice": invoice,
+            "stored_paid_cents": invoice.paid_cents,
+            "stored_balance_cents": invoice.balance_cents,
+            "paid_cents": int(paid),
+            "balance_cents": (invoice.total_amount_cents or 0) - int(paid),
+            "last_payment_at": last_payment_at,
+            "stored_status": invoice.status,
+            "status": expected,
+        }
+        for invoice, paid, last_payment_at, expected in rows
+    ]
+
+
+def repair_balances(db: Session, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Recompute the counters and status of every drifted invoice from its payments.
+
+    Returns the drift that was found (and, unless ``dry_run``, fixed).
+    """
+    drift = find_balance_drift(db)
+    for entry in drift:
+        invoice = entry["invoice"]
+        logger.warning(
+            "Invoice %s balance drift: stored paid=%s balance=%s status=%s, payments paid=%s balance=%s status=%s",
+            invoice.invoice_number,
+            entry["stored_paid_cents"],
+            entry["stored_balance_cents"],
+            entry["stored_status"].value,
+            entry["paid_cents"],
+            entry["balance_cents"],
+            entry["status"].value,
+        )
+        if dry_run:
+            continue
+        invoice.paid_cents = entry["paid_cents"]
+        invoice.balance_cents = entry["balance_cents"]
+        invoice.last_payment_at = entry["last_payment_at"]
+        invoice.status = entry["status"]
+    if not dry_run:
+        db.commit()
+    return drift
@@ -0,0 +1,78 @@
+"""
+Invoice number allocation.
+
+Invoice numbers have the form CLINIC-YYYYMM-NNNN, with NNNN restarting every
+month. Each month has a row in invoice_number_counters holding the last number
+handed out; allocating is a single ``UPDATE ... SET last_value = last_value + n
+RETURNING last_value``, which the database serialises, so concurrent invoice
+creations never draw the same number and never have to retry on the unique
+constraint. The increment commits in its own short transaction so the counter
+row is not locked for the rest of the caller's transaction; a number whose
+invoice is rolled back is skipped, like a database sequence would.
+
+Bulk creation asks for a block of ``count`` numbers in one statement.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.db.dialect import insert_ignore
+from app.models.invoice import Invoice
+from app.models.invoice_number_counter import InvoiceNumberCounter
+
+PREFIX = "CLINIC"
+
+
+def format_invoice_number(period: str, sequence: int) -> str:
+    return f"{PREFIX}-{period}-{sequence:04d}"
+
+
+def _increment(db: Session, period: str, count: int) -> Optional[int]:
+    return db.execute(
+        update(InvoiceNumberCounter)
+        .where(InvoiceNumberCounter.period == period)
+        .values(last_value=InvoiceNumberCounter.last_value + count, updated_at=func.now())
+        .returning(InvoiceNumberCounter.last_value),
+        execution_options={"synchronize_session": False},
+    ).scalar()
+
+
+def _seed(db: Session, period: str) -> None:
+    """Create the month's counter, continuing after any invoice numbered before counters existed."""
+    last = (
+        db.query(Invoice.invoice_number)
+        .filter(Invoice.invoice_number.like(f"{PREFIX}-{period}-%"))
+        .order_by(Invoice.invoice_number.desc())
+        .first()
+    )
+    start = int(last.invoice_number.rsplit("-", 1)[-1]) if last else 0
+    insert_ignore(
+        db,
+        InvoiceNumberCounter.__table__,
+        {"period": period, "last_value": start},
+        conflict_columns=["period"],
+    )
+
+
+def allocate_invoice_numbers(db: Session, count: int = 1, when: Optional[datetime] = None) -> List[str]:
+    """Reserve ``count`` consecutive invoice numbers for the month of ``when`` (default now)."""
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    period = (when or datetime.now()).strftime("%Y%m")
+    with Session(bind=db.get_bind()) as counter_db:
+        last = _increment(counter_db, period, count)
+        if last is None:
+            # First invoice of the month; a concurrent seed is ignored and both increment the same row
+            _seed(counter_db, period)
+            last = _increment(counter_db, period, count)
+        counter_db.commit()
+    return [format_invoice_number(period, sequence) for sequence in range(last - count + 1, last + 1)]
+
+
+def allocate_invoice_number(db: Session, when: Optional[datetime] = None) -> str:
+    return allocate_invoice_numbers(db, 1, when)[0]
@@ -0,0 +1,266 @@
+"""
+Invoice PDF documents, cached on disk by content hash.
+
+invoice_snapshot() reads everything an invoice PDF shows (invoice, patient,
+line items, payments) into plain data, and its sha256 (together with
+RENDER_VERSION) names the rendered file and serves as the HTTP ETag. An
+unchanged invoice is therefore served straight from INVOICE_PDF_CACHE_DIR, or
+answered with 304 when the client already holds that version, and any change
+to the invoice, its items or its payments yields a new hash and a new render.
+
+Rendering runs in a small thread pool (INVOICE_PDF_WORKERS) so bursts of
+downloads cannot tie up every request thread with reportlab work; concurrent
+requests for the same document share one render.
+
+Superseded versions are not deleted when a new one is rendered, since a
+concurrent request may still be streaming the older file. Every cache hit
+touches its file, and files untouched for INVOICE_PDF_MAX_AGE_HOURS are swept
+after a render, at most once per _SWEEP_INTERVAL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.models.invoice import Invoice
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so cached documents are rendered again
+RENDER_VERSION = 1
+
+# Seconds between sweeps of the cache directory
+_SWEEP_INTERVAL = 3600
+
+
+def _cents(amount: Optional[int], currency: str) -> str:
+    return f"{(amount or 0) / 100:,.2f} {currency}"
+
+
+def _iso(value: Any) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def invoice_snapshot(db: Session, invoice_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    """Everything the PDF of ``invoice_id`` shows, as JSON-serialisable data; None if not found."""
+    invoice = (
+        db.query(Invoice)
+        .options(selectinload(Invoice.items), selectinload(Invoice.payments), selectinload(Invoice.patient))
+        .filter(Invoice.id == invoice_id)
+        .first()
+    )
+    if invoice is None:
+        return None
+    patient = invoice.patient
+    return {
+        "id": str(invoice.id),
+        "invoice_number": invoice.invoice_number,
+        "status": invoice.status.value,
+        "currency": invoice.currency,
+        "total_amount_cents": invoice.total_amount_cents,
+        "paid_cents": invoice.paid_cents,
+        "balance_cents": invoice.balance_cents,
+        "issued_at": _iso(invoice.issued_at),
+        "due_date": _iso(invoice.due_date),
+        "created_at": _iso(invoice.created_at),
+        "patient": {
+            "name": patient.name if patient else None,
+            "email": patient.email if patient else None,
+            "phone": patient.phone if patient else None,
+        },
+        "items": sorted(
+            (
+                {
+                    "id": str(item.id),
+                    "description": item.description,
+                    "quantity": item.quantity,
+                    "unit_price_cents": item.unit_price_cents,
+                    "tax_cents": item.tax_cents,
+                }
+                for item in invoice.items
+            ),
+            key=lambda item: item["id"],
+        ),
+        "payments": sorted(
+            (
+                {
+                    "id": str(payment.id),
+                    "amount_cents": payment.amount_cents,
+                    "currency": payment.currency,
+                    "status": payment.status.value,
+                    "received_at": _iso(payment.received_at),
+                }
+                for payment in invoice.payments
+            ),
+            key=lambda payment: (payment["received_at"] or "", payment["id"]),
+        ),
+    }
+
+
+def snapshot_digest(snapshot: Dict[str, Any]) -> str:
+    canonical = json.dumps([RENDER_VERSION, snapshot], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def render_invoice_pdf(snapshot: Dict[str, Any]) -> bytes:
+    currency = snapshot["currency"]
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    top = A4[1] - 60
+    y = top
+    c.setTitle(f"Invoice {snapshot['invoice_number']}")
+
+    def row(*columns: Tuple[float, str], bold: bool = False, size: int = 10, step: float = 16) -> None:
+        nonlocal y
+        if y < 60:
+            c.showPage()
+            y = top
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        for x, text in columns:
+            c.drawString(x, y, text)
+        y -= step
+
+    row((50, settings.APP_NAME), bold=True, size=14, step=24)
+    row((50, f"Invoice {snapshot['invoice_number']}"), bold=True, size=12, step=20)
+    row((50, f"Status: {snapshot['status'].replace('_', ' ')}"))
+    if snapshot["issued_at"]:
+        row((50, f"Issued: {snapshot['issued_at'][:10]}"))
+    if snapshot["due_date"]:
+        row((50, f"Due: {snapshot['due_date']}"))
+
+    patient = snapshot["patient"]
+    y -= 8
+    row((50, "Bill to:"), bold=True)
+    for detail in (patient["name"], patient["email"], patient["phone"]):
+        if detail:
+            row((60, detail))
+
+    y -= 8
+    row((50, "Description"), (330, "Qty"), (380, "Unit price"), (480, "Amount"), bold=True)
+    for item in snapshot["items"]:
+        amount = item["quantity"] * item["unit_price_cents"] + item["tax_cents"]
+        row(
+            (50, item["description"][:55]),
+            (330, str(item["quantity"])),
+            (380, _cents(item["unit_price_cents"], currency)),
+            (480, _cents(amount, currency)),
+        )
+    y -= 8
+    row((380, f"Total: {_cents(snapshot['total_amount_cents'], currency)}"), bold=True)
+    row((380, f"Paid: {_cents(snapshot['paid_cents'], currency)}"))
+    row((380, f"Balance due: {_cents(snapshot['balance_cents'], currency)}"), bold=True)
+
+    if snapshot["payments"]:
+        y -= 8
+        row((50, "Payments"), bold=True)
+        for payment in snapshot["payments"]:
+            received = (payment["received_at"] or "")[:10]
+            row((60, f"{received}  {_cents(payment['amount_cents'], payment['currency'])}  {payment['status']}"))
+
+    c.showPage()
+    c.save()
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+class InvoicePdfCache:
+    """Rendered invoice PDFs on disk, named ``<invoice id>-<digest>.pdf``."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        workers: Optional[int] = None,
+        renderer: Callable[[Dict[str, Any]], bytes] = render_invoice_pdf,
+        max_age_hours: Optional[float] = None,
+    ):
+        self.directory = Path(directory or settings.INVOICE_PDF_CACHE_DIR)
+        self.workers = workers or settings.INVOICE_PDF_WORKERS
+        self.renderer = renderer
+        self.max_age_hours = max_age_hours if max_age_hours is not None else settings.INVOICE_PDF_MAX_AGE_HOURS
+        self._last_sweep = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, snapshot: Dict[str, Any], digest: str) -> Path:
+        return Path(self.directory) / f"{snapshot['id']}-{digest}.pdf"
+
+    def render(self, snapshot: Dict[str, Any], digest: str) -> Future:
+        """Future for the cached file's path, rendering it in the pool unless already on disk."""
+        path = self.path_for(snapshot, digest)
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is not None:
+                return future
+            try:
+                # Marks the file as in use so the sweep keeps it
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            else:
+                future = Future()
+                future.set_result(path)
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="invoice-pdf")
+            future = self._executor.submit(self._render_to_disk, snapshot, path)
+            self._pending[digest] = future
+        future.add_done_callback(lambda _: self._forget(digest))
+        return future
+
+    def _forget(self, digest: str) -> None:
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _render_to_disk(self, snapshot: Dict[str, Any], path: Path) -> Path:
+        pdf = self.renderer(snapshot)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(pdf)
+        os.replace(tmp, path)
+        logger.info("Rendered invoice %s PDF (%d bytes)", snapshot["invoice_number"], len(pdf))
+        if time.monotonic() - self._last_sweep >= _SWEEP_INTERVAL:
+            self.sweep()
+        return path
+
+    def sweep(self) -> int:
+        """Delete cached files not served for max_age_hours; returns how many were removed."""
+        cutoff = time.time() - self.max_age_hours * 3600
+        removed = 0
+        # Under the lock, so a file cannot be resolved by render() and then removed here
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            for stale in Path(self.directory).glob("*.pdf*"):
+                try:
+                    if stale.stat().st_mtime < cutoff:
+                        stale.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info("Removed %d cached invoice PDFs older than %s hours", removed, self.max_age_hours)
+        return removed
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+invoice_pdf_cache = InvoicePdfCache()
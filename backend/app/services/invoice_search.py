@@ -0,0 +1,105 @@
+"""
+Full-text invoice search.
+
+Each invoice has an invoice_search row whose ``document`` holds its number,
+patient name and item descriptions. refresh_search_documents() rewrites those
+rows together with the invoice_summary rows (it is called from
+invoice_summary.refresh_invoice_summaries(), so every write path that keeps
+the summary current keeps the search index current too). The database indexes
+the documents itself: a GIN-indexed tsvector column on Postgres, an FTS5 table
+on SQLite (see app.models.invoice_search).
+
+search_invoices() turns the words typed by staff into a prefix query ("smi
+0042" finds invoice CLINIC-202410-0042 of Jane Smith) and returns the
+matching invoice_summary rows, best match first.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.invoice_search import InvoiceSearchDocument
+from app.models.invoice_summary import InvoiceSummary
+from app.models.patient import Patient
+
+_TERM = re.compile(r"[^\W_]+")
+MAX_TERMS = 8
+
+
+def search_terms(text: str) -> List[str]:
+    return [term.lower() for term in _TERM.findall(text or "")][:MAX_TERMS]
+
+
+def refresh_search_documents(
+    db: Session,
+    invoice_ids: Optional[Iterable[Any]] = None,
+    patient_ids: Optional[Iterable[Any]] = None,
+) -> None:
+    """Rewrite the search documents of ``invoice_ids`` and of all invoices of ``patient_ids``. Does not commit."""
+    invoice_ids = list(set(invoice_ids or ()))
+    patient_ids = list(set(patient_ids or ()))
+    if not invoice_ids and not patient_ids:
+        return
+    conn = db.connection()
+    invoices = conn.execute(
+        select(Invoice.id, Invoice.invoice_number, Patient.name)
+        .outerjoin(Patient, Patient.id == Invoice.patient_id)
+        .where(or_(Invoice.id.in_(invoice_ids), Invoice.patient_id.in_(patient_ids)))
+    ).all()
+    found = [row.id for row in invoices]
+    descriptions = defaultdict(list)
+    if found:
+        for row in conn.execute(
+            select(InvoiceItem.invoice_id, InvoiceItem.description).where(InvoiceItem.invoice_id.in_(found))
+        ):
+            descriptions[row.invoice_id].append(row.description)
+
+    conn.execute(delete(InvoiceSearchDocument).where(InvoiceSearchDocument.invoice_id.in_(set(invoice_ids) | set(found))))
+    if invoices:
+        conn.execute(
+            insert(InvoiceSearchDocument),
+            [
+                {
+                    "invoice_id": row.id,
+                    "document": " ".join(filter(None, [row.invoice_number, row.name, *descriptions[row.id]])),
+                }
+                for row in invoices
+            ],
+        )
+
+
+def search_invoices(db: Session, text: str, limit: int = 20, offset: int = 0) -> List[Tuple[InvoiceSummary, float]]:
+    """(summary row, relevance) pairs for invoices matching every word of ``text`` as a prefix."""
+    terms = search_terms(text)
+    if not terms:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        document = literal_column("invoice_search.document_tsv")
+        query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        rank = func.ts_rank(document, query)
+        stmt = (
+            select(InvoiceSummary, rank.label("rank"))
+            .join(InvoiceSearchDocument, InvoiceSearchDocument.invoice_id == InvoiceSummary.invoice_id)
+            .where(document.op("@@")(query))
+            .order_by(rank.desc(), InvoiceSummary.created_at.desc())
+        )
+    else:
+        fts = literal_column("invoice_search_fts")
+        # bm25() is lower for better matches; negated so that higher is better on both dialects
+        rank = -func.bm25(fts)
+        stmt = (
+            select(InvoiceSummary, rank.label("rank"))
+            .select_from(table("invoice_search_fts"))
+            .join(InvoiceSearchDocument, literal_column("invoice_search.rowid") == literal_column("invoice_search_fts.rowid"))
+            .join(InvoiceSummary, InvoiceSummary.invoice_id == InvoiceSearchDocument.invoice_id)
+            .where(fts.op("MATCH")(" ".join(f'"{term}"*' for term in terms)))
+            .order_by(rank.desc(), InvoiceSummary.created_at.desc())
+        )
+    return [(row.InvoiceSummary, float(row.rank)) for row in db.execute(stmt.limit(limit).offset(offset))]
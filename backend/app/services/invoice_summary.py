@@ -0,0 +1,139 @@
+"""
+Maintenance of the invoice_summary read model.
+
+refresh_invoice_summaries() rewrites the summary rows of the given invoices
+(or of every invoice of the given patients) from invoices and patients with
+one DELETE and one INSERT ... SELECT, inside the caller's transaction, and
+their full-text search documents with them (app.services.invoice_search).
+
+ORM writes are picked up automatically: a Session listener (registered by
+importing app.models) collects the invoices, invoice items and patients each
+flush inserted, changed or deleted and refreshes their rows right after the
+flush. Statements that bypass the unit of work
+(apply_payment()'s UPDATE, bulk inserts, bulk status changes) call
+refresh_invoice_summaries() themselves. Concurrent refreshes of one invoice
+are serialised by the row lock of the invoice write that precedes them.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.invoice_search import InvoiceSearchDocument
+from app.models.invoice_summary import InvoiceSummary
+from app.models.patient import Patient
+from app.services.invoice_search import refresh_search_documents
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "invoice_summary_pending"
+REBUILD_CHUNK = 5000
+
+
+def _summary_select():
+    return (
+        select(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.patient_id,
+            Patient.name,
+            Patient.email,
+            Invoice.currency,
+            Invoice.total_amount_cents,
+            Invoice.paid_cents,
+            Invoice.balance_cents,
+            Invoice.last_payment_at,
+            Invoice.status,
+            Invoice.due_date,
+            Invoice.overdue_at,
+            Invoice.created_at,
+        )
+        .select_from(Invoice)
+        .outerjoin(Patient, Patient.id == Invoice.patient_id)
+    )
+
+
+_COLUMNS = [
+    "invoice_id",
+    "invoice_number",
+    "patient_id",
+    "patient_name",
+    "patient_email",
+    "currency",
+    "total_amount_cents",
+    "paid_cents",
+    "balance_cents",
+    "last_payment_at",
+    "status",
+    "due_date",
+    "overdue_at",
+    "created_at",
+]
+
+
+def refresh_invoice_summaries(
+    db: Session,
+    invoice_ids: Optional[Iterable[Any]] = None,
+    patient_ids: Optional[Iterable[Any]] = None,
+    search_documents: bool = True,
+) -> None:
+    """Rewrite the summary rows of ``invoice_ids`` and of all invoices of ``patient_ids``. Does not commit.
+
+    Payment and status changes leave the searchable text alone and pass
+    ``search_documents=False``.
+    """
+    invoice_ids = list(set(invoice_ids or ()))
+    patient_ids = list(set(patient_ids or ()))
+    conn = db.connection()
+    source = _summary_select()
+    if invoice_ids:
+        conn.execute(delete(InvoiceSummary).where(InvoiceSummary.invoice_id.in_(invoice_ids)))
+        conn.execute(insert(InvoiceSummary).from_select(_COLUMNS, source.where(Invoice.id.in_(invoice_ids))))
+    if patient_ids:
+        conn.execute(delete(InvoiceSummary).where(InvoiceSummary.patient_id.in_(patient_ids)))
+        conn.execute(insert(InvoiceSummary).from_select(_COLUMNS, source.where(Invoice.patient_id.in_(patient_ids))))
+    if search_documents:
+        refresh_search_documents(db, invoice_ids, patient_ids)
+
+
+def rebuild_invoice_summaries(db: Session) -> int:
+    """Rebuild the whole read model and search index from invoices; returns the row count. Commits."""
+    conn = db.connection()
+    conn.execute(delete(InvoiceSummary))
+    count = conn.execute(insert(InvoiceSummary).from_select(_COLUMNS, _summary_select())).rowcount
+    conn.execute(delete(InvoiceSearchDocument))
+    invoice_ids = conn.execute(select(InvoiceSummary.invoice_id)).scalars().all()
+    for start in range(0, len(invoice_ids), REBUILD_CHUNK):
+        refresh_search_documents(db, invoice_ids[start:start + REBUILD_CHUNK])
+    db.commit()
+    logger.info("Rebuilt invoice_summary with %s rows", count)
+    return count
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context: Any) -> None:
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Invoice):
+            key, value = "invoices", obj.id
+        elif isinstance(obj, InvoiceItem):
+            key, value = "invoices", obj.invoice_id
+        elif isinstance(obj, Patient) and obj not in session.new:
+            key, value = "patients", obj.id
+        else:
+            continue
+        if pending is None:
+            pending = session.info.setdefault(_PENDING_KEY, {"invoices": set(), "patients": set()})
+        pending[key].add(value)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _refresh_changed(session: Session, flush_context: Any) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        refresh_invoice_summaries(session, pending["invoices"], pending["patients"])
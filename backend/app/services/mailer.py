@@ -138,7 +138,7 @@ def _safe_starttls(smtp):
         raise
 
 
-def get_mailer() -> Mailer:
+def get_mailer(retries: int = 3) -> Mailer:
     # Select provider according to settings.MAIL_PROVIDER or available credentials
     provider = getattr(settings, 'MAIL_PROVIDER', '') or ''
     provider = provider.lower()
@@ -146,9 +146,9 @@ def get_mailer() -> Mailer:
     if provider == 'sendgrid' or getattr(settings, 'SENDGRID_API_KEY', ''):
         api_key = getattr(settings, 'SENDGRID_API_KEY', '')
         if api_key:
-            return SendGridMailer(api_key, settings.EMAIL_FROM_ADDRESS)
+            return SendGridMailer(api_key, settings.EMAIL_FROM_ADDRESS, retries=retries)
 
     if provider == 'smtp' or (settings.SMTP_HOST and settings.SMTP_USERNAME and settings.SMTP_PASSWORD):
-        return SMTPMailer(settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_USERNAME, settings.SMTP_PASSWORD, settings.EMAIL_FROM_ADDRESS)
+        return SMTPMailer(settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_USERNAME, settings.SMTP_PASSWORD, settings.EMAIL_FROM_ADDRESS, retries=retries)
 
     return ConsoleMailer()
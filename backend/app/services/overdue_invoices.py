@@ -0,0 +1,188 @@
+"""
+Overdue invoice scan.
+
+scan_overdue_invoices() flags issued and partially paid invoices whose
+due_date has passed. It walks them per status in (due_date, id) order through
+ix_invoices_status_due_date, OVERDUE_SCAN_BATCH_SIZE rows at a time, and for
+each batch sets invoices.overdue_at and writes an "invoice_overdue" audit
+event per invoice in one transaction. Each batch commits on its own, so a
+large backlog never holds a long transaction, and the run is recorded with
+the number of invoices flagged in etl_process_status.
+
+Flagged invoices carry overdue_at into invoice_summary; paying, cancelling or
+re-dating an invoice clears it (app.services.invoice_balance and the Invoice
+before_update hook), and a later scan flags it again if it is still past due.
+
+Only invoices not flagged yet are updated and the UPDATE returns the ids it
+changed, so overlapping runs (several app processes, or the CLI next to the
+app) never flag an invoice or emit its event twice.
+
+OverdueScanner runs the scan every OVERDUE_SCAN_INTERVAL_SECONDS in a
+background thread; scan_overdue_invoices.py runs it once, e.g. from cron.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.audit_log import ActorType, AuditLog
+from app.models.etl_status import ETLProcessStatus
+from app.models.invoice import Invoice, InvoiceStatus
+from app.services.invoice_summary import refresh_invoice_summaries
+
+logger = logging.getLogger(__name__)
+
+PROCESS_NAME = "overdue_invoice_scan"
+OVERDUE_ACTION = "invoice_overdue"
+# Statuses in which an invoice still expects payment
+OPEN_STATUSES = (InvoiceStatus.ISSUED, InvoiceStatus.PARTIALLY_PAID)
+
+
+@dataclass
+class OverdueScanResult:
+    # Past-due invoices read by the scan and how many of them it flagged
+    scanned: int = 0
+    flagged: int = 0
+    batches: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _flag_batch(db: Session, ids, today: date, now: datetime) -> int:
+    flagged = db.execute(
+        update(Invoice)
+        .where(
+            Invoice.id.in_(ids),
+            Invoice.overdue_at.is_(None),
+            Invoice.status.in_(OPEN_STATUSES),
+        )
+        .values(overdue_at=now)
+        .returning(Invoice.id, Invoice.invoice_number, Invoice.due_date, Invoice.balance_cents),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if flagged:
+        db.execute(
+            insert(AuditLog),
+            [
+                {
+                    "actor_type": ActorType.SYSTEM,
+                    "action": OVERDUE_ACTION,
+                    "target_type": "invoice",
+                    "target_id": row.id,
+                    "details": {
+                        "invoice_number": row.invoice_number,
+                        "due_date": row.due_date.isoformat(),
+                        "days_overdue": (today - row.due_date).days,
+                        "balance_cents": row.balance_cents,
+                    },
+                }
+                for row in flagged
+            ],
+        )
+        refresh_invoice_summaries(db, [row.id for row in flagged], search_documents=False)
+    return len(flagged)
+
+
+def scan_overdue_invoices(
+    db: Session,
+    today: Optional[date] = None,
+    batch_size: Optional[int] = None,
+) -> OverdueScanResult:
+    """Flag every open invoice due before ``today`` (default: the current UTC date). Commits per batch."""
+    today = today or datetime.utcnow().date()
+    batch_size = batch_size or settings.OVERDUE_SCAN_BATCH_SIZE
+    result = OverdueScanResult()
+
+    run = ETLProcessStatus(process_name=PROCESS_NAME, status="running")
+    db.add(run)
+    db.commit()
+    try:
+        for status in OPEN_STATUSES:
+            after = None
+            while True:
+                query = select(Invoice.id, Invoice.due_date).where(
+                    Invoice.status == status,
+                    Invoice.due_date < today,
+                    Invoice.overdue_at.is_(None),
+                )
+                if after is not None:
+                    query = query.where(tuple_(Invoice.due_date, Invoice.id) > after)
+                rows = db.execute(query.order_by(Invoice.due_date, Invoice.id).limit(batch_size)).all()
+                if not rows:
+                    break
+                after = (rows[-1].due_date, rows[-1].id)
+                result.scanned += len(rows)
+                result.flagged += _flag_batch(db, [row.id for row in rows], today, datetime.utcnow())
+                result.batches += 1
+                run.records_processed = result.flagged
+                db.commit()
+                if len(rows) < batch_size:
+                    break
+    except Exception as e:
+        db.rollback()
+        run.status = "failed"
+        run.error_message = str(e)
+        run.completed_at = datetime.utcnow()
+        db.commit()
+        raise
+
+    run.status = "completed"
+    run.completed_at = datetime.utcnow()
+    db.commit()
+    if result.flagged:
+        logger.info("Flagged %d overdue invoice(s) in %d batch(es)", result.flagged, result.batches)
+    return result
+
+
+class OverdueScanner:
+    """Runs scan_overdue_invoices() periodically in a background thread."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        interval: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.interval = settings.OVERDUE_SCAN_INTERVAL_SECONDS if interval is None else interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="overdue-invoice-scan", daemon=True)
+        self._thread.start()
+        logger.info("Overdue invoice scan scheduled every %.0f seconds", self.interval)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self) -> OverdueScanResult:
+        with self.session_factory() as db:
+            return scan_overdue_invoices(db)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Overdue invoice scan failed")
+            self._stop.wait(self.interval)
+
+
+overdue_scanner = OverdueScanner()
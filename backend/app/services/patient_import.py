@@ -0,0 +1,314 @@
+"""
+Bulk patient import.
+
+Onboarding a clinic loads its patient list from a CSV file (a header row
+naming name, email, phone and dob or date_of_birth columns) or from NDJSON
+(one object per line with the same keys). The file is read as a stream and
+handled in chunks of PATIENT_IMPORT_CHUNK_SIZE rows:
+
+* rows are validated with the InputValidator email and phone helpers (syntax
+  only, no DNS lookups) in a pool of PATIENT_IMPORT_WORKERS processes, at
+  most two chunks per worker ahead of the chunk being written, so memory
+  stays bounded whatever the file size;
+* valid rows are checked for duplicates (same email ignoring case, or same
+  name and date of birth) against the patients table with one IN query per
+  key through ix_patients_email_lower and ix_patients_name_lower_dob, and
+  against earlier rows of the chunk (earlier chunks are already inserted);
+* the remaining rows are bulk inserted, and the chunk is committed together
+  with the import's counters and its report rows.
+
+The PatientImport row thus shows the progress of a running import, and its
+patient_import_errors rows are the error report (the first
+MAX_REPORTED_ERRORS; the counters cover every row). A failed import keeps the
+chunks committed before the failure; importing the file again reports those
+rows as duplicates.
+
+The API runs uploaded files in the background through patient_importer;
+import_patients.py imports a file from the command line.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.validation import InputValidator, ValidationError
+from app.db.session import SessionLocal
+from app.models.patient import Patient, patient_search_text
+from app.models.patient_import import PatientImport, PatientImportError, PatientImportIssue, PatientImportStatus
+from app.services.patient_typeahead import patient_typeahead
+from app.services.reconciliation import read_csv_rows, read_json_rows
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 10000
+MAX_NAME_LENGTH = 255
+# Report rows keep this much of an offending value
+MAX_VALUE_LENGTH = 200
+
+# (row number, cleaned patient fields or None, (field, message, value) or None)
+ValidatedRow = Tuple[int, Optional[Dict[str, Any]], Optional[Tuple[Optional[str], str, Optional[str]]]]
+
+
+def read_patient_rows(fh: TextIO, fmt: str) -> Iterator[Any]:
+    """Records of a patient file opened as text; ``fmt`` is "csv" or "ndjson"."""
+    return read_csv_rows(fh) if fmt == "csv" else read_json_rows(fh)
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _clip(value: Any) -> Optional[str]:
+    return None if value is None else str(value)[:MAX_VALUE_LENGTH]
+
+
+def _validate(record: Any) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Optional[str], str, Optional[str]]]]:
+    if not isinstance(record, dict):
+        return None, (None, "Record is not an object", _clip(record))
+    name = _text(record.get("name"))
+    email = _text(record.get("email"))
+    phone = _text(record.get("phone"))
+    dob = _text(record.get("dob") or record.get("date_of_birth"))
+    try:
+        if not name:
+            raise ValidationError("name", name, "Name is required")
+        InputValidator.validate_text_length(name, "name", max_length=MAX_NAME_LENGTH)
+        if email:
+            InputValidator.validate_email_address(email, check_deliverability=False)
+        if phone:
+            InputValidator.validate_phone_number(phone)
+        if dob:
+            try:
+                dob = date.fromisoformat(dob)
+            except ValueError:
+                raise ValidationError("dob", dob, "Date of birth must be YYYY-MM-DD")
+    except ValidationError as e:
+        return None, (e.field, e.message, _clip(e.value))
+    return {"name": name, "email": email, "phone": phone, "dob": dob}, None
+
+
+def validate_patient_rows(rows: List[Tuple[int, Any]]) -> List[ValidatedRow]:
+    """Validate (row number, record) pairs; runs in the import's worker processes."""
+    return [(row, *_validate(record)) for row, record in rows]
+
+
+def _validated_chunks(records: Iterable[Any], chunk_size: int, workers: int) -> Iterator[List[ValidatedRow]]:
+    numbered = enumerate(records, start=1)
+    chunks = iter(lambda: list(islice(numbered, chunk_size)), [])
+    if workers <= 0:
+        for chunk in chunks:
+            yield validate_patient_rows(chunk)
+        return
+    # spawn: the importing process has threads, which fork does not copy safely
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(validate_patient_rows, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _ChunkWriter:
+    def __init__(self, run: PatientImport):
+        self.run = run
+        self.reported = 0
+
+    def _issue(self, row: int, issue: PatientImportIssue, field: Optional[str], message: str,
+               value: Optional[str] = None, existing_patient_id: Any = None) -> Optional[Dict[str, Any]]:
+        if self.reported >= MAX_REPORTED_ERRORS:
+            return None
+        self.reported += 1
+        return {
+            "import_id": self.run.id,
+            "row": row,
+            "issue": issue,
+            "field": field,
+            "message": message,
+            "value": value,
+            "existing_patient_id": existing_patient_id,
+        }
+
+    def _existing(self, db: Session, rows: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[Tuple[str, date], Any]]:
+        emails = {data["email"].lower() for data in rows if data["email"]}
+        people = {(data["name"].lower(), data["dob"]) for data in rows if data["dob"]}
+        by_email: Dict[str, Any] = {}
+        by_person: Dict[Tuple[str, date], Any] = {}
+        if emails:
+            email = func.lower(Patient.email)
+            for patient_id, key in db.execute(select(Patient.id, email).where(email.in_(emails))):
+                by_email.setdefault(key, patient_id)
+        if people:
+            # Two IN lists rather than a row-value IN, which SQLite cannot look up in an index;
+            # the exact pairs are picked out here
+            name = func.lower(Patient.name)
+            for patient_id, key, dob in db.execute(
+                select(Patient.id, name, Patient.dob).where(
+                    name.in_({key for key, _ in people}), Patient.dob.in_({dob for _, dob in people})
+                )
+            ):
+                if (key, dob) in people:
+                    by_person.setdefault((key, dob), patient_id)
+        return by_email, by_person
+
+    def write(self, db: Session, chunk: List[ValidatedRow]) -> None:
+        run = self.run
+        report: List[Optional[Dict[str, Any]]] = []
+        valid = []
+        for row, data, problem in chunk:
+            if data is None:
+                run.failed += 1
+                field, message, value = problem
+                report.append(self._issue(row, PatientImportIssue.INVALID, field, message, value))
+            else:
+                valid.append((row, data))
+
+        by_email, by_person = self._existing(db, [data for _, data in valid])
+        patients = []
+        for row, data in valid:
+            email_key = data["email"].lower() if data["email"] else None
+            person_key = (data["name"].lower(), data["dob"]) if data["dob"] else None
+            if email_key in by_email:
+                run.duplicates += 1
+                report.append(self._issue(row, PatientImportIssue.DUPLICATE, "email", "A patient with this email already exists",
+                                          _clip(data["email"]), by_email[email_key]))
+                continue
+            if person_key in by_person:
+                run.duplicates += 1
+                report.append(self._issue(row, PatientImportIssue.DUPLICATE, "name", "A patient with this name and date of birth already exists",
+                                          _clip(data["name"]), by_person[person_key]))
+                continue
+            patient_id = uuid.uuid4()
+            # Later rows of the chunk are duplicates of this one
+            if email_key:
+                by_email[email_key] = patient_id
+            if person_key:
+                by_person[person_key] = patient_id
+            patients.append({
+                "id": patient_id,
+                **data,
+                # Core inserts skip the mapper event that maintains it
+                "search_text": patient_search_text(data["name"], data["email"], data["phone"]),
+            })
+
+        if patients:
+            db.execute(insert(Patient), patients)
+        report = [issue for issue in report if issue]
+        if report:
+            db.execute(insert(PatientImportError), report)
+        run.rows_read += len(chunk)
+        run.created += len(patients)
+        db.commit()
+
+
+def start_import(db: Session, source: str, fmt: str, staff_id: Any = None) -> PatientImport:
+    """Record a pending import of ``source``; commits."""
+    run = PatientImport(source=source, format=fmt, staff_id=staff_id, status=PatientImportStatus.PENDING)
+    db.add(run)
+    db.commit()
+    return run
+
+
+def import_patients(
+    db: Session,
+    run: PatientImport,
+    records: Iterable[Any],
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[PatientImport], None]] = None,
+) -> PatientImport:
+    """Import ``records`` (dicts read from the file) under ``run``, committing chunk by chunk.
+
+    ``progress`` is called with the run after each chunk. A failing import is
+    marked FAILED and the error re-raised.
+    """
+    chunk_size = chunk_size or settings.PATIENT_IMPORT_CHUNK_SIZE
+    workers = settings.PATIENT_IMPORT_WORKERS if workers is None else workers
+    run.status = PatientImportStatus.RUNNING
+    db.commit()
+
+    writer = _ChunkWriter(run)
+    try:
+        for chunk in _validated_chunks(records, chunk_size, workers):
+            writer.write(db, chunk)
+            if progress:
+                progress(run)
+        run.status = PatientImportStatus.COMPLETED
+        run.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        run.status = PatientImportStatus.FAILED
+        run.error = f"{e.__class__.__name__}: {e}"
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        logger.exception("Patient import %s failed after %d rows", run.id, run.rows_read)
+        raise
+
+    logger.info(
+        "Patient import %s: %d rows, %d created, %d duplicates, %d invalid",
+        run.id, run.rows_read, run.created, run.duplicates, run.failed,
+    )
+    return run
+
+
+class PatientImporter:
+    """Runs imports uploaded through the API in a background thread, one at a time."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, import_id: uuid.UUID, path: str) -> Future:
+        """Import the file at ``path`` (deleted afterwards) under the pending import ``import_id``."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="patient-import")
+            return self._executor.submit(self._run, import_id, path)
+
+    def _run(self, import_id: uuid.UUID, path: str) -> None:
+        try:
+            with self.session_factory() as db, open(path, newline="", encoding="utf-8-sig") as fh:
+                run = db.get(PatientImport, import_id)
+                import_patients(db, run, read_patient_rows(fh, run.format))
+                created = run.created
+            if created:
+                # add() is meant for a few patients; after a bulk load rebuild from the table
+                patient_typeahead.rebuild()
+        except Exception:
+            # Already recorded on the import by import_patients()
+            logger.exception("Background patient import %s failed", import_id)
+        finally:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def stop(self) -> None:
+        """Wait for queued imports to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+patient_importer = PatientImporter()
@@ -0,0 +1,76 @@
+"""
+Patient search for the front desk.
+
+Every patient row carries ``search_text``: the normalized name and email plus
+the phone's digits (see app.models.patient.patient_search_text), written on
+each ORM insert and update. The database indexes it for substring matching:
+a pg_trgm GIN index on Postgres, a trigram FTS5 table on SQLite.
+
+search_patients() normalizes the query the same way and returns the patients
+whose search_text contains every word of it, best match first. Words of at
+least MIN_TERM_LENGTH characters go through the index; shorter ones only
+narrow those results. A query made only of short words ("li") falls back to
+a word-prefix LIKE that stops at ``limit`` rows.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+from sqlalchemy import func, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+
+from app.models.patient import Patient, normalize_search_text
+
+MAX_TERMS = 8
+# Trigram indexes cannot look up anything shorter
+MIN_TERM_LENGTH = 3
+_PHONE = re.compile(r"^[\d\s()+.\-]+$")
+
+
+def search_terms(query: str) -> List[str]:
+    """Normalized words of ``query``; a phone number ("555-0100") becomes one run of digits."""
+    query = (query or "").strip()
+    if query and _PHONE.match(query):
+        digits = re.sub(r"\D", "", query)
+        return [digits] if digits else []
+    return normalize_search_text(query).split()[:MAX_TERMS]
+
+
+def _like(term: str) -> str:
+    # Terms are letters and digits only, so there is nothing to escape
+    return f"%{term}%"
+
+
+def search_patients(db: Session, query: str, limit: int = 20, offset: int = 0) -> List[Tuple[Patient, float]]:
+    """(patient, relevance) pairs for patients matching every word of ``query``, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    narrow = [Patient.search_text.like(_like(term)) for term in short]
+
+    if not indexed:
+        prefix = [or_(Patient.search_text.like(f"{term}%"), Patient.search_text.like(f"% {term}%")) for term in short]
+        stmt = select(Patient, literal_column("0.0").label("rank")).where(*prefix).order_by(Patient.name, Patient.id)
+    elif db.get_bind().dialect.name == "postgresql":
+        rank = func.similarity(Patient.search_text, " ".join(terms))
+        stmt = (
+            select(Patient, rank.label("rank"))
+            .where(*[Patient.search_text.like(_like(term)) for term in indexed], *narrow)
+            .order_by(rank.desc(), Patient.name, Patient.id)
+        )
+    else:
+        fts = literal_column("patient_search_fts")
+        # bm25() is lower for better matches; negated so that higher is better on both dialects
+        rank = -func.bm25(fts)
+        stmt = (
+            select(Patient, rank.label("rank"))
+            .select_from(table("patient_search_fts"))
+            .join(Patient, literal_column("patients.rowid") == literal_column("patient_search_fts.rowid"))
+            .where(fts.op("MATCH")(" AND ".join(f'"{term}"' for term in indexed)), *narrow)
+            .order_by(rank.desc(), Patient.name, Patient.id)
+        )
+    return [(row.Patient, float(row.rank)) for row in db.execute(stmt.limit(limit).offset(offset))]
@@ -0,0 +1,233 @@
+"""
+In-process prefix index for the front-desk patient picker.
+
+GET /patients/suggest answers from memory instead of the database: the index
+keeps one sorted list of keys (each word of the normalized name, the
+lowercased email and the phone's digits) and finds every key starting with
+the typed prefix by bisection. A query with several words is driven by its
+longest word; the other words must each prefix another key of the same
+patient ("anna le" finds Anna Lee).
+
+The index is built in a background thread at startup and kept current by the
+patients endpoints, which call add() or remove() after committing, and
+rebuilt after a bulk patient import. Calls made while a build reads the
+table are journaled and replayed onto the new index before it is swapped
+in, so they are not lost. Writes made by other processes show up after the
+next build. To bound memory the index
+holds at most PATIENT_TYPEAHEAD_MAX_PATIENTS patients; past that it drops
+itself and suggest() returns None, so callers fall back to the database
+search (app.services.patient_search).
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import re
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.patient import Patient, normalize_search_text
+from app.services.patient_search import search_terms
+
+logger = logging.getLogger(__name__)
+
+# Keys and patient slots are joined by a character that sorts before any
+# other, so an exact key comes before its longer completions
+_SEP = "\x00"
+MAX_SUGGESTIONS = 25
+# Upper bound on keys read for one query, however common its prefix
+MAX_SCAN = 2000
+
+# id, name, email, phone
+Suggestion = Tuple[uuid.UUID, str, Optional[str], Optional[str]]
+
+
+def _keys(name: Optional[str], email: Optional[str], phone: Optional[str]) -> List[str]:
+    keys = set(normalize_search_text(name).split())
+    if email:
+        keys.add(email.strip().lower())
+    digits = re.sub(r"\D", "", phone or "")
+    if digits:
+        keys.add(digits)
+    return sorted(keys)
+
+
+class PatientTypeahead:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_patients: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.max_patients = settings.PATIENT_TYPEAHEAD_MAX_PATIENTS if max_patients is None else max_patients
+        self._lock = threading.Lock()
+        self._entries: List[str] = []
+        # slot -> suggestion; slots are reused after remove()
+        self._records: List[Optional[Suggestion]] = []
+        self._slots: Dict[uuid.UUID, int] = {}
+        self._free: List[int] = []
+        # ("add", suggestion) / ("remove", id) calls made while a build runs
+        self._journal: List[Tuple[str, object]] = []
+        self._builds = 0
+        self.ready = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def start(self) -> None:
+        """Build the index in a background thread; suggest() returns None until it is ready."""
+        if self._thread is not None or self.max_patients <= 0:
+            return
+        self._thread = threading.Thread(target=self._build_in_background, name="patient-typeahead", daemon=True)
+        self._thread.start()
+
+    def rebuild(self) -> None:
+        """Rebuild in a background thread, e.g. after a bulk import; the current index answers meanwhile."""
+        if self.max_patients <= 0:
+            return
+        threading.Thread(target=self._build_in_background, name="patient-typeahead", daemon=True).start()
+
+    def _build_in_background(self) -> None:
+        try:
+            with self.session_factory() as db:
+                self.build(db)
+        except Exception:
+            logger.exception("Building the patient typeahead index failed")
+
+    def build(self, db: Session) -> bool:
+        """(Re)build from the patients table; False if it holds more than max_patients."""
+        with self._lock:
+            self._builds += 1
+        try:
+            entries: List[str] = []
+            records: List[Optional[Suggestion]] = []
+            slots: Dict[uuid.UUID, int] = {}
+            rows = db.query(Patient.id, Patient.name, Patient.email, Patient.phone).yield_per(10000)
+            for row in rows:
+                if len(records) >= self.max_patients:
+                    self._drop(f"more than {self.max_patients} patients")
+                    return False
+                keys = _keys(row.name, row.email, row.phone)
+                slot = len(records)
+                records.append((row.id, row.name, row.email, row.phone))
+                slots[row.id] = slot
+                entries.extend(f"{key}{_SEP}{slot}" for key in keys)
+            entries.sort()
+            with self._lock:
+                self._entries, self._records, self._slots, self._free = entries, records, slots, []
+                # Replaying is idempotent, so calls the snapshot already reflects do no harm
+                for op, arg in self._journal:
+                    if op == "add":
+                        self._add_locked(arg)
+                    else:
+                        self._remove_locked(arg)
+                self.ready = True
+                too_many = len(self._slots) > self.max_patients
+        finally:
+            with self._lock:
+                self._builds -= 1
+                if not self._builds:
+                    self._journal = []
+        if too_many:
+            self._drop(f"more than {self.max_patients} patients")
+            return False
+        logger.info("Patient typeahead index built: %d patients, %d keys", len(slots), len(entries))
+        return True
+
+    def _drop(self, reason: str) -> None:
+        with self._lock:
+            self._entries, self._records, self._slots, self._free = [], [], {}, []
+            self.ready = False
+        logger.warning("Patient typeahead index disabled: %s; suggestions use the database", reason)
+
+    def add(self, patients: Iterable[Patient]) -> None:
+        """Index new or changed patients (after their transaction committed)."""
+        with self._lock:
+            if not (self.ready or self._builds):
+                return
+            for patient in patients:
+                record = (patient.id, patient.name, patient.email, patient.phone)
+                if self._builds:
+                    self._journal.append(("add", record))
+                if self.ready:
+                    self._add_locked(record)
+            too_many = self.ready and len(self._slots) > self.max_patients
+        if too_many:
+            self._drop(f"more than {self.max_patients} patients")
+
+    def _add_locked(self, record: Suggestion) -> None:
+        self._remove_locked(record[0])
+        slot = self._free.pop() if self._free else len(self._records)
+        if slot == len(self._records):
+            self._records.append(record)
+        else:
+            self._records[slot] = record
+        self._slots[record[0]] = slot
+        for key in _keys(*record[1:]):
+            bisect.insort(self._entries, f"{key}{_SEP}{slot}")
+
+    def remove(self, patient_ids: Iterable[uuid.UUID]) -> None:
+        with self._lock:
+            for patient_id in patient_ids:
+                if self._builds:
+                    self._journal.append(("remove", patient_id))
+                if self.ready:
+                    self._remove_locked(patient_id)
+
+    def _remove_locked(self, patient_id: uuid.UUID) -> None:
+        slot = self._slots.pop(patient_id, None)
+        if slot is None:
+            return
+        _, name, email, phone = self._records[slot]
+        for key in _keys(name, email, phone):
+            entry = f"{key}{_SEP}{slot}"
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        self._records[slot] = None
+        self._free.append(slot)
+
+    def suggest(self, query: str, limit: int = 10) -> Optional[List[Suggestion]]:
+        """Up to ``limit`` patients matching ``query`` by prefix, or None when the index is not available."""
+        if not self.ready:
+            return None
+        query = (query or "").strip().lower()
+        if "@" in query:
+            terms = [query]
+        else:
+            terms = search_terms(query)
+        if not terms:
+            return []
+        driver = max(terms, key=len)
+        others = list(terms)
+        others.remove(driver)
+
+        results: List[Suggestion] = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            start = bisect.bisect_left(entries, driver)
+            for entry in entries[start:start + MAX_SCAN]:
+                if not entry.startswith(driver):
+                    break
+                slot = int(entry.rsplit(_SEP, 1)[1])
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                suggestion = self._records[slot]
+                keys = _keys(*suggestion[1:]) if others else ()
+                if all(any(key.startswith(term) for key in keys) for term in others):
+                    results.append(suggestion)
+                    if len(results) >= limit:
+                        break
+        return results
+
+
+patient_typeahead = PatientTypeahead()
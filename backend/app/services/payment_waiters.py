@@ -0,0 +1,80 @@
+"""
+In-process waiters for payment confirmation.
+
+GET /payments/wait parks the request on a future keyed by invoice id and/or
+checkout session id instead of the client polling verify-payment-success.
+The paths that record a checkout payment (webhook inbox, local checkout,
+verify-payment-success) call notify() after committing, which wakes the
+waiting requests at once. notify() is safe to call from worker threads.
+
+Waiters live in one process: a payment recorded by another process is only
+seen when the waiter times out and the client asks again, so the endpoint
+always re-reads the invoice before and after waiting.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentWaiters:
+    def __init__(self):
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def register(self, keys: Iterable[str], future: Optional[asyncio.Future] = None) -> asyncio.Future:
+        """Future resolved by the next notify() for any of ``keys``; call from the event loop.
+
+        Passing an already registered ``future`` adds more keys to it.
+        """
+        loop = asyncio.get_running_loop()
+        future = future or loop.create_future()
+        entry = (loop, future)
+        with self._lock:
+            for key in keys:
+                self._waiters.setdefault(key, set()).add(entry)
+        return future
+
+    def unregister(self, keys: Iterable[str], future: asyncio.Future) -> None:
+        with self._lock:
+            for key in keys:
+                waiters = self._waiters.get(key)
+                if not waiters:
+                    continue
+                waiters.difference_update({entry for entry in waiters if entry[1] is future})
+                if not waiters:
+                    del self._waiters[key]
+
+    def notify(self, *keys: Optional[Any]) -> int:
+        """Wake everyone waiting on any of ``keys`` (invoice or checkout session ids); returns how many."""
+        woken = set()
+        with self._lock:
+            for key in keys:
+                if key:
+                    woken.update(self._waiters.pop(str(key), ()))
+        for loop, future in woken:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The waiting request's loop is already closed
+                pass
+        if woken:
+            logger.debug("Woke %d payment waiter(s) for %s", len(woken), [str(key) for key in keys if key])
+        return len(woken)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+payment_waiters = PaymentWaiters()
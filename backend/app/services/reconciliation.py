@@ -0,0 +1,338 @@
+"""
+Reconciliation of Stripe balance transactions against recorded payments.
+
+An export (CSV, JSON array, JSON lines or a Stripe list object, or the
+balance transactions listed by the Stripe gateway) is read as a stream and
+processed in chunks. For each chunk the payments it references are loaded
+with one ``stripe_payment_id IN (...)`` query into a dict keyed by that id and
+every entry is probed against it (a hash join), so a run costs one query per
+chunk rather than one per row. Discrepancies found in a chunk are written
+with one bulk insert.
+
+Charges are compared with the payment amount and currency, refunds with the
+payment's refunded status. With a period, Stripe payments recorded in it but
+absent from the export are reported as MISSING. Payout, fee and other
+non-payment entries are counted as ignored.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, TextIO
+
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app.models.payment import Payment, PaymentStatus
+from app.models.reconciliation import (
+    DiscrepancyKind,
+    ReconciliationDiscrepancy,
+    ReconciliationRun,
+    ReconciliationRunStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+CHARGE_TYPES = {"charge", "payment"}
+REFUND_TYPES = {"refund", "payment_refund", "refund_failure"}
+# Payments recorded without Stripe (manual entry, local checkout) never appear in an export
+NON_STRIPE_PREFIXES = ("manual_", "local_payment_")
+ZERO_DECIMAL_CURRENCIES = {"bif", "clp", "djf", "gnf", "jpy", "kmf", "krw", "mga", "pyg", "rwf", "ugx", "vnd", "vuv", "xaf", "xof", "xpf"}
+
+_ID_FIELDS = ("balance_transaction_id", "id")
+_KEY_FIELDS = ("payment_intent_id", "payment_intent", "source_id", "source")
+_AMOUNT_FIELDS = ("amount", "gross")
+_TYPE_FIELDS = ("type", "reporting_category")
+
+# Payment ids are only needed for the few discrepancy rows, so they are read as
+# plain strings and parsed on demand instead of building a UUID for every row
+_PAYMENT_ID = type_coerce(Payment.id, String).label("id")
+
+
+@dataclass
+class BalanceEntry:
+    transaction_id: Optional[str]
+    payment_key: Optional[str]
+    # "charge", "refund" or None for entries that are not about a payment
+    category: Optional[str]
+    amount_cents: Optional[int]
+    currency: Optional[str]
+    type: Optional[str]
+
+
+def _first(row: Mapping[str, Any], fields: Iterable[str]) -> Any:
+    for name in fields:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _to_cents(value: Any, currency: Optional[str]) -> Optional[int]:
+    """Integers (and integer strings) are minor units, as in the Stripe API;
+    decimal strings such as "162.00" are major units, as in dashboard exports."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().replace(",", "")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {value!r}")
+    if "." not in text or (currency or "").lower() in ZERO_DECIMAL_CURRENCIES:
+        return int(amount)
+    return int((amount * 100).to_integral_value())
+
+
+def entry_from_mapping(row: Mapping[str, Any]) -> BalanceEntry:
+    """Normalize one balance transaction from an export row or the Stripe API."""
+    key = _first(row, _KEY_FIELDS)
+    if isinstance(key, dict):
+        # Expanded source object (API with expand=["data.source"])
+        key = key.get("payment_intent") or key.get("id")
+    raw_type = _first(row, _TYPE_FIELDS)
+    raw_type = str(raw_type).lower() if raw_type else None
+    if raw_type in CHARGE_TYPES:
+        category = "charge"
+    elif raw_type in REFUND_TYPES:
+        category = "refund"
+    else:
+        category = None
+    currency = _first(row, ("currency",))
+    currency = str(currency).lower() if currency else None
+    return BalanceEntry(
+        transaction_id=_first(row, _ID_FIELDS),
+        payment_key=str(key) if key else None,
+        category=category,
+        amount_cents=_to_cents(_first(row, _AMOUNT_FIELDS), currency),
+        currency=currency,
+        type=raw_type,
+    )
+
+
+def read_csv_rows(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if header is None:
+        return
+    # "Balance Transaction ID" -> "balance_transaction_id"
+    names = [name.strip().lower().replace(" ", "_") for name in header]
+    for values in reader:
+        if values:
+            yield dict(zip(names, values))
+
+
+def read_json_rows(fh: TextIO, buffer_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Stream objects from a JSON array, JSON lines or concatenated objects.
+
+    A Stripe list object ({"object": "list", "data": [...]}) yields its data.
+    """
+    decoder = json.JSONDecoder()
+    buf = fh.read(buffer_size)
+    pos = 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buf):
+            more = fh.read(buffer_size)
+            if not more:
+                return
+            buf, pos = more, 0
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            more = fh.read(buffer_size)
+            if not more:
+                raise
+            buf, pos = buf[pos:] + more, 0
+            continue
+        pos = end
+        if isinstance(obj, dict) and obj.get("object") == "list" and isinstance(obj.get("data"), list):
+            yield from obj["data"]
+        else:
+            yield obj
+        if pos > buffer_size:
+            buf, pos = buf[pos:], 0
+
+
+def read_export(fh: TextIO, fmt: str) -> Iterator[BalanceEntry]:
+    """Balance entries of an export file opened as text; ``fmt`` is "csv" or "json"."""
+    rows = read_csv_rows(fh) if fmt == "csv" else read_json_rows(fh)
+    return (entry_from_mapping(row) for row in rows)
+
+
+def _chunks(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Matcher:
+    def __init__(self, run: ReconciliationRun):
+        self.run = run
+        self.run_id = run.id
+        self.total = 0
+        self.matched = 0
+        self.ignored = 0
+        self.seen_transactions: Set[str] = set()
+        self.seen_charges: Set[str] = set()
+        self.matched_keys: Set[str] = set()
+        self.summary: Dict[str, int] = {kind.value: 0 for kind in DiscrepancyKind}
+
+    def discrepancy(self, kind: DiscrepancyKind, entry: Optional[BalanceEntry] = None, payment: Any = None, **details: Any) -> Dict[str, Any]:
+        self.summary[kind.value] += 1
+        return {
+            "run_id": self.run_id,
+            "kind": kind,
+            "stripe_payment_id": entry.payment_key if entry else payment.stripe_payment_id,
+            "balance_transaction_id": entry.transaction_id if entry else None,
+            "payment_id": uuid.UUID(payment.id) if payment is not None else None,
+            "expected_amount_cents": payment.amount_cents if payment is not None else None,
+            "actual_amount_cents": entry.amount_cents if entry else None,
+            "currency": (entry.currency if entry else None) or (payment.currency.lower() if payment is not None else None),
+            "details": details or None,
+        }
+
+    def match_chunk(self, db: Session, chunk: List[BalanceEntry]) -> List[Dict[str, Any]]:
+        keys = {entry.payment_key for entry in chunk if entry.category and entry.payment_key}
+        payments = {}
+        if keys:
+            # Core rows rather than ORM entities: this is the hot path of a run
+            rows = db.connection().execute(
+                select(_PAYMENT_ID, Payment.stripe_payment_id, Payment.amount_cents, Payment.currency, Payment.status)
+                .where(Payment.stripe_payment_id.in_(keys))
+            ).all()
+            payments = {row.stripe_payment_id: row for row in rows}
+
+        found = []
+        for entry in chunk:
+            self.total += 1
+            if entry.category is None or not entry.payment_key:
+                self.ignored += 1
+                continue
+            if entry.transaction_id:
+                if entry.transaction_id in self.seen_transactions:
+                    found.append(self.discrepancy(DiscrepancyKind.DUPLICATE, entry, payments.get(entry.payment_key)))
+                    continue
+                self.seen_transactions.add(entry.transaction_id)
+            if entry.category == "charge":
+                if entry.payment_key in self.seen_charges:
+                    found.append(self.discrepancy(DiscrepancyKind.DUPLICATE, entry, payments.get(entry.payment_key)))
+                    continue
+                self.seen_charges.add(entry.payment_key)
+
+            payment = payments.get(entry.payment_key)
+            if payment is None:
+                found.append(self.discrepancy(DiscrepancyKind.UNMATCHED, entry, type=entry.type))
+                continue
+            self.matched_keys.add(entry.payment_key)
+            issue = self._compare(entry, payment)
+            if issue is None:
+                self.matched += 1
+            else:
+                found.append(issue)
+        return found
+
+    def _compare(self, entry: BalanceEntry, payment: Any) -> Optional[Dict[str, Any]]:
+        currency_differs = bool(entry.currency) and entry.currency != (payment.currency or "").lower()
+        if entry.category == "charge":
+            if entry.amount_cents != payment.amount_cents or currency_differs:
+                return self.discrepancy(DiscrepancyKind.AMOUNT_MISMATCH, entry, payment)
+            return None
+        # Refunds come out of the balance as negative amounts
+        if payment.status != PaymentStatus.REFUNDED:
+            return self.discrepancy(DiscrepancyKind.STATUS_MISMATCH, entry, payment, payment_status=payment.status.value)
+        if entry.amount_cents is None or abs(entry.amount_cents) > payment.amount_cents or currency_differs:
+            return self.discrepancy(DiscrepancyKind.AMOUNT_MISMATCH, entry, payment)
+        return None
+
+    def update_run(self) -> None:
+        self.run.entries_total = self.total
+        self.run.entries_matched = self.matched
+        self.run.entries_ignored = self.ignored
+        self.run.summary = dict(self.summary)
+
+    def missing(self, db: Session, period_start: Optional[datetime], period_end: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        query = select(_PAYMENT_ID, Payment.stripe_payment_id, Payment.amount_cents, Payment.currency).where(
+            Payment.status.in_([PaymentStatus.SUCCEEDED, PaymentStatus.REFUNDED]),
+            *[~Payment.stripe_payment_id.startswith(prefix) for prefix in NON_STRIPE_PREFIXES],
+        )
+        if period_start:
+            query = query.where(Payment.received_at >= period_start)
+        if period_end:
+            query = query.where(Payment.received_at < period_end)
+        for payment in db.connection().execute(query.execution_options(yield_per=5000)):
+            if payment.stripe_payment_id not in self.matched_keys:
+                yield self.discrepancy(DiscrepancyKind.MISSING, payment=payment)
+
+
+def reconcile(
+    db: Session,
+    entries: Iterable[BalanceEntry],
+    source: str,
+    period_start: Optional[datetime] = None,
+    period_end: Optional[datetime] = None,
+    chunk_size: int = 5000,
+) -> ReconciliationRun:
+    """Reconcile ``entries`` against payments and record the run and its discrepancies.
+
+    Each chunk is committed with its discrepancies, so a long run shows
+    progress. Payments missing from the export are only looked for when a
+    period is given. A failing run is marked FAILED and the error re-raised.
+    """
+    run = ReconciliationRun(
+        source=source,
+        period_start=period_start,
+        period_end=period_end,
+        status=ReconciliationRunStatus.RUNNING,
+        entries_total=0,
+        entries_matched=0,
+        entries_ignored=0,
+    )
+    db.add(run)
+    db.commit()
+
+    matcher = _Matcher(run)
+    try:
+        for chunk in _chunks(entries, chunk_size):
+            found = matcher.match_chunk(db, chunk)
+            if found:
+                db.bulk_insert_mappings(ReconciliationDiscrepancy, found)
+            matcher.update_run()
+            db.commit()
+
+        if period_start or period_end:
+            for batch in _chunks(matcher.missing(db, period_start, period_end), chunk_size):
+                db.bulk_insert_mappings(ReconciliationDiscrepancy, batch)
+
+        matcher.update_run()
+        run.status = ReconciliationRunStatus.COMPLETED
+        run.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        run.status = ReconciliationRunStatus.FAILED
+        run.error = f"{e.__class__.__name__}: {e}"
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        logger.exception("Reconciliation run %s failed", run.id)
+        raise
+
+    logger.info(
+        "Reconciliation run %s: %d entries, %d matched, %d ignored, discrepancies %s",
+        run.id, run.entries_total, run.entries_matched, run.entries_ignored,
+        {kind: count for kind, count in run.summary.items() if count},
+    )
+    return run
@@ -1,46 +1,39 @@
 from __future__ import annotations
 
 from typing import Any, Dict, List, Tuple
-from datetime import date
+from datetime import date, timedelta
 from collections import defaultdict
-from sqlalchemy import text
+from functools import lru_cache
+from sqlalchemy import Integer, and_, bindparam, case, select
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 from reportlab.pdfgen import canvas
 from io import BytesIO
 
+from app.models.reporting import revenue_metrics, patient_payment_history, outstanding_payments
+
 
 class ReportService:
     """Service providing report query interfaces and PDF export scaffolding."""
 
+    COMPARISON_MODES = ("previous_period", "previous_year")
+
     def get_revenue_report(self, db: Session, **filters: Any) -> Dict[str, Any]:
         start_date = filters.get("start_date")
         end_date = filters.get("end_date")
         granularity = (filters.get("granularity") or "month").lower()
+        compare = (filters.get("compare") or "").lower() or None
 
-        rows = db.execute(
-            text(
-                """
-                SELECT date_key, total_revenue, payment_count, average_payment
-                FROM revenue_metrics
-                WHERE (:start IS NULL OR date_key >= :start)
-                  AND (:end IS NULL OR date_key <= :end)
-                ORDER BY date_key ASC
-                """
-            ),
-            {"start": start_date, "end": end_date},
-        ).fetchall()
+        if compare:
+            return self._get_revenue_comparison(db, start_date, end_date, granularity, compare)
 
-        def month_key(d: date) -> date:
-            return date(d.year, d.month, 1)
-
-        def week_key(d: date) -> date:
-            # ISO week start (Monday)
-            return d - timedelta(days=d.weekday())
+        params = _present({"start": _as_date_or_none(start_date), "end": _as_date_or_none(end_date)})
+        rows = db.execute(_revenue_stmt(*sorted(params)), params).fetchall()
 
         if granularity == "day":
             points = [
                 {
-                    "date": (r[0] if isinstance(r[0], date) else date.fromisoformat(str(r[0]))).isoformat(),
+                    "date": _as_date(r[0]).isoformat(),
                     "totalRevenue": float(r[1] or 0),
                     "paymentCount": int(r[2] or 0),
                     "averagePayment": float(r[3] or 0),
@@ -48,31 +41,82 @@ class ReportService:
                 for r in rows
             ]
         else:
-            from datetime import timedelta
-
-            buckets: Dict[date, Tuple[float, int]] = defaultdict(lambda: (0.0, 0))
-            for r in rows:
-                d = r[0] if isinstance(r[0], date) else date.fromisoformat(str(r[0]))
-                key = month_key(d) if granularity == "month" else week_key(d)
-                total, count = buckets[key]
-                total += float(r[1] or 0)
-                count += int(r[2] or 0)
-                buckets[key] = (total, count)
-            points: List[Dict[str, Any]] = []
-            for k in sorted(buckets.keys()):
-                total, count = buckets[k]
-                avg = (total / count) if count else 0.0
-                points.append(
-                    {
-                        "date": k.isoformat(),
-                        "totalRevenue": float(total),
-                        "paymentCount": int(count),
-                        "averagePayment": float(avg),
-                    }
-                )
+            buckets = _bucket_rows(rows, granularity)
+            points = [_point(k, *buckets[k]) for k in sorted(buckets.keys())]
 
         return {"granularity": granularity, "points": points}
 
+    def _get_revenue_comparison(
+        self, db: Session, start_date: Any, end_date: Any, granularity: str, compare: str
+    ) -> Dict[str, Any]:
+        """Return current and comparison series aligned bucket-by-bucket.
+
+        Both windows are read in one range scan over revenue_metrics; each row
+        is flagged with the window(s) it belongs to so no second query is needed.
+        """
+        if compare not in self.COMPARISON_MODES:
+            raise ValueError(f"compare must be one of: {', '.join(self.COMPARISON_MODES)}")
+        if not start_date or not end_date:
+            raise ValueError("start_date and end_date are required for comparison reports")
+
+        cur_start, cur_end = _as_date(start_date), _as_date(end_date)
+        if cur_end < cur_start:
+            raise ValueError("end_date must not be before start_date")
+        prev_start, prev_end = _previous_window(cur_start, cur_end, granularity, compare)
+
+        rows = db.execute(
+            _revenue_comparison_stmt(),
+            {"prev_start": prev_start, "prev_end": prev_end, "cur_start": cur_start, "cur_end": cur_end},
+        ).fetchall()
+
+        # The windows can overlap (e.g. a 15-month range vs previous_year),
+        # so a row may feed both series.
+        current = _bucket_rows([r for r in rows if r[3]], granularity)
+        previous = _bucket_rows([r for r in rows if r[4]], granularity)
+
+        cur_keys = _bucket_keys(cur_start, cur_end, granularity)
+        prev_keys = _bucket_keys(prev_start, prev_end, granularity)
+
+        points: List[Dict[str, Any]] = []
+        for i, key in enumerate(cur_keys):
+            prev_key = prev_keys[i] if i < len(prev_keys) else None
+            total, count = current.get(key, (0.0, 0))
+            prev_total, prev_count = previous.get(prev_key, (0.0, 0)) if prev_key else (0.0, 0)
+            point = _point(key, total, count)
+            point.update(
+                {
+                    "previousDate": prev_key.isoformat() if prev_key else None,
+                    "previousTotalRevenue": float(prev_total),
+                    "previousPaymentCount": int(prev_count),
+                    "revenueDelta": float(total - prev_total),
+                    "revenueDeltaPct": _pct_change(total, prev_total),
+                    "paymentCountDelta": int(count - prev_count),
+                }
+            )
+            points.append(point)
+
+        cur_total = sum(v[0] for v in current.values())
+        prev_total = sum(v[0] for v in previous.values())
+        cur_count = sum(v[1] for v in current.values())
+        prev_count = sum(v[1] for v in previous.values())
+
+        return {
+            "granularity": granularity,
+            "compare": compare,
+            "currentRange": {"start": cur_start.isoformat(), "end": cur_end.isoformat()},
+            "previousRange": {"start": prev_start.isoformat(), "end": prev_end.isoformat()},
+            "points": points,
+            "totals": {
+                "totalRevenue": float(cur_total),
+                "previousTotalRevenue": float(prev_total),
+                "revenueDelta": float(cur_total - prev_total),
+                "revenueDeltaPct": _pct_change(cur_total, prev_total),
+                "paymentCount": int(cur_count),
+                "previousPaymentCount": int(prev_count),
+                "paymentCountDelta": int(cur_count - prev_count),
+            },
+        }
+
     def generate_revenue_pdf(self, db: Session, **filters: Any) -> bytes:
         data = self.get_revenue_report(db, **filters)
         buffer = BytesIO()
@@ -121,20 +165,10 @@ class ReportService:
         end_date = filters.get("end_date")
         status = filters.get("status")
 
-        rows = db.execute(
-            text(
-                """
-                SELECT payment_date, amount, payment_status, invoice_id
-                FROM patient_payment_history
-                WHERE patient_id = :pid
-                  AND (:start IS NULL OR payment_date >= :start::date)
-                  AND (:end IS NULL OR payment_date <= :end::date)
-                  AND (:status IS NULL OR payment_status = :status)
-                ORDER BY payment_date ASC
-                """
-            ),
-            {"pid": patient_id, "start": start_date, "end": end_date, "status": status},
-        ).fetchall()
+        params = _present(
+            {"start": _as_date_or_none(start_date), "end": _as_date_or_none(end_date), "status": status}
+        )
+        rows = db.execute(_patient_history_stmt(*sorted(params)), {"pid": str(patient_id), **params}).fetchall()
 
         return {
             "patientId": patient_id,
@@ -156,32 +190,15 @@ class ReportService:
         min_amount = filters.get("min_amount")
         max_amount = filters.get("max_amount")
 
-        where = ["1=1"]
-        params: Dict[str, Any] = {}
-        if min_days_overdue is not None:
-            where.append("days_overdue >= :min_days")
-            params["min_days"] = min_days_overdue
-        if max_days_overdue is not None:
-            where.append("days_overdue <= :max_days")
-            params["max_days"] = max_days_overdue
-        if min_amount is not None:
-            where.append("amount_due >= :min_amt")
-            params["min_amt"] = min_amount
-        if max_amount is not None:
-            where.append("amount_due <= :max_amt")
-            params["max_amt"] = max_amount
-
-        rows = db.execute(
-            text(
-                f"""
-                SELECT patient_id, invoice_id, amount_due, days_overdue, last_payment_date, payment_status
-                FROM outstanding_payments
-                WHERE {' AND '.join(where)}
-                ORDER BY days_overdue DESC, amount_due DESC
-                """
-            ),
-            params,
-        ).fetchall()
+        params = _present(
+            {
+                "min_days": min_days_overdue,
+                "max_days": max_days_overdue,
+                "min_amt": min_amount,
+                "max_amt": max_amount,
+            }
+        )
+        rows = db.execute(_outstanding_stmt(*sorted(params)), params).fetchall()
 
         items = [
             {
@@ -197,3 +214,147 @@ class ReportService:
         return {"items": items, "total": len(items)}
 
 
+# Report statements are built once per combination of optional filters and
+# reused. Each call only binds values; SQLAlchemy compiles a statement once per
+# dialect and serves later executions from the engine's compiled cache.
+
+@lru_cache(maxsize=None)
+def _revenue_stmt(*filters: str) -> Select:
+    t = revenue_metrics
+    stmt = select(t.c.date_key, t.c.total_revenue, t.c.payment_count, t.c.average_payment)
+    if "start" in filters:
+        stmt = stmt.where(t.c.date_key >= bindparam("start"))
+    if "end" in filters:
+        stmt = stmt.where(t.c.date_key <= bindparam("end"))
+    return stmt.order_by(t.c.date_key.asc())
+
+
+@lru_cache(maxsize=None)
+def _revenue_comparison_stmt() -> Select:
+    t = revenue_metrics
+    in_current = and_(t.c.date_key >= bindparam("cur_start"), t.c.date_key <= bindparam("cur_end"))
+    in_previous = and_(t.c.date_key >= bindparam("prev_start"), t.c.date_key <= bindparam("prev_end"))
+    return (
+        select(
+            t.c.date_key,
+            t.c.total_revenue,
+            t.c.payment_count,
+            case((in_current, 1), else_=0).label("in_current"),
+            case((in_previous, 1), else_=0).label("in_previous"),
+        )
+        .where(in_previous | in_current)
+        .order_by(t.c.date_key.asc())
+    )
+
+
+@lru_cache(maxsize=None)
+def _patient_history_stmt(*filters: str) -> Select:
+    t = patient_payment_history
+    stmt = select(t.c.payment_date, t.c.amount, t.c.payment_status, t.c.invoice_id).where(
+        t.c.patient_id == bindparam("pid")
+    )
+    if "start" in filters:
+        stmt = stmt.where(t.c.payment_date >= bindparam("start"))
+    if "end" in filters:
+        stmt = stmt.where(t.c.payment_date <= bindparam("end"))
+    if "status" in filters:
+        stmt = stmt.where(t.c.payment_status == bindparam("status"))
+    return stmt.order_by(t.c.payment_date.asc())
+
+
+@lru_cache(maxsize=None)
+def _outstanding_stmt(*filters: str) -> Select:
+    t = outstanding_payments
+    stmt = select(
+        t.c.patient_id, t.c.invoice_id, t.c.amount_due, t.c.days_overdue, t.c.last_payment_date, t.c.payment_status
+    )
+    if "min_days" in filters:
+        stmt = stmt.where(t.c.days_overdue >= bindparam("min_days", type_=Integer))
+    if "max_days" in filters:
+        stmt = stmt.where(t.c.days_overdue <= bindparam("max_days", type_=Integer))
+    if "min_amt" in filters:
+        stmt = stmt.where(t.c.amount_due >= bindparam("min_amt"))
+    if "max_amt" in filters:
+        stmt = stmt.where(t.c.amount_due <= bindparam("max_amt"))
+    return stmt.order_by(t.c.days_overdue.desc(), t.c.amount_due.desc())
+
+
+def _present(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def _as_date_or_none(value: Any) -> date | None:
+    return _as_date(value) if value else None
+
+
+def _as_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _bucket_key(d: date, granularity: str) -> date:
+    if granularity == "day":
+        return d
+    if granularity == "week":
+        # ISO week start (Monday)
+        return d - timedelta(days=d.weekday())
+    return date(d.year, d.month, 1)
+
+
+def _bucket_rows(rows: Any, granularity: str) -> Dict[date, Tuple[float, int]]:
+    """Sum (date_key, total_revenue, payment_count, ...) rows into buckets."""
+    buckets: Dict[date, Tuple[float, int]] = defaultdict(lambda: (0.0, 0))
+    for r in rows:
+        key = _bucket_key(_as_date(r[0]), granularity)
+        total, count = buckets[key]
+        buckets[key] = (total + float(r[1] or 0), count + int(r[2] or 0))
+    return dict(buckets)
+
+
+def _bucket_keys(start: date, end: date, granularity: str) -> List[date]:
+    """Every bucket key touched by [start, end], including empty ones."""
+    keys: List[date] = []
+    key = _bucket_key(start, granularity)
+    while key <= end:
+        keys.append(key)
+        if granularity == "day":
+            key = key + timedelta(days=1)
+        elif granularity == "week":
+            key = key + timedelta(days=7)
+        else:
+            key = _shift_months(key, 1)
+    return keys
+
+
+def _shift_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + (d.month - 1) + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month = date(year + (month // 12), (month % 12) + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return date(year, month, min(d.day, last_day))
+
+
+def _previous_window(start: date, end: date, granularity: str, compare: str) -> Tuple[date, date]:
+    if compare == "previous_year":
+        return _shift_months(start, -12), _shift_months(end, -12)
+    if granularity == "month":
+        # Keep calendar months aligned, e.g. Mar-May compares against Dec-Feb
+        span = (end.year - start.year) * 12 + (end.month - start.month) + 1
+        return _shift_months(start, -span), start - timedelta(days=1)
+    length = (end - start).days + 1
+    return start - timedelta(days=length), start - timedelta(days=1)
+
+
+def _point(key: date, total: float, count: int) -> Dict[str, Any]:
+    return {
+        "date": key.isoformat(),
+        "totalRevenue": float(total),
+        "paymentCount": int(count),
+        "averagePayment": float(total / count) if count else 0.0,
+    }
+
+
+def _pct_change(current: float, previous: float) -> float | None:
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100.0, 2)
@@ -0,0 +1,386 @@
+"""
+Single entry point for every Stripe call made by the API.
+
+StripeGateway talks to Stripe through one pooled HTTP client with strict
+timeouts and guards every call with a circuit breaker, so a degraded Stripe
+fails fast with StripeUnavailable instead of tying up API workers.
+FakeStripeGateway implements the same interface locally (checkout pages are
+served by /payments/local-checkout) and is used when no secret key is
+configured, and in tests.
+
+Checkout sessions are stored on the invoice (id, url, expiry, amount) and
+get_or_create_checkout_session() hands back the stored one while it is still
+valid for the same amount, so re-sending a link does not call Stripe at all.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A stored session is only reused when it stays valid at least this long
+SESSION_REUSE_MARGIN = timedelta(minutes=30)
+
+
+class StripeUnavailable(Exception):
+    """Raised without calling Stripe while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets a single
+    trial call through once ``reset_timeout`` seconds have passed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self.clock() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def call(self, fn: Callable[..., Any], *args: Any, is_failure: Callable[[Exception], bool] = lambda e: True, **kwargs: Any) -> Any:
+        with self._lock:
+            if self._opened_at is not None:
+                if self.clock() - self._opened_at < self.reset_timeout or self._trial_running:
+                    raise StripeUnavailable("Stripe is unavailable, try again shortly")
+                self._trial_running = True
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self._trial_running = False
+                if is_failure(e):
+                    self._failures += 1
+                    if self._opened_at is not None or self._failures >= self.failure_threshold:
+                        if self._opened_at is None:
+                            logger.error("Stripe circuit breaker opened after %d failures: %s", self._failures, e)
+                        self._opened_at = self.clock()
+            raise
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+        return result
+
+
+def _is_outage(e: Exception) -> bool:
+    # Connection problems, 5xx and rate limiting count against Stripe; request
+    # errors (bad params, card declines, auth) are the caller's problem
+    if isinstance(e, (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError)):
+        return True
+    if isinstance(e, stripe.error.StripeError):
+        return (e.http_status or 0) >= 500
+    return isinstance(e, requests.RequestException)
+
+
+@dataclass
+class CheckoutSession:
+    id: str
+    url: Optional[str]
+    expires_at: Optional[datetime] = None
+    amount_total: Optional[int] = None
+    currency: Optional[str] = None
+    payment_status: Optional[str] = None
+    payment_intent: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    raw: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Refund:
+    id: str
+    amount: Optional[int]
+    status: Optional[str] = None
+
+
+class StripeGateway:
+    is_real = True
+
+    def __init__(
+        self,
+        api_key: str,
+        timeout: float = 10.0,
+        max_network_retries: int = 1,
+        pool_size: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        self.client = stripe.StripeClient(
+            api_key,
+            max_network_retries=max_network_retries,
+            http_client=stripe.RequestsClient(timeout=timeout, session=session),
+        )
+        self.breaker = breaker or CircuitBreaker()
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return self.breaker.call(fn, *args, is_failure=_is_outage, **kwargs)
+
+    def create_checkout_session(
+        self,
+        invoice: Any,
+        amount_cents: int,
+        metadata: Dict[str, Any],
+        success_url: str,
+        cancel_url: str,
+        local_checkout_base: Optional[str] = None,
+    ) -> CheckoutSession:
+        params = {
+            "payment_method_types": ["card"],
+            "line_items": [{
+                "price_data": {
+                    "currency": (invoice.currency or "USD").lower(),
+                    "product_data": {
+                        "name": f"Invoice {invoice.invoice_number}",
+                        "description": f"Payment for invoice {invoice.invoice_number}",
+                    },
+                    "unit_amount": int(amount_cents),
+                },
+                "quantity": 1,
+            }],
+            "mode": "payment",
+            "success_url": success_url,
+            "cancel_url": cancel_url,
+            "metadata": metadata,
+        }
+        return _to_checkout_session(self._call(self.client.v1.checkout.sessions.create, params))
+
+    def retrieve_checkout_session(self, session_id: str) -> CheckoutSession:
+        return _to_checkout_session(self._call(self.client.v1.checkout.sessions.retrieve, session_id))
+
+    def create_refund(self, payment_intent: str, amount: Optional[int] = None) -> Refund:
+        params: Dict[str, Any] = {"payment_intent": payment_intent, "reason": "requested_by_customer"}
+        if amount is not None:
+            params["amount"] = amount
+        refund = self._call(self.client.v1.refunds.create, params)
+        return Refund(id=refund.id, amount=refund.amount, status=getattr(refund, "status", None))
+
+    def list_balance_transactions(
+        self,
+        created_gte: Optional[datetime] = None,
+        created_lt: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Balance transactions of the period, paging through Stripe 100 at a time.
+
+        Sources are expanded so each transaction carries its payment intent id.
+        """
+        params: Dict[str, Any] = {"limit": 100, "expand": ["data.source"]}
+        created = {}
+        if created_gte:
+            created["gte"] = int(created_gte.timestamp())
+        if created_lt:
+            created["lt"] = int(created_lt.timestamp())
+        if created:
+            params["created"] = created
+        page = self._call(self.client.v1.balance_transactions.list, params)
+        while True:
+            for transaction in page.data:
+                yield transaction.to_dict()
+            if not page.has_more or not page.data:
+                return
+            params["starting_after"] = page.data[-1].id
+            page = self._call(self.client.v1.balance_transactions.list, params)
+
+    def construct_event(self, payload: bytes, sig_header: Optional[str], secret: str) -> Any:
+        """Verify a webhook signature (local, no network call)."""
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
+
+
+class FakeStripeGateway(StripeGateway):
+    """In-process stand-in for Stripe used without a secret key and in tests."""
+
+    is_real = False
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.sessions: Dict[str, CheckoutSession] = {}
+        self.refunds: Dict[str, Refund] = {}
+        # Balance transactions recorded by completed sessions and refunds
+        self.balance_transactions: List[Dict[str, Any]] = []
+        self.calls = 0
+
+    def create_checkout_session(self, invoice, amount_cents, metadata, success_url, cancel_url, local_checkout_base=None):
+        self.calls += 1
+        session_id = f"local_cs_{uuid.uuid4().hex}"
+        base = (local_checkout_base or f"{settings.CORS_ORIGINS[0].rstrip('/')}{settings.API_V1_STR}/payments/local-checkout").rstrip("/")
+        session = CheckoutSession(
+            id=session_id,
+            url=f"{base}/{session_id}",
+            expires_at=datetime.utcnow() + timedelta(hours=24),
+            amount_total=int(amount_cents),
+            currency=(invoice.currency or "USD").lower(),
+            payment_status="unpaid",
+            metadata=dict(metadata),
+        )
+        session.raw = {"id": session.id, "amount_total": session.amount_total, "currency": session.currency, "metadata": session.metadata}
+        self.sessions[session_id] = session
+        return session
+
+    def retrieve_checkout_session(self, session_id):
+        self.calls += 1
+        if session_id not in self.sessions:
+            raise stripe.error.InvalidRequestError(f"No such checkout.session: '{session_id}'", "id")
+        return self.sessions[session_id]
+
+    def complete_session(self, session_id: str, payment_intent: Optional[str] = None) -> CheckoutSession:
+        """Mark a fake session as paid, the way Stripe would after checkout."""
+        session = self.sessions[session_id]
+        session.payment_status = "paid"
+        session.payment_intent = payment_intent or f"pi_local_{uuid.uuid4().hex}"
+        session.raw.update({"payment_status": "paid", "payment_intent": session.payment_intent})
+        self._record_balance_transaction("charge", session.payment_intent, session.amount_total, session.currency)
+        return session
+
+    def create_refund(self, payment_intent, amount=None):
+        self.calls += 1
+        refund = Refund(id=f"re_local_{uuid.uuid4().hex}", amount=amount, status="succeeded")
+        self.refunds[refund.id] = refund
+        self._record_balance_transaction("refund", payment_intent, -(amount or 0), None)
+        return refund
+
+    def _record_balance_transaction(self, type_: str, payment_intent: str, amount: Optional[int], currency: Optional[str]) -> None:
+        self.balance_transactions.append({
+            "id": f"txn_local_{uuid.uuid4().hex}",
+            "type": type_,
+            "amount": amount,
+            "currency": currency,
+            "source": {"payment_intent": payment_intent},
+            "created": int(time.time()),
+        })
+
+    def list_balance_transactions(self, created_gte=None, created_lt=None):
+        self.calls += 1
+        for transaction in list(self.balance_transactions):
+            created = datetime.utcfromtimestamp(transaction["created"])
+            if (created_gte is None or created >= created_gte.replace(tzinfo=None)) and (
+                created_lt is None or created < created_lt.replace(tzinfo=None)
+            ):
+                yield transaction
+
+
+def _to_checkout_session(obj: Any) -> CheckoutSession:
+    data = obj.to_dict() if hasattr(obj, "to_dict") else dict(obj)
+    expires_at = data.get("expires_at")
+    return CheckoutSession(
+        id=data["id"],
+        url=data.get("url"),
+        expires_at=datetime.utcfromtimestamp(expires_at) if expires_at else None,
+        amount_total=data.get("amount_total"),
+        currency=data.get("currency"),
+        payment_status=data.get("payment_status"),
+        payment_intent=data.get("payment_intent") if isinstance(data.get("payment_intent"), str) else None,
+        metadata=dict(data.get("metadata") or {}),
+        raw=data,
+    )
+
+
+def invoice_checkout_amount(invoice: Any) -> int:
+    return int(invoice.total_amount_cents or 0)
+
+
+def reusable_checkout_session(invoice: Any, now: Optional[datetime] = None) -> Optional[CheckoutSession]:
+    """The checkout session stored on the invoice, if it can still be handed out."""
+    if not (getattr(invoice, "stripe_checkout_session_id", None) and getattr(invoice, "stripe_checkout_url", None)):
+        return None
+    expires_at = getattr(invoice, "stripe_checkout_expires_at", None)
+    if expires_at is None:
+        return None
+    now = now or datetime.utcnow()
+    if expires_at.tzinfo is not None:
+        expires_at = expires_at.replace(tzinfo=None) - (expires_at.utcoffset() or timedelta(0))
+    if expires_at - SESSION_REUSE_MARGIN <= now:
+        return None
+    if getattr(invoice, "stripe_checkout_amount_cents", None) != invoice_checkout_amount(invoice):
+        return None
+    return CheckoutSession(id=invoice.stripe_checkout_session_id, url=invoice.stripe_checkout_url, expires_at=expires_at)
+
+
+def checkout_session_fields(session: CheckoutSession, amount_cents: int) -> Dict[str, Any]:
+    """Invoice column values recording ``session``."""
+    return {
+        "stripe_checkout_session_id": session.id,
+        "stripe_checkout_url": session.url,
+        "stripe_checkout_expires_at": session.expires_at,
+        "stripe_checkout_amount_cents": amount_cents,
+    }
+
+
+def get_or_create_checkout_session(
+    gateway: StripeGateway,
+    invoice: Any,
+    local_checkout_base: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Tuple[CheckoutSession, bool]:
+    """Return (session, created) for paying ``invoice``.
+
+    Reuses the session stored on the invoice when it is still valid for the
+    current amount; otherwise creates one. Does not modify the invoice, store
+    the result with checkout_session_fields().
+    """
+    existing = reusable_checkout_session(invoice)
+    if existing is not None:
+        return existing, False
+    amount = invoice_checkout_amount(invoice)
+    session = gateway.create_checkout_session(
+        invoice,
+        amount_cents=amount,
+        metadata=metadata or {
+            "invoice_id": str(invoice.id),
+            "clinic_id": getattr(settings, "CLINIC_ID", str(invoice.invoice_number)),
+        },
+        success_url=f"{settings.CORS_ORIGINS[0]}/patient/payment/success?session_id={{CHECKOUT_SESSION_ID}}",
+        cancel_url=f"{settings.CORS_ORIGINS[0]}/patient/payment/cancelled",
+        local_checkout_base=local_checkout_base,
+    )
+    return session, True
+
+
+_gateway: Optional[StripeGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_stripe_gateway() -> StripeGateway:
+    """Process-wide gateway (FastAPI dependency). Uses the fake without a secret key."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                if settings.STRIPE_SECRET_KEY:
+                    _gateway = StripeGateway(
+                        settings.STRIPE_SECRET_KEY,
+                        timeout=settings.STRIPE_TIMEOUT_SECONDS,
+                        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                        pool_size=settings.STRIPE_POOL_SIZE,
+                        breaker=CircuitBreaker(
+                            failure_threshold=settings.STRIPE_BREAKER_THRESHOLD,
+                            reset_timeout=settings.STRIPE_BREAKER_RESET_SECONDS,
+                        ),
+                    )
+                else:
+                    logger.info("STRIPE_SECRET_KEY not set, using the local fake Stripe gateway")
+                    _gateway = FakeStripeGateway()
+    return _gateway
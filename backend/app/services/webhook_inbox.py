@@ -0,0 +1,381 @@
+"""
+Durable inbox for Stripe webhook deliveries.
+
+The webhook endpoint only verifies the signature and stores the delivery with
+record_event(); a WebhookInbox worker pool applies stored events in the
+background. Events for the same invoice are applied one at a time in arrival
+order, failures are retried with exponential backoff, and an event that keeps
+failing is dead-lettered after WEBHOOK_INBOX_MAX_ATTEMPTS attempts.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.dialect import insert_ignore
+from app.db.session import SessionLocal
+from app.models.inbound_event import InboundEvent, InboundEventStatus
+from app.models.invoice import Invoice
+from app.models.payment import Payment, PaymentStatus
+from app.models.processed_webhook_event import ProcessedWebhookEvent
+from app.services.audit_service import create_audit_log
+from app.services.invoice_balance import apply_payment
+from app.services.payment_waiters import payment_waiters
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key_for(event: Dict[str, Any]) -> Optional[str]:
+    """Invoice id the event applies to, used to serialize events per invoice."""
+    obj = (event.get("data") or {}).get("object") or {}
+    return (obj.get("metadata") or {}).get("invoice_id")
+
+
+def record_event(db: Session, event: Dict[str, Any], source: str = "stripe") -> Optional[InboundEvent]:
+    """Store a verified webhook delivery for background processing.
+
+    The event id is claimed in processed_webhook_events in the same
+    transaction, so a replayed delivery costs one ignored insert, never
+    reaches the inbox and can never be applied twice. Returns None for
+    duplicates.
+    """
+    event_id = event.get("id")
+    if event_id:
+        first_delivery = insert_ignore(
+            db,
+            ProcessedWebhookEvent.__table__,
+            {"event_id": event_id, "source": source, "event_type": event.get("type"), "received_at": datetime.utcnow()},
+            conflict_columns=["event_id"],
+        )
+        if not first_delivery:
+            db.rollback()
+            logger.info("Ignoring duplicate %s webhook delivery %s", source, event_id)
+            return None
+
+    row = InboundEvent(
+        source=source,
+        event_id=event_id,
+        event_type=event.get("type") or "unknown",
+        ordering_key=ordering_key_for(event),
+        payload=event,
+        status=InboundEventStatus.PENDING,
+    )
+    db.add(row)
+    db.commit()
+    return row
+
+
+def _apply_checkout_completed(db: Session, event: Dict[str, Any]) -> None:
+    session = event["data"]["object"]
+    invoice_id = (session.get("metadata") or {}).get("invoice_id")
+    if not invoice_id:
+        return
+
+    try:
+        invoice_uuid = uuid.UUID(str(invoice_id))
+    except Exception:
+        invoice_uuid = None
+
+    # Replayed deliveries are dropped by record_event; this guards against the
+    # same payment being recorded by another path (e.g. verify-payment-success)
+    existing_payment = db.query(Payment).filter(
+        Payment.stripe_payment_id == session.get("payment_intent")
+    ).first()
+    if existing_payment:
+        return
+
+    invoice = None
+    if invoice_uuid:
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_uuid).first()
+
+    # If a checkout session id was stored on the invoice, the incoming session must match it
+    incoming_session_id = session.get("id")
+    if invoice and invoice.stripe_checkout_session_id and incoming_session_id and invoice.stripe_checkout_session_id != incoming_session_id:
+        logger.warning(
+            "Ignoring checkout.session.completed for session %s: invoice %s stored session %s",
+            incoming_session_id, invoice.invoice_number, invoice.stripe_checkout_session_id,
+        )
+        return
+
+    payment = Payment(
+        invoice_id=invoice_uuid or None,
+        stripe_payment_id=session.get("payment_intent"),
+        amount_cents=session.get("amount_total"),
+        currency=(session.get("currency") or "").upper(),
+        status=PaymentStatus.SUCCEEDED,
+        raw_event=event,
+    )
+    db.add(payment)
+
+    if invoice:
+        apply_payment(db, invoice, payment.amount_cents)
+
+    db.commit()
+    payment_waiters.notify(
+        invoice_uuid, incoming_session_id, (session.get("metadata") or {}).get("local_session_id")
+    )
+
+    try:
+        create_audit_log(
+            db,
+            actor_id=None,
+            actor_type="stripe",
+            action="checkout_completed",
+            target_type="payment",
+            target_id=str(payment.id),
+            details={
+                "invoice_id": str(invoice.id) if invoice else None,
+                "session_id": incoming_session_id,
+                "payment_intent": session.get("payment_intent"),
+            },
+        )
+    except Exception:
+        logger.exception("[AUDIT ERROR] failed to create audit log for stripe webhook payment")
+
+
+# Event type -> handler. Types without a handler are marked processed as-is.
+EVENT_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any]], None]] = {
+    "checkout.session.completed": _apply_checkout_completed,
+}
+
+
+def apply_event(db: Session, event: Dict[str, Any]) -> None:
+    handler = EVENT_HANDLERS.get(event.get("type"))
+    if handler:
+        handler(db, event)
+
+
+class WebhookInbox:
+    """Background worker pool draining the inbound_events table."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        batch_size: int = 200,
+        poll_interval: float = 1.0,
+        base_backoff: float = 2.0,
+        lock_timeout: float = 300.0,
+        purge_interval: float = 3600.0,
+    ):
+        self.session_factory = session_factory
+        self.workers = settings.WEBHOOK_INBOX_WORKERS if workers is None else workers
+        self.max_attempts = settings.WEBHOOK_INBOX_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.lock_timeout = lock_timeout
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        # Claims are tagged so several processes can share the table safely
+        self.instance_id = uuid.uuid4().hex
+        self._inflight: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.workers <= 0:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="webhook-inbox")
+        self._thread = threading.Thread(target=self._run, name="webhook-inbox-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("Webhook inbox started with %d workers", self.workers)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def wake(self) -> None:
+        """Signal the dispatcher that new events were stored."""
+        self._wake.set()
+
+    def drain(self, db: Optional[Session] = None) -> int:
+        """Apply every ready event synchronously and return how many were handled.
+
+        Used by tests and maintenance scripts; the running app relies on the
+        background dispatcher instead.
+        """
+        own_session = db is None
+        db = db or self.session_factory()
+        handled = 0
+        try:
+            while True:
+                groups = self._claim_ready_groups(db, exclude=set())
+                if not groups:
+                    break
+                for _, ids in groups:
+                    self._process_ids(db, ids)
+                    handled += len(ids)
+        finally:
+            if own_session:
+                db.close()
+        return handled
+
+    def purge_expired(self, db: Session) -> int:
+        """Forget de-duplication ids older than the retention window."""
+        cutoff = datetime.utcnow() - timedelta(days=settings.WEBHOOK_DEDUP_RETENTION_DAYS)
+        deleted = db.query(ProcessedWebhookEvent).filter(
+            ProcessedWebhookEvent.received_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch_once()
+                if time.monotonic() - self._last_purge >= self.purge_interval:
+                    self._last_purge = time.monotonic()
+                    with self.session_factory() as db:
+                        self.purge_expired(db)
+            except Exception:
+                logger.exception("Webhook inbox dispatch failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _dispatch_once(self) -> None:
+        with self._lock:
+            inflight = set(self._inflight)
+        with self.session_factory() as db:
+            groups = self._claim_ready_groups(db, exclude=inflight)
+        for key, ids in groups:
+            with self._lock:
+                self._inflight.add(key)
+            self._executor.submit(self._run_group, key, ids)
+
+    def _run_group(self, key: str, ids: List[int]) -> None:
+        try:
+            with self.session_factory() as db:
+                self._process_ids(db, ids)
+        except Exception:
+            logger.exception("Webhook inbox worker failed on %s", key)
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+            self._wake.set()
+
+    def _claim_ready_groups(self, db: Session, exclude: Set[str]) -> List[Tuple[str, List[int]]]:
+        """Claim pending events grouped by ordering key, oldest first.
+
+        A key is skipped while any of its events is being processed elsewhere
+        or its oldest pending event is waiting for a retry, so later events
+        for the same invoice never overtake earlier ones.
+        """
+        now = datetime.utcnow()
+        db.query(InboundEvent).filter(
+            InboundEvent.status == InboundEventStatus.PROCESSING,
+            InboundEvent.locked_at < now - timedelta(seconds=self.lock_timeout),
+        ).update(
+            {"status": InboundEventStatus.PENDING, "locked_at": None, "locked_by": None},
+            synchronize_session=False,
+        )
+
+        blocked = set(exclude)
+        for (key,) in db.query(InboundEvent.ordering_key).filter(
+            InboundEvent.status == InboundEventStatus.PROCESSING,
+            InboundEvent.ordering_key.isnot(None),
+        ).distinct():
+            blocked.add(key)
+
+        rows = (
+            db.query(InboundEvent.id, InboundEvent.ordering_key, InboundEvent.next_attempt_at)
+            .filter(InboundEvent.status == InboundEventStatus.PENDING)
+            .order_by(InboundEvent.id.asc())
+            .limit(self.batch_size)
+            .all()
+        )
+        groups: Dict[str, List[int]] = {}
+        for event_id, ordering_key, next_attempt_at in rows:
+            key = ordering_key or f"event:{event_id}"
+            if key in blocked:
+                continue
+            if next_attempt_at is not None and next_attempt_at > now:
+                blocked.add(key)
+                continue
+            groups.setdefault(key, []).append(event_id)
+
+        claimed: List[Tuple[str, List[int]]] = []
+        for key, ids in groups.items():
+            updated = db.query(InboundEvent).filter(
+                InboundEvent.id.in_(ids),
+                InboundEvent.status == InboundEventStatus.PENDING,
+            ).update(
+                {"status": InboundEventStatus.PROCESSING, "locked_at": now, "locked_by": self.instance_id},
+                synchronize_session=False,
+            )
+            if updated:
+                claimed.append((key, ids))
+        db.commit()
+        return claimed
+
+    def _process_ids(self, db: Session, ids: List[int]) -> None:
+        for position, event_id in enumerate(ids):
+            row = db.get(InboundEvent, event_id)
+            if row is None or row.status != InboundEventStatus.PROCESSING or row.locked_by != self.instance_id:
+                continue
+            if not self._process_row(db, row):
+                # Keep per-invoice order: hand the rest of the group back untouched
+                db.query(InboundEvent).filter(
+                    InboundEvent.id.in_(ids[position + 1:]),
+                    InboundEvent.locked_by == self.instance_id,
+                    InboundEvent.status == InboundEventStatus.PROCESSING,
+                ).update(
+                    {"status": InboundEventStatus.PENDING, "locked_at": None, "locked_by": None},
+                    synchronize_session=False,
+                )
+                db.commit()
+                return
+
+    def _process_row(self, db: Session, row: InboundEvent) -> bool:
+        """Apply one event. Returns False when it was scheduled for a retry."""
+        event_id = row.id
+        try:
+            apply_event(db, row.payload)
+            row.status = InboundEventStatus.PROCESSED
+            row.attempts += 1
+            row.processed_at = datetime.utcnow()
+            row.last_error = None
+            row.locked_at = None
+            row.locked_by = None
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            row = db.get(InboundEvent, event_id)
+            row.attempts += 1
+            row.last_error = f"{e.__class__.__name__}: {e}"
+            row.locked_at = None
+            row.locked_by = None
+            if row.attempts >= self.max_attempts:
+                row.status = InboundEventStatus.DEAD
+                logger.error("Webhook event %s dead-lettered after %d attempts: %s", row.event_id, row.attempts, e)
+                db.commit()
+                return True
+            row.status = InboundEventStatus.PENDING
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.base_backoff * (2 ** (row.attempts - 1)))
+            logger.warning("Webhook event %s failed (attempt %d), retrying: %s", row.event_id, row.attempts, e)
+            db.commit()
+            return False
+
+
+webhook_inbox = WebhookInbox()
@@ -0,0 +1,45 @@
+import argparse
+import sys
+from pathlib import Path
+
+from app.db.session import SessionLocal
+from app.models.patient_import import PatientImportError
+from app.services.patient_import import import_patients, read_patient_rows, start_import
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Import patients from a CSV (with a header row) or NDJSON file")
+    parser.add_argument("--file", required=True, help="Patient file (.csv, .ndjson or .jsonl, '-' for stdin)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="File format (default: from the file extension)")
+    parser.add_argument("--workers", type=int, help="Validation processes (0 validates in this process)")
+    parser.add_argument("--chunk-size", type=int, help="Rows per transaction")
+    parser.add_argument("--show", type=int, default=20, help="Print up to this many rows that were not imported")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    fmt = args.format or ("csv" if Path(args.file).suffix.lower() == ".csv" else "ndjson")
+
+    def progress(run):
+        print(f"\r{run.rows_read} rows: {run.created} created, {run.duplicates} duplicates, {run.failed} invalid", end="", flush=True)
+
+    with SessionLocal() as db:
+        run = start_import(db, args.file, fmt)
+        fh = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8-sig")
+        with fh:
+            import_patients(db, run, read_patient_rows(fh, fmt), chunk_size=args.chunk_size, workers=args.workers, progress=progress)
+        print()
+        print(f"import {run.id}: {run.rows_read} rows, {run.created} created, {run.duplicates} duplicates, {run.failed} invalid")
+        errors = (
+            db.query(PatientImportError)
+            .filter(PatientImportError.import_id == run.id)
+            .order_by(PatientImportError.row)
+            .limit(args.show)
+        )
+        for error in errors:
+            print(f"  row {error.row}: {error.issue.value} {error.field or ''}: {error.message}")
+
+
+if __name__ == "__main__":
+    main()
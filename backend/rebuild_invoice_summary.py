@@ -0,0 +1,22 @@
+import argparse
+
+from app.db.session import SessionLocal
+from app.services.invoice_summary import rebuild_invoice_summaries
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the invoice_summary read model from invoices (after writes that bypassed the app)"
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    parse_args()
+    with SessionLocal() as db:
+        count = rebuild_invoice_summaries(db)
+        print(f"invoice_summary rebuilt with {count} row(s)")
+
+
+if __name__ == "__main__":
+    main()
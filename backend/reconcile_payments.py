@@ -0,0 +1,60 @@
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from app.db.session import SessionLocal
+from app.models.reconciliation import DiscrepancyKind, ReconciliationDiscrepancy
+from app.services.reconciliation import entry_from_mapping, read_export, reconcile
+from app.services.stripe_gateway import get_stripe_gateway
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reconcile Stripe balance transactions against recorded payments")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Balance-transaction export (.csv, .json or .jsonl, '-' for stdin)")
+    source.add_argument("--stripe", action="store_true", help="List balance transactions from Stripe (or the local fake)")
+    parser.add_argument("--format", choices=["csv", "json"], help="Export format (default: from the file extension)")
+    parser.add_argument("--from", dest="period_start", help="Period start YYYY-MM-DD (enables missing-payment checks)")
+    parser.add_argument("--to", dest="period_end", help="Period end YYYY-MM-DD, exclusive")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Entries matched per query")
+    parser.add_argument("--show", type=int, default=20, help="Print up to this many discrepancies per kind")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    period_start = datetime.fromisoformat(args.period_start) if args.period_start else None
+    period_end = datetime.fromisoformat(args.period_end) if args.period_end else None
+
+    with SessionLocal() as db:
+        if args.stripe:
+            transactions = get_stripe_gateway().list_balance_transactions(period_start, period_end)
+            run = reconcile(db, (entry_from_mapping(t) for t in transactions), "stripe", period_start, period_end, args.chunk_size)
+        else:
+            fmt = args.format or ("csv" if Path(args.file).suffix.lower() == ".csv" else "json")
+            fh = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+            with fh:
+                run = reconcile(db, read_export(fh, fmt), args.file, period_start, period_end, args.chunk_size)
+
+        print(f"run {run.id}: {run.entries_total} entries, {run.entries_matched} matched, {run.entries_ignored} ignored")
+        for kind in DiscrepancyKind:
+            count = run.summary.get(kind.value, 0)
+            if not count:
+                continue
+            print(f"  {kind.value}: {count}")
+            rows = (
+                db.query(ReconciliationDiscrepancy)
+                .filter(ReconciliationDiscrepancy.run_id == run.id, ReconciliationDiscrepancy.kind == kind)
+                .order_by(ReconciliationDiscrepancy.id)
+                .limit(args.show)
+            )
+            for row in rows:
+                print(
+                    f"    {row.stripe_payment_id} txn={row.balance_transaction_id} "
+                    f"expected={row.expected_amount_cents} actual={row.actual_amount_cents} {row.currency or ''}"
+                )
+
+
+if __name__ == "__main__":
+    main()
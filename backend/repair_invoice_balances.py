@@ -0,0 +1,28 @@
+import argparse
+
+from app.db.session import SessionLocal
+from app.services.invoice_balance import repair_balances
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check invoice paid/balance counters and status against payments and fix drift")
+    parser.add_argument("--dry-run", action="store_true", help="Only report drift, do not fix it")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with SessionLocal() as db:
+        drift = repair_balances(db, dry_run=args.dry_run)
+        action = "found" if args.dry_run else "repaired"
+        print(f"{len(drift)} invoice(s) with balance drift {action}")
+        for entry in drift:
+            print(
+                f"  {entry['invoice'].invoice_number}: paid {entry['stored_paid_cents']} -> {entry['paid_cents']}, "
+                f"balance {entry['stored_balance_cents']} -> {entry['balance_cents']}, "
+                f"status {entry['stored_status'].value} -> {entry['status'].value}"
+            )
+
+
+if __name__ == "__main__":
+    main()
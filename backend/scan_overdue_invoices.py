@@ -0,0 +1,24 @@
+import argparse
+from datetime import date
+
+from app.db.session import SessionLocal
+from app.services.overdue_invoices import scan_overdue_invoices
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Flag issued and partially paid invoices that are past their due date")
+    parser.add_argument("--today", help="Treat this date (YYYY-MM-DD) as today", required=False)
+    parser.add_argument("--batch-size", type=int, help="Invoices flagged per transaction", required=False)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    today = date.fromisoformat(args.today) if args.today else None
+    with SessionLocal() as db:
+        result = scan_overdue_invoices(db, today=today, batch_size=args.batch_size)
+        print(f"Flagged {result.flagged} of {result.scanned} past-due invoice(s) in {result.batches} batch(es)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import json
+from datetime import date
+
+from app.db.session import SessionLocal
+from app.models.invoice import InvoiceStatus
+from app.services.bulk_payment_links import dispatch_payment_links, select_invoice_ids
+from app.services.stripe_gateway import get_or_create_checkout_session, get_stripe_gateway
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Issue invoices and queue payment-link emails in bulk")
+    parser.add_argument("--invoice-id", dest="invoice_ids", action="append", help="Invoice id (repeatable)")
+    parser.add_argument("--status", choices=[s.value for s in InvoiceStatus], help="Only invoices with this status")
+    parser.add_argument("--patient-id", help="Only invoices of this patient")
+    parser.add_argument("--due-from", help="Due date from YYYY-MM-DD")
+    parser.add_argument("--due-to", help="Due date to YYYY-MM-DD")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent Stripe session requests")
+    parser.add_argument("--results", help="Write per-invoice results as JSON to this file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    gateway = get_stripe_gateway()
+    with SessionLocal() as db:
+        invoice_ids = select_invoice_ids(
+            db,
+            invoice_ids=args.invoice_ids,
+            status=InvoiceStatus(args.status) if args.status else None,
+            patient_id=args.patient_id,
+            due_date_from=date.fromisoformat(args.due_from) if args.due_from else None,
+            due_date_to=date.fromisoformat(args.due_to) if args.due_to else None,
+        )
+        print(f"{len(invoice_ids)} invoice(s) selected")
+        outcome = dispatch_payment_links(
+            db,
+            invoice_ids,
+            create_session=lambda invoice: get_or_create_checkout_session(gateway, invoice)[0],
+            concurrency=args.concurrency,
+            progress=lambda done, total: print(f"  {done}/{total}", flush=True),
+        )
+    print(f"sent {outcome.sent}, failed {outcome.failed}, skipped {outcome.skipped}")
+    if args.results:
+        with open(args.results, "w") as fh:
+            json.dump(outcome.results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
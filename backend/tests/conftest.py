@@ -1,3 +1,12 @@
+import os
+# Webhook events and queued emails are processed explicitly in tests via drain()
+os.environ.setdefault("WEBHOOK_INBOX_WORKERS", "0")
+os.environ.setdefault("EMAIL_OUTBOX_WORKERS", "0")
+# The overdue scan is run explicitly too
+os.environ.setdefault("OVERDUE_SCAN_INTERVAL_SECONDS", "0")
+# Tests build the patient typeahead index themselves, from the test database
+os.environ.setdefault("PATIENT_TYPEAHEAD_MAX_PATIENTS", "0")
+
 import pytest
 import asyncio
 from sqlalchemy import create_engine
@@ -6,7 +15,8 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.db.session import get_db, Base
 from app.core.config import settings
-import os
+from app.services.stripe_gateway import FakeStripeGateway, get_stripe_gateway
+from app.core.idempotency import idempotency_store
 
 # Test database URL
 TEST_DATABASE_URL = "sqlite:///./test.db"
@@ -33,8 +43,13 @@ def test_db():
     Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(test_db):
-    """Create a test client with database dependency override."""
+def stripe_gateway():
+    """In-process Stripe stand-in; the test client never talks to Stripe."""
+    return FakeStripeGateway()
+
+@pytest.fixture(scope="function")
+def client(test_db, stripe_gateway):
+    """Create a test client with database and Stripe gateway dependency overrides."""
     def override_get_db():
         try:
             yield test_db
@@ -42,11 +57,16 @@ def client(test_db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_stripe_gateway] = lambda: stripe_gateway
+    # The idempotency middleware opens its own sessions, on the test database too
+    store_session_factory = idempotency_store.session_factory
+    idempotency_store.session_factory = sessionmaker(bind=test_db.get_bind())
     
     with TestClient(app) as test_client:
         yield test_client
     
     app.dependency_overrides.clear()
+    idempotency_store.session_factory = store_session_factory
 
 @pytest.fixture
 def sample_staff_data():
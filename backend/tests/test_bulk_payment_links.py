@@ -0,0 +1,160 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.outbox_email import OutboxEmail
+from app.models.patient import Patient
+from app.models.payment_link_run import PaymentLinkResult, PaymentLinkRunStatus
+from app.services.bulk_payment_links import (
+    dispatch_payment_links,
+    payment_link_dispatcher,
+    run_payment_links,
+    select_invoice_ids,
+    start_payment_link_run,
+)
+from app.services.stripe_gateway import CheckoutSession
+from tests.test_payments import create_test_staff, get_auth_token
+
+
+def make_invoice(db, staff, patient, number, status):
+    invoice = Invoice(
+        invoice_number=number,
+        patient_id=patient.id,
+        staff_id=staff.id,
+        currency="USD",
+        total_amount_cents=5000,
+        status=status,
+    )
+    db.add(invoice)
+    db.commit()
+    return invoice
+
+
+def fake_sessions(fail_numbers=()):
+    lock = threading.Lock()
+    calls = []
+
+    def create_session(invoice):
+        with lock:
+            calls.append(invoice.invoice_number)
+        if invoice.invoice_number in fail_numbers:
+            raise RuntimeError("stripe unavailable")
+        return CheckoutSession(
+            id=f"cs_{invoice.invoice_number}",
+            url=f"https://pay.test/{invoice.invoice_number}",
+            expires_at=datetime.utcnow() + timedelta(hours=24),
+        )
+
+    return create_session, calls
+
+
+def test_bulk_dispatch_issues_links_and_queues_emails(test_db):
+    staff = create_test_staff(test_db)
+    patient = Patient(name="Bulk Patient", email="bulk@example.com")
+    no_email = Patient(name="No Email", email=None)
+    test_db.add_all([patient, no_email])
+    test_db.commit()
+    draft = make_invoice(test_db, staff, patient, "INV-1", InvoiceStatus.DRAFT)
+    issued = make_invoice(test_db, staff, patient, "INV-2", InvoiceStatus.ISSUED)
+    broken = make_invoice(test_db, staff, patient, "INV-3", InvoiceStatus.ISSUED)
+    paid = make_invoice(test_db, staff, patient, "INV-4", InvoiceStatus.PAID)
+    orphan = make_invoice(test_db, staff, no_email, "INV-5", InvoiceStatus.ISSUED)
+    ids = [invoice.id for invoice in (draft, issued, broken, paid, orphan)]
+    create_session, calls = fake_sessions(fail_numbers={"INV-3"})
+    progress = []
+
+    outcome = dispatch_payment_links(
+        test_db, ids, create_session, concurrency=3, chunk_size=2, progress=lambda done, total: progress.append(done)
+    )
+
+    assert (outcome.total, outcome.sent, outcome.failed, outcome.skipped) == (5, 2, 2, 1)
+    assert {r["invoice_number"]: r["status"] for r in outcome.results} == {
+        "INV-1": "sent", "INV-2": "sent", "INV-3": "failed", "INV-4": "skipped", "INV-5": "failed",
+    }
+    assert progress == [2, 4, 5]
+    assert sorted(calls) == ["INV-1", "INV-2", "INV-3"]
+
+    test_db.expire_all()
+    assert test_db.get(Invoice, draft.id).status == InvoiceStatus.ISSUED
+    assert test_db.get(Invoice, draft.id).issued_at is not None
+    assert test_db.get(Invoice, issued.id).stripe_checkout_session_id == "cs_INV-2"
+    assert test_db.get(Invoice, broken.id).stripe_checkout_session_id is None
+    emails = test_db.query(OutboxEmail).order_by(OutboxEmail.id).all()
+    assert [(e.to_address, e.related_id) for e in emails] == [
+        ("bulk@example.com", str(draft.id)), ("bulk@example.com", str(issued.id)),
+    ]
+    assert "https://pay.test/INV-1" in emails[0].body
+
+
+def test_select_invoice_ids_defaults_to_payable_invoices(test_db):
+    staff = create_test_staff(test_db)
+    patient = Patient(name="Bulk Patient", email="bulk@example.com")
+    test_db.add(patient)
+    test_db.commit()
+    issued = make_invoice(test_db, staff, patient, "INV-1", InvoiceStatus.ISSUED)
+    make_invoice(test_db, staff, patient, "INV-2", InvoiceStatus.PAID)
+    make_invoice(test_db, staff, patient, "INV-3", InvoiceStatus.CANCELLED)
+
+    assert select_invoice_ids(test_db, patient_id=str(patient.id)) == [issued.id]
+
+
+def test_run_records_progress_and_results(test_db):
+    staff = create_test_staff(test_db)
+    patient = Patient(name="Bulk Patient", email="bulk@example.com")
+    test_db.add(patient)
+    test_db.commit()
+    ids = [make_invoice(test_db, staff, patient, f"INV-{i}", InvoiceStatus.ISSUED).id for i in range(3)]
+    create_session, _ = fake_sessions(fail_numbers={"INV-1"})
+    run = start_payment_link_run(test_db, total=len(ids), staff_id=staff.id)
+
+    run_payment_links(test_db, run, ids, create_session)
+
+    assert run.status == PaymentLinkRunStatus.COMPLETED
+    assert (run.total, run.processed, run.sent, run.failed, run.skipped) == (3, 3, 2, 1, 0)
+    results = test_db.query(PaymentLinkResult).filter(PaymentLinkResult.run_id == run.id).order_by(PaymentLinkResult.id).all()
+    assert [(r.invoice_number, r.status) for r in results] == [("INV-0", "sent"), ("INV-1", "failed"), ("INV-2", "sent")]
+    assert results[1].error == "stripe unavailable"
+
+
+@pytest.fixture
+def dispatcher(test_db):
+    session_factory = payment_link_dispatcher.session_factory
+    payment_link_dispatcher.session_factory = sessionmaker(bind=test_db.get_bind())
+    yield payment_link_dispatcher
+    payment_link_dispatcher.stop()
+    payment_link_dispatcher.session_factory = session_factory
+
+
+def test_bulk_endpoint_runs_in_background(client, test_db, dispatcher):
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    staff = create_test_staff(test_db)
+    patient = Patient(name="Bulk Patient", email="bulk@example.com")
+    test_db.add(patient)
+    test_db.commit()
+    draft = make_invoice(test_db, staff, patient, "INV-1", InvoiceStatus.DRAFT)
+    paid = make_invoice(test_db, staff, patient, "INV-2", InvoiceStatus.PAID)
+
+    response = client.post(
+        "/api/v1/payments/invoices/bulk-send-payment-links",
+        json={"invoice_ids": [str(draft.id), str(paid.id)]},
+        headers=headers,
+    )
+    assert response.status_code == 202
+    assert (response.json()["status"], response.json()["total"]) == ("pending", 2)
+    run_id = response.json()["id"]
+    dispatcher.stop()
+
+    run = client.get(f"/api/v1/payments/invoices/bulk-send-payment-links/{run_id}", headers=headers).json()
+    assert run["status"] == "completed"
+    assert (run["processed"], run["sent"], run["failed"], run["skipped"]) == (2, 1, 0, 1)
+    assert {r["invoice_id"]: r["status"] for r in run["results"]} == {str(draft.id): "sent", str(paid.id): "skipped"}
+
+    counters = client.get(
+        f"/api/v1/payments/invoices/bulk-send-payment-links/{run_id}", params={"include_results": False}, headers=headers
+    ).json()
+    assert counters["results"] is None
+    assert client.get("/api/v1/payments/invoices/bulk-send-payment-links/nope", headers=headers).status_code == 404
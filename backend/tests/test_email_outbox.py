@@ -0,0 +1,55 @@
+from app.models.outbox_email import OutboxEmail, OutboxEmailStatus
+from app.services.email_outbox import EmailOutbox, enqueue_email
+
+
+class RecordingMailer:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.sent = []
+
+    def send_email(self, to, subject, body, from_address=None, html_body=None):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("mail server down")
+        self.sent.append((to, subject))
+
+
+def make_outbox(mailer, **kwargs):
+    return EmailOutbox(mailer_factory=lambda: mailer, workers=0, base_backoff=0, **kwargs)
+
+
+def test_queued_email_is_delivered_by_drain(test_db):
+    enqueue_email(test_db, to="pat@example.com", subject="Hello", body="Hi", related_type="invoice", related_id="inv-1")
+    test_db.commit()
+    mailer = RecordingMailer()
+
+    assert make_outbox(mailer).drain(test_db) == 1
+
+    assert mailer.sent == [("pat@example.com", "Hello")]
+    message = test_db.query(OutboxEmail).one()
+    assert message.status == OutboxEmailStatus.SENT
+    assert message.attempts == 1
+    assert message.sent_at is not None
+
+
+def test_uncommitted_email_is_not_sent(test_db):
+    enqueue_email(test_db, to="pat@example.com", subject="Hello", body="Hi")
+    test_db.rollback()
+
+    assert make_outbox(RecordingMailer()).drain(test_db) == 0
+
+
+def test_failed_email_is_retried_then_marked_failed(test_db):
+    enqueue_email(test_db, to="pat@example.com", subject="Hello", body="Hi")
+    test_db.commit()
+    mailer = RecordingMailer(fail_times=10)
+    outbox = make_outbox(mailer, max_attempts=3)
+
+    # base_backoff=0 makes every retry due immediately
+    outbox.drain(test_db)
+
+    message = test_db.query(OutboxEmail).one()
+    assert message.status == OutboxEmailStatus.FAILED
+    assert message.attempts == 3
+    assert "mail server down" in message.last_error
+    assert mailer.sent == []
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.idempotency import IdempotencyStore
+from app.models.idempotency_key import IdempotencyKey
+from app.models.invoice import InvoiceStatus
+from app.models.payment import Payment
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff, get_auth_token
+
+
+def test_retried_manual_payment_is_replayed_not_repeated(client, test_db):
+    token = get_auth_token(client, test_db)
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    payload = {"invoice_id": str(invoice.id), "amount_cents": 5000, "currency": "USD"}
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "cash-42"}
+
+    first = client.post("/api/v1/payments/", json=payload, headers=headers)
+    retry = client.post("/api/v1/payments/", json=payload, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert test_db.query(Payment).count() == 1
+
+    reused = client.post("/api/v1/payments/", json={**payload, "amount_cents": 1}, headers=headers)
+    assert reused.status_code == 422
+    assert test_db.query(Payment).count() == 1
+
+    # Without a key every request runs
+    client.post("/api/v1/payments/", json=payload, headers={"Authorization": f"Bearer {token}"})
+    assert test_db.query(Payment).count() == 2
+
+
+def test_store_locks_concurrent_duplicates_and_expires_keys(test_db):
+    store = IdempotencyStore(session_factory=sessionmaker(bind=test_db.get_bind()), ttl=timedelta(hours=1))
+
+    assert store.claim("k", "req").state == "acquired"
+    assert store.claim("k", "req").state == "in_progress"
+    store.complete("k", 201, [("content-type", "application/json")], b'{"ok":true}')
+    replay = store.claim("k", "req")
+    assert (replay.state, replay.status_code, replay.body) == ("replay", 201, b'{"ok":true}')
+    assert replay.headers == [("content-type", "application/json")]
+
+    # A failed request releases its key so the retry runs again
+    assert store.claim("failed", "req").state == "acquired"
+    store.release("failed")
+    assert store.claim("failed", "req").state == "acquired"
+
+    test_db.query(IdempotencyKey).update({"expires_at": IdempotencyKey.expires_at - timedelta(hours=2)})
+    test_db.commit()
+    assert store.claim("k", "other request").state == "acquired"
+    assert store.purge_expired(test_db) == 1
@@ -0,0 +1,96 @@
+import uuid
+from datetime import datetime
+
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.payment import Payment, PaymentStatus
+from app.services.invoice_balance import apply_payment, find_balance_drift, repair_balances
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff
+
+
+def add_payment(db, invoice, amount_cents, received_at=None):
+    payment = Payment(
+        invoice_id=invoice.id,
+        stripe_payment_id=f"manual_{uuid.uuid4().hex}",
+        amount_cents=amount_cents,
+        currency="USD",
+        status=PaymentStatus.SUCCEEDED,
+        received_at=received_at,
+    )
+    db.add(payment)
+    apply_payment(db, invoice, amount_cents, received_at)
+    db.commit()
+    return payment
+
+
+def test_new_invoice_balance_is_its_total(test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db))
+
+    assert invoice.paid_cents == 0
+    assert invoice.balance_cents == 16200
+    assert invoice.last_payment_at is None
+
+
+def test_payments_and_refunds_update_balance_and_status(test_db):
+    invoice = create_test_invoice(
+        test_db, create_test_patient(test_db), create_test_staff(test_db), status=InvoiceStatus.ISSUED
+    )
+
+    first = add_payment(test_db, invoice, 6200, datetime(2025, 1, 2))
+    assert (invoice.paid_cents, invoice.balance_cents, invoice.status) == (6200, 10000, InvoiceStatus.PARTIALLY_PAID)
+
+    add_payment(test_db, invoice, 10000, datetime(2025, 1, 5))
+    assert (invoice.paid_cents, invoice.balance_cents, invoice.status) == (16200, 0, InvoiceStatus.PAID)
+    assert invoice.last_payment_at.date().isoformat() == "2025-01-05"
+
+    first.status = PaymentStatus.REFUNDED
+    apply_payment(test_db, invoice, -first.amount_cents)
+    test_db.commit()
+    assert (invoice.paid_cents, invoice.balance_cents, invoice.status) == (10000, 6200, InvoiceStatus.PARTIALLY_PAID)
+    assert find_balance_drift(test_db) == []
+
+
+def test_repair_fixes_drifted_counters(test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db))
+    add_payment(test_db, invoice, 5000)
+    test_db.query(Invoice).update({"paid_cents": 0, "balance_cents": 16200})
+    test_db.commit()
+
+    assert len(repair_balances(test_db, dry_run=True)) == 1
+    assert test_db.get(Invoice, invoice.id).paid_cents == 0
+
+    drift = repair_balances(test_db)
+    assert [entry["paid_cents"] for entry in drift] == [5000]
+    test_db.expire_all()
+    assert (invoice.paid_cents, invoice.balance_cents) == (5000, 11200)
+    assert find_balance_drift(test_db) == []
+
+
+def test_repair_recomputes_status(test_db):
+    patient, staff = create_test_patient(test_db), create_test_staff(test_db)
+
+    def invoice(number, status):
+        created = Invoice(invoice_number=number, patient_id=patient.id, staff_id=staff.id, total_amount_cents=16200, status=status)
+        test_db.add(created)
+        test_db.commit()
+        return created
+
+    settled = invoice("INV-SETTLED", InvoiceStatus.ISSUED)
+    add_payment(test_db, settled, 16200)
+    unpaid = invoice("INV-UNPAID", InvoiceStatus.ISSUED)
+    cancelled = invoice("INV-CANCELLED", InvoiceStatus.CANCELLED)
+    add_payment(test_db, cancelled, 16200)
+    # Fully paid but still issued, and marked paid with nothing paid
+    test_db.query(Invoice).filter(Invoice.id == settled.id).update({"status": InvoiceStatus.ISSUED})
+    test_db.query(Invoice).filter(Invoice.id == unpaid.id).update({"status": InvoiceStatus.PAID})
+    test_db.commit()
+
+    drift = repair_balances(test_db)
+
+    assert {entry["invoice"].invoice_number: entry["status"] for entry in drift} == {
+        "INV-SETTLED": InvoiceStatus.PAID, "INV-UNPAID": InvoiceStatus.ISSUED,
+    }
+    test_db.expire_all()
+    assert (settled.status, unpaid.status, cancelled.status) == (
+        InvoiceStatus.PAID, InvoiceStatus.ISSUED, InvoiceStatus.CANCELLED,
+    )
+    assert find_balance_drift(test_db) == []
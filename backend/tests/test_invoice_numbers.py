@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.models.invoice_number_counter import InvoiceNumberCounter
+from app.services.invoice_numbers import allocate_invoice_number, allocate_invoice_numbers
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff
+
+OCTOBER = datetime(2026, 10, 19)
+
+
+def test_allocation_continues_after_existing_numbers_and_restarts_monthly(test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db))
+    invoice.invoice_number = "CLINIC-202610-0041"
+    test_db.commit()
+
+    assert allocate_invoice_number(test_db, OCTOBER) == "CLINIC-202610-0042"
+    assert allocate_invoice_numbers(test_db, 3, OCTOBER) == ["CLINIC-202610-0043", "CLINIC-202610-0044", "CLINIC-202610-0045"]
+    assert allocate_invoice_number(test_db, datetime(2026, 11, 1)) == "CLINIC-202611-0001"
+    assert test_db.get(InvoiceNumberCounter, "202610").last_value == 45
+
+
+def test_concurrent_allocations_never_collide(test_db):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        numbers = list(pool.map(lambda _: allocate_invoice_number(test_db, OCTOBER), range(40)))
+
+    assert sorted(numbers) == [f"CLINIC-202610-{n:04d}" for n in range(1, 41)]
@@ -0,0 +1,91 @@
+import os
+import time
+
+from app.models.invoice import InvoiceStatus
+from app.models.payment import Payment, PaymentStatus
+from app.services.invoice_pdf import InvoicePdfCache, invoice_pdf_cache, render_invoice_pdf
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff, get_auth_token
+
+
+def test_invoice_pdf_is_cached_by_content_and_revalidated(client, test_db, tmp_path, monkeypatch):
+    renders = []
+
+    def counting_renderer(snapshot):
+        renders.append(snapshot["paid_cents"])
+        return render_invoice_pdf(snapshot)
+
+    monkeypatch.setattr(invoice_pdf_cache, "directory", tmp_path)
+    monkeypatch.setattr(invoice_pdf_cache, "renderer", counting_renderer)
+    token = get_auth_token(client, test_db)
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"/api/v1/invoices/{invoice.id}/pdf"
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "application/pdf"
+    assert first.content.startswith(b"%PDF")
+    etag = first.headers["etag"]
+
+    again = client.get(url, headers=headers)
+    assert again.content == first.content and again.headers["etag"] == etag
+    not_modified = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert renders == [0]
+
+    test_db.add(Payment(
+        invoice_id=invoice.id, stripe_payment_id="manual_pdf", amount_cents=5000,
+        currency="USD", status=PaymentStatus.SUCCEEDED,
+    ))
+    invoice.paid_cents, invoice.balance_cents = 5000, 11200
+    test_db.commit()
+
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert renders == [0, 5000]
+    # The old version stays on disk for requests still serving it, until the sweep
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        f"{invoice.id}-{tag.strip(chr(34))}.pdf" for tag in (etag, changed.headers["etag"])
+    )
+
+    assert client.get("/api/v1/invoices/00000000-0000-0000-0000-000000000000/pdf", headers=headers).status_code == 404
+
+
+def test_concurrent_requests_share_one_render(tmp_path):
+    import threading
+
+    release = threading.Event()
+    calls = []
+
+    def slow_renderer(snapshot):
+        calls.append(snapshot["id"])
+        release.wait(5)
+        return b"%PDF-1.4 test"
+
+    cache = InvoicePdfCache(directory=str(tmp_path), workers=1, renderer=slow_renderer)
+    snapshot = {"id": "inv", "invoice_number": "CLINIC-1"}
+    futures = [cache.render(snapshot, "abc") for _ in range(3)]
+    release.set()
+    assert {f.result(5) for f in futures} == {tmp_path / "inv-abc.pdf"}
+    assert calls == ["inv"]
+    assert cache.render(snapshot, "abc").result(5).read_bytes() == b"%PDF-1.4 test"
+    assert calls == ["inv"]
+    cache.stop()
+
+
+def test_sweep_removes_only_files_not_served_recently(tmp_path):
+    cache = InvoicePdfCache(directory=str(tmp_path), workers=1, renderer=lambda snapshot: b"%PDF-1.4 test", max_age_hours=1)
+    day_ago = time.time() - 86400
+    for name in ("inv-old.pdf", "inv-served.pdf", ".inv-old.pdf.abc.tmp"):
+        (tmp_path / name).write_bytes(b"%PDF")
+        os.utime(tmp_path / name, (day_ago, day_ago))
+
+    # A cache hit marks the file as in use
+    assert cache.render({"id": "inv", "invoice_number": "CLINIC-1"}, "served").result(5) == tmp_path / "inv-served.pdf"
+    cache.render({"id": "inv", "invoice_number": "CLINIC-1"}, "new").result(5)
+    cache.stop()
+
+    # The render swept the directory: the file served just now and the new one are kept
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["inv-new.pdf", "inv-served.pdf"]
+    assert cache.sweep() == 0
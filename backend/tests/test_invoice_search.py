@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from app.models.invoice import Invoice, InvoiceItem, InvoiceStatus
+from app.models.invoice_search import InvoiceSearchDocument
+from app.services.invoice_search import search_invoices
+from app.services.invoice_summary import rebuild_invoice_summaries
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff, get_auth_token
+
+
+def numbers(results):
+    return [summary.invoice_number for summary, _ in results]
+
+
+def test_search_matches_number_patient_and_items_and_follows_writes(test_db):
+    patient = create_test_patient(test_db)
+    invoice = create_test_invoice(test_db, patient, create_test_staff(test_db), InvoiceStatus.ISSUED)
+
+    assert numbers(search_invoices(test_db, "202401-0001")) == ["CLINIC-202401-0001"]
+    assert numbers(search_invoices(test_db, "jo do")) == ["CLINIC-202401-0001"]
+    assert search_invoices(test_db, "john nobody") == []
+    assert search_invoices(test_db, "  ") == []
+
+    test_db.add(InvoiceItem(invoice_id=invoice.id, description="Physiotherapy session", quantity=1, unit_price_cents=100))
+    patient.name = "Jane Smith"
+    test_db.commit()
+    assert numbers(search_invoices(test_db, "smith physio")) == ["CLINIC-202401-0001"]
+    assert numbers(search_invoices(test_db, "sess")) == ["CLINIC-202401-0001"]
+    assert search_invoices(test_db, "john") == []
+
+    test_db.query(InvoiceSearchDocument).delete()
+    test_db.commit()
+    rebuild_invoice_summaries(test_db)
+    assert numbers(search_invoices(test_db, "smith physio")) == ["CLINIC-202401-0001"]
+
+
+def test_search_endpoint_ranks_and_pages(client, test_db):
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    staff = create_test_staff(test_db)
+    patient = create_test_patient(test_db)
+    for i, description in enumerate(["Dental cleaning", "Dental filling, dental x-ray", "Eye exam"]):
+        invoice = Invoice(
+            invoice_number=f"CLINIC-SEARCH-{i}", patient_id=patient.id, staff_id=staff.id,
+            total_amount_cents=1000, created_at=datetime(2025, 1, 1) + timedelta(days=i),
+        )
+        invoice.items = [InvoiceItem(description=description, quantity=1, unit_price_cents=1000)]
+        test_db.add(invoice)
+    test_db.commit()
+
+    response = client.get("/api/v1/invoices/search", params={"q": "dent"}, headers=headers)
+    assert response.status_code == 200
+    rows = response.json()
+    # The invoice mentioning "dental" twice ranks first
+    assert [row["invoice_number"] for row in rows] == ["CLINIC-SEARCH-1", "CLINIC-SEARCH-0"]
+    assert rows[0]["rank"] > rows[1]["rank"]
+    assert rows[0]["patient_name"] == "John Doe"
+
+    page = client.get("/api/v1/invoices/search", params={"q": "dent", "limit": 1, "offset": 1}, headers=headers)
+    assert [row["invoice_number"] for row in page.json()] == ["CLINIC-SEARCH-0"]
+    assert client.get("/api/v1/invoices/search", params={"q": ""}, headers=headers).status_code == 422
@@ -0,0 +1,117 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.invoice_summary import InvoiceSummary
+from app.services.invoice_summary import rebuild_invoice_summaries
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff, get_auth_token
+
+
+def summary(db, invoice):
+    db.expire_all()
+    return db.get(InvoiceSummary, invoice.id)
+
+
+def test_summary_follows_invoice_payment_and_patient_writes(client, test_db):
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    patient = create_test_patient(test_db)
+    invoice = create_test_invoice(test_db, patient, create_test_staff(test_db), InvoiceStatus.ISSUED)
+
+    row = summary(test_db, invoice)
+    assert (row.invoice_number, row.patient_name, row.balance_cents, row.status) == (
+        "CLINIC-202401-0001", "John Doe", 16200, InvoiceStatus.ISSUED
+    )
+
+    client.post("/api/v1/payments/", json={"invoice_id": str(invoice.id), "amount_cents": 6200, "currency": "USD"}, headers=headers)
+    row = summary(test_db, invoice)
+    assert (row.paid_cents, row.balance_cents, row.status) == (6200, 10000, InvoiceStatus.PARTIALLY_PAID)
+    assert row.last_payment_at is not None
+
+    client.post("/api/v1/payments/bulk", json={"payments": [
+        {"invoice_id": str(invoice.id), "amount_cents": 10000, "currency": "USD"},
+    ]}, headers=headers)
+    assert summary(test_db, invoice).status == InvoiceStatus.PAID
+
+    patient.name = "Renamed Patient"
+    test_db.commit()
+    assert summary(test_db, invoice).patient_name == "Renamed Patient"
+
+    draft = Invoice(invoice_number="CLINIC-202401-0002", patient_id=patient.id, staff_id=invoice.staff_id, total_amount_cents=100)
+    test_db.add(draft)
+    test_db.commit()
+    assert summary(test_db, draft).balance_cents == 100
+    test_db.delete(draft)
+    test_db.commit()
+    assert summary(test_db, draft) is None
+
+
+def test_summary_list_reads_the_read_model(client, test_db):
+    from datetime import datetime, timedelta
+
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    staff = create_test_staff(test_db)
+    patient = create_test_patient(test_db)
+    for i in range(3):
+        test_db.add(Invoice(
+            invoice_number=f"CLINIC-SUM-{i}", patient_id=patient.id, staff_id=staff.id,
+            total_amount_cents=1000, created_at=datetime(2025, 1, 1) + timedelta(days=i),
+        ))
+    test_db.commit()
+
+    first = client.get("/api/v1/invoices/summary", params={"limit": 2, "outstanding": True}, headers=headers)
+    assert first.status_code == 200
+    rest = client.get("/api/v1/invoices/summary", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=headers)
+    assert [row["invoice_number"] for row in first.json() + rest.json()] == ["CLINIC-SUM-2", "CLINIC-SUM-1", "CLINIC-SUM-0"]
+    assert {(row["patient_name"], row["balance_cents"], row["status"]) for row in rest.json()} == {("John Doe", 1000, "draft")}
+
+    # Writes that bypassed the app are picked up by a rebuild
+    test_db.query(InvoiceSummary).delete()
+    test_db.commit()
+    assert rebuild_invoice_summaries(test_db) == 3
+
+
+def test_summary_list_pages_rows_with_default_timestamps(client, test_db):
+    token = get_auth_token(client, test_db)
+    staff = create_test_staff(test_db)
+    patient = create_test_patient(test_db)
+    for i in range(5):
+        test_db.add(Invoice(invoice_number=f"CLINIC-DEF-{i}", patient_id=patient.id, staff_id=staff.id, total_amount_cents=1000))
+        test_db.commit()
+
+    seen = []
+    params = {"limit": 2}
+    for _ in range(5):
+        response = client.get("/api/v1/invoices/summary", params=params, headers={"Authorization": f"Bearer {token}"})
+        seen.extend(row["invoice_number"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert sorted(seen) == [f"CLINIC-DEF-{i}" for i in range(5)]
+
+
+def test_listeners_load_with_the_models():
+    # Scripts such as create_sample_data.py import only app.models
+    code = (
+        "import sys, app.models; "
+        "from sqlalchemy import event; from sqlalchemy.orm import Session; "
+        "from app.services.invoice_summary import _collect_changes; "
+        "assert event.contains(Session, 'after_flush', _collect_changes)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).resolve().parents[1])
+
+
+def test_payments_list_does_not_depend_on_summary_rows(client, test_db):
+    token = get_auth_token(client, test_db)
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    client.post("/api/v1/payments/", json={"invoice_id": str(invoice.id), "amount_cents": 500, "currency": "USD"},
+                headers={"Authorization": f"Bearer {token}"})
+    test_db.query(InvoiceSummary).delete()
+    test_db.commit()
+
+    payments = client.get("/api/v1/payments/", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [(p["invoice_number"], p["patient_name"]) for p in payments] == [("CLINIC-202401-0001", "John Doe")]
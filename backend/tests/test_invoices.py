@@ -180,6 +180,144 @@ def test_list_invoices(client, test_db):
     assert len(data) == 1
     assert data[0]["patient_id"] == str(patient.id)
 
+def test_list_invoices_cursor_pagination(client, test_db, monkeypatch):
+    """Following X-Next-Cursor walks every invoice once; items are loaded in one query per page."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from app.models.invoice import Invoice, InvoiceItem
+
+    token = get_auth_token(client, test_db)
+    staff = test_db.query(Staff).first()
+    patient = create_test_patient(test_db)
+    start = datetime(2025, 1, 1)
+    for i in range(5):
+        invoice = Invoice(
+            invoice_number=f"CLINIC-PAGE-{i}",
+            patient_id=patient.id,
+            staff_id=staff.id,
+            total_amount_cents=100,
+            # Two invoices share a timestamp so the id tiebreaker is exercised
+            created_at=start + timedelta(days=min(i, 3)),
+        )
+        invoice.items.append(InvoiceItem(description="Visit", unit_price_cents=100))
+        test_db.add(invoice)
+    test_db.commit()
+
+    item_selects = []
+    engine = test_db.get_bind()
+
+    def listener(conn, cursor, statement, *args):
+        if "FROM invoice_items" in statement:
+            item_selects.append(statement)
+
+    seen = []
+    params = {"limit": 2}
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        while True:
+            response = client.get("/api/v1/invoices", params=params, headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200
+            assert all(len(row["items"]) == 1 for row in response.json())
+            seen.extend(row["invoice_number"] for row in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params = {"limit": 2, "cursor": cursor}
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(seen) == 5
+    assert set(seen) == {f"CLINIC-PAGE-{i}" for i in range(5)}
+    assert seen[-1] == "CLINIC-PAGE-0"
+    assert len(item_selects) == 3
+
+    summary = client.get("/api/v1/invoices", params={"include_items": "false"}, headers={"Authorization": f"Bearer {token}"})
+    assert summary.status_code == 200
+    assert [row["items"] for row in summary.json()] == [None] * 5
+
+    # Without limit or cursor the whole list comes back, as the frontend expects
+    from app.api.api_v1.endpoints import invoices as invoices_endpoint
+    monkeypatch.setattr(invoices_endpoint, "DEFAULT_PAGE_SIZE", 2)
+    everything = client.get("/api/v1/invoices", headers={"Authorization": f"Bearer {token}"})
+    assert len(everything.json()) == 5
+    assert "X-Next-Cursor" not in everything.headers
+    first = everything.json()[1]
+    # A cursor alone pages at the default size
+    import uuid
+    from app.core.pagination import encode_cursor
+    after = encode_cursor(datetime.fromisoformat(first["created_at"]), uuid.UUID(first["id"]))
+    page = client.get("/api/v1/invoices", params={"cursor": after}, headers={"Authorization": f"Bearer {token}"})
+    assert len(page.json()) == 2
+    assert page.headers.get("X-Next-Cursor")
+
+    bad = client.get("/api/v1/invoices", params={"cursor": "not-a-cursor"}, headers={"Authorization": f"Bearer {token}"})
+    assert bad.status_code == 400
+
+def test_list_invoices_cursor_pagination_with_default_timestamps(client, test_db):
+    """Invoices created through the API (no explicit created_at) page through once."""
+    token = get_auth_token(client, test_db)
+    patient = create_test_patient(test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    created = [
+        client.post("/api/v1/invoices", json={
+            "patient_id": str(patient.id), "currency": "USD",
+            "items": [{"description": "Visit", "quantity": 1, "unit_price_cents": 100, "tax_cents": 0}],
+        }, headers=headers).json()["id"]
+        for _ in range(5)
+    ]
+
+    seen = []
+    params = {"limit": 2}
+    for _ in range(5):
+        response = client.get("/api/v1/invoices", params=params, headers=headers)
+        seen.extend(row["id"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert sorted(seen) == sorted(created)
+
+def test_create_invoices_bulk(client, test_db):
+    """A billing batch is created in one call with per-entry errors and one block of numbers."""
+    from app.models.invoice import Invoice, InvoiceItem
+
+    token = get_auth_token(client, test_db)
+    patient = create_test_patient(test_db)
+    item = {"description": "Room charge", "quantity": 3, "unit_price_cents": 10000, "tax_cents": 500}
+    batch = {"invoices": [
+        {"patient_id": str(patient.id), "items": [item, {"description": "Meals", "unit_price_cents": 2500}]},
+        {"patient_id": "123e4567-e89b-12d3-a456-426614174000", "items": [item]},
+        {"patient_id": str(patient.id), "items": []},
+        {"patient_id": str(patient.id), "due_date": "2026-11-30", "items": [item]},
+    ]}
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rejected = client.post("/api/v1/invoices/bulk", json={**batch, "all_or_nothing": True}, headers=headers)
+    assert rejected.status_code == 200
+    assert [r["status"] for r in rejected.json()["results"]] == ["skipped", "failed", "failed", "skipped"]
+    assert test_db.query(Invoice).count() == 0
+
+    response = client.post("/api/v1/invoices/bulk", json=batch, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["total"], data["created"], data["failed"]) == (4, 2, 2)
+    assert [r.get("error") for r in data["results"]] == [None, "Patient not found", "Invoice has no items", None]
+    assert data["results"][0]["total_amount_cents"] == 33000
+    first, last = data["results"][0]["invoice_number"], data["results"][3]["invoice_number"]
+    assert int(last.rsplit("-", 1)[1]) == int(first.rsplit("-", 1)[1]) + 1
+
+    assert test_db.query(InvoiceItem).count() == 3
+    listed = client.get("/api/v1/invoices", params={"patient_id": str(patient.id)}, headers=headers).json()
+    assert {row["invoice_number"]: row["balance_cents"] for row in listed} == {first: 33000, last: 30500}
+
+    # The batch shares one created_at; the cursor still walks it row by row
+    assert len({row["created_at"] for row in listed}) == 1
+    page = client.get("/api/v1/invoices", params={"limit": 1}, headers=headers)
+    rest = client.get("/api/v1/invoices", params={"limit": 1, "cursor": page.headers["X-Next-Cursor"]}, headers=headers)
+    assert {page.json()[0]["invoice_number"], rest.json()[0]["invoice_number"]} == {first, last}
+    assert "X-Next-Cursor" not in rest.headers
+
 def test_issue_invoice(client, test_db):
     """Test issuing an invoice."""
     token = get_auth_token(client, test_db)
@@ -50,3 +50,37 @@ def test_manual_payment_by_invoice_number(client, test_db):
     resp = client.post('/api/v1/payments', json=payload, headers={"Authorization": f"Bearer {token}"})
     print('STATUS', resp.status_code, resp.text)
     assert resp.status_code == 201, resp.text
+    assert resp.json()["raw_event"] == {"method": "cash", "note": None}
+
+
+def test_raw_event_is_stored_compressed_outside_payments(test_db):
+    from sqlalchemy import inspect
+    from app.models.payment import PaymentRawEvent, PaymentStatus
+
+    staff = Staff(email='raw@clinic.com', name='Raw', password_hash=get_password_hash('x'), role=StaffRole.ADMIN)
+    patient = Patient(name='Bob', email='bob@example.com')
+    test_db.add_all([staff, patient])
+    test_db.commit()
+    inv = Invoice(patient_id=patient.id, staff_id=staff.id, invoice_number='CLINIC-202510-0002',
+                  currency='USD', total_amount_cents=1000, status=InvoiceStatus.ISSUED)
+    test_db.add(inv)
+    test_db.commit()
+
+    event = {"type": "checkout.session.completed", "data": {"object": {"metadata": {"note": "x" * 2000}}}}
+    payment = Payment(invoice_id=inv.id, stripe_payment_id="pi_raw", amount_cents=1000, currency="USD",
+                      status=PaymentStatus.SUCCEEDED, raw_event=event)
+    test_db.add(payment)
+    test_db.commit()
+
+    assert "raw_event" not in inspect(Payment).columns
+    record = test_db.get(PaymentRawEvent, payment.id)
+    assert record.size_bytes > len(record.data)
+
+    test_db.expunge_all()
+    loaded = test_db.query(Payment).filter(Payment.stripe_payment_id == "pi_raw").one()
+    assert "raw_event_record" not in loaded.__dict__
+    assert loaded.raw_event == event
+
+    loaded.raw_event = None
+    test_db.commit()
+    assert test_db.get(PaymentRawEvent, payment.id) is None
@@ -0,0 +1,83 @@
+from datetime import date
+
+from app.models.audit_log import AuditLog
+from app.models.etl_status import ETLProcessStatus
+from app.models.invoice import Invoice, InvoiceStatus
+from app.services.overdue_invoices import OVERDUE_ACTION, PROCESS_NAME, scan_overdue_invoices
+from tests.test_payments import create_test_patient, create_test_staff
+
+
+def test_scan_flags_open_past_due_invoices_once(test_db):
+    patient = create_test_patient(test_db)
+    staff = create_test_staff(test_db)
+    cases = {
+        "issued-late": (InvoiceStatus.ISSUED, date(2025, 1, 10)),
+        "partial-late": (InvoiceStatus.PARTIALLY_PAID, date(2025, 1, 5)),
+        "issued-late-2": (InvoiceStatus.ISSUED, date(2025, 1, 12)),
+        "issued-due-today": (InvoiceStatus.ISSUED, date(2025, 2, 1)),
+        "paid-late": (InvoiceStatus.PAID, date(2025, 1, 10)),
+        "draft-late": (InvoiceStatus.DRAFT, date(2025, 1, 10)),
+        "issued-no-due-date": (InvoiceStatus.ISSUED, None),
+    }
+    for number, (status, due_date) in cases.items():
+        test_db.add(Invoice(
+            invoice_number=number, patient_id=patient.id, staff_id=staff.id,
+            total_amount_cents=1000, status=status, due_date=due_date,
+        ))
+    test_db.commit()
+
+    result = scan_overdue_invoices(test_db, today=date(2025, 2, 1), batch_size=2)
+
+    assert (result.scanned, result.flagged, result.batches) == (3, 3, 2)
+    test_db.expire_all()
+    flagged = {inv.invoice_number for inv in test_db.query(Invoice).filter(Invoice.overdue_at.isnot(None))}
+    assert flagged == {"issued-late", "partial-late", "issued-late-2"}
+
+    events = test_db.query(AuditLog).filter(AuditLog.action == OVERDUE_ACTION).all()
+    assert sorted(event.details["invoice_number"] for event in events) == ["issued-late", "issued-late-2", "partial-late"]
+    assert {event.details["days_overdue"] for event in events} == {20, 22, 27}
+
+    run = test_db.query(ETLProcessStatus).filter(ETLProcessStatus.process_name == PROCESS_NAME).one()
+    assert (run.status, run.records_processed) == ("completed", 3)
+
+    # Already flagged invoices are left alone by the next run
+    again = scan_overdue_invoices(test_db, today=date(2025, 2, 1), batch_size=2)
+    assert (again.scanned, again.flagged) == (0, 0)
+    assert test_db.query(AuditLog).filter(AuditLog.action == OVERDUE_ACTION).count() == 3
+
+
+def test_overdue_flag_follows_payments_cancellation_and_due_date(client, test_db):
+    from app.models.invoice_summary import InvoiceSummary
+    from tests.test_payments import get_auth_token
+
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    patient = create_test_patient(test_db)
+    staff = create_test_staff(test_db)
+    invoices = {}
+    for number in ("paid-off", "part-paid", "cancelled", "re-dated"):
+        invoices[number] = Invoice(
+            invoice_number=number, patient_id=patient.id, staff_id=staff.id,
+            total_amount_cents=1000, status=InvoiceStatus.ISSUED, due_date=date(2025, 1, 10),
+        )
+        test_db.add(invoices[number])
+    test_db.commit()
+    scan_overdue_invoices(test_db, today=date(2025, 2, 1))
+
+    overdue = client.get("/api/v1/invoices/summary", params={"overdue": True}, headers=headers).json()
+    assert {row["invoice_number"] for row in overdue} == set(invoices)
+    assert all(row["overdue_at"] for row in overdue)
+
+    for number, amount in (("paid-off", 1000), ("part-paid", 400)):
+        client.post("/api/v1/payments/", json={"invoice_id": str(invoices[number].id), "amount_cents": amount, "currency": "USD"}, headers=headers)
+    client.post(f"/api/v1/invoices/{invoices['cancelled'].id}/cancel", headers=headers)
+    redated = test_db.get(Invoice, invoices["re-dated"].id)
+    redated.due_date = date(2025, 3, 1)
+    test_db.commit()
+
+    test_db.expire_all()
+    still = {inv.invoice_number for inv in test_db.query(Invoice).filter(Invoice.overdue_at.isnot(None))}
+    assert still == {"part-paid"}
+    assert {row.invoice_number for row in test_db.query(InvoiceSummary).filter(InvoiceSummary.overdue_at.isnot(None))} == {"part-paid"}
+    overdue = client.get("/api/v1/invoices/summary", params={"overdue": True}, headers=headers).json()
+    assert [row["invoice_number"] for row in overdue] == ["part-paid"]
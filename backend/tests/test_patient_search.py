@@ -0,0 +1,69 @@
+from app.models.patient import Patient, patient_search_text
+from app.services.patient_search import search_patients, search_terms
+from tests.test_payments import get_auth_token
+
+
+def names(results):
+    return [patient.name for patient, _ in results]
+
+
+def test_search_text_is_normalized_and_maintained(test_db):
+    assert patient_search_text("José O'Brien", "J.OBrien@Example.com", "+1 (555) 010-0199") == (
+        "jose o brien j obrien example com 15550100199"
+    )
+    assert search_terms("555-010") == ["555010"]
+    assert search_terms("  Renée  Smith ") == ["renee", "smith"]
+
+    patient = Patient(name="Renée Smith", email="renee@example.com", phone="555-0100")
+    test_db.add(patient)
+    test_db.commit()
+    assert names(search_patients(test_db, "rene smi")) == ["Renée Smith"]
+    assert names(search_patients(test_db, "5550100")) == ["Renée Smith"]
+
+    patient.email = "rsmith@clinic.org"
+    test_db.commit()
+    assert names(search_patients(test_db, "clinic.org")) == ["Renée Smith"]
+    assert search_patients(test_db, "example") == []
+
+    test_db.delete(patient)
+    test_db.commit()
+    assert search_patients(test_db, "smith") == []
+
+
+def test_search_ranks_limits_and_handles_short_terms(test_db):
+    for name, email in [
+        ("Anna Lee", "anna@example.com"),
+        ("Annabel Leeds", "annabel@example.com"),
+        ("Li Wei", "li.wei@example.com"),
+        ("Hannah Annand", "hannah@example.com"),
+    ]:
+        test_db.add(Patient(name=name, email=email))
+    test_db.commit()
+
+    results = search_patients(test_db, "anna")
+    assert set(names(results)) == {"Anna Lee", "Annabel Leeds", "Hannah Annand"}
+    assert results[0][1] >= results[-1][1]
+    # The shorter, closer match ranks first
+    assert names(search_patients(test_db, "anna lee")) == ["Anna Lee", "Annabel Leeds"]
+    assert len(search_patients(test_db, "anna", limit=2)) == 2
+    assert names(search_patients(test_db, "anna", limit=2, offset=2)) == names(results)[2:]
+
+    # Short words narrow indexed matches, or match word prefixes on their own
+    assert set(names(search_patients(test_db, "ann ab"))) == {"Annabel Leeds"}
+    assert names(search_patients(test_db, "li")) == ["Li Wei"]
+    assert search_patients(test_db, "!!") == []
+
+
+def test_search_endpoint_is_paginated(client, test_db):
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(5):
+        test_db.add(Patient(name=f"Morgan Patient {i}"))
+    test_db.commit()
+
+    page = client.get("/api/v1/patients", params={"query": "morgan", "limit": 3}, headers=headers)
+    assert page.status_code == 200
+    assert len(page.json()) == 3
+    rest = client.get("/api/v1/patients", params={"query": "morgan", "limit": 3, "offset": 3}, headers=headers)
+    assert len(rest.json()) == 2
+    assert {p["name"] for p in page.json() + rest.json()} == {f"Morgan Patient {i}" for i in range(5)}
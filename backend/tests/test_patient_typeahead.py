@@ -0,0 +1,126 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.patient import Patient
+from app.services.patient_typeahead import PatientTypeahead, patient_typeahead
+from tests.test_payments import get_auth_token
+
+
+def names(suggestions):
+    return [name for _, name, _, _ in suggestions]
+
+
+def test_prefix_index_matches_names_emails_and_phones(test_db):
+    for name, email, phone in [
+        ("Anna Lee", "anna.lee@example.com", "+1 555-0100"),
+        ("Annabel Leeds", "annabel@example.com", None),
+        ("Li Wei", "wei@clinic.org", "555-0199"),
+        ("José Anna", None, None),
+    ]:
+        test_db.add(Patient(name=name, email=email, phone=phone))
+    test_db.commit()
+    index = PatientTypeahead(max_patients=10)
+    assert index.suggest("anna") is None
+
+    assert index.build(test_db)
+    # Exact words come before longer completions
+    assert names(index.suggest("anna")) == ["Anna Lee", "José Anna", "Annabel Leeds"]
+    assert names(index.suggest("anna le")) == ["Anna Lee", "Annabel Leeds"]
+    assert names(index.suggest("jose")) == ["José Anna"]
+    assert names(index.suggest("anna.lee@ex")) == ["Anna Lee"]
+    assert names(index.suggest("555-01")) == ["Li Wei"]
+    assert names(index.suggest("1555")) == ["Anna Lee"]
+    assert names(index.suggest("anna", limit=1)) == ["Anna Lee"]
+    assert index.suggest("zz") == []
+
+    li = test_db.query(Patient).filter(Patient.name == "Li Wei").one()
+    index.add([SimpleNamespace(id=li.id, name="Lia Wong", email=None, phone=None)])
+    assert names(index.suggest("li")) == ["Lia Wong"]
+    assert index.suggest("wei") == []
+    index.remove([li.id])
+    assert index.suggest("lia") == []
+    assert len(index) == 3
+
+
+def test_index_drops_itself_past_its_bound(test_db):
+    for i in range(3):
+        test_db.add(Patient(name=f"Patient {i}"))
+    test_db.commit()
+
+    assert not PatientTypeahead(max_patients=2).build(test_db)
+
+    index = PatientTypeahead(max_patients=3)
+    assert index.build(test_db)
+    index.add([SimpleNamespace(id=uuid.uuid4(), name="One Too Many", email=None, phone=None)])
+    assert index.suggest("patient") is None
+
+
+def test_writes_during_a_build_survive_the_swap(test_db):
+    from sqlalchemy import event
+
+    kept = Patient(name="Kept Patient")
+    gone = Patient(name="Gone Patient")
+    test_db.add_all([kept, gone])
+    test_db.commit()
+    index = PatientTypeahead(max_patients=10)
+    assert index.build(test_db)
+    new_id = uuid.uuid4()
+
+    def write_while_reading(conn, cursor, statement, *args):
+        # Front-desk writes that land after the rebuild took its snapshot
+        if "FROM patients" in statement and not fired:
+            fired.append(True)
+            index.add([SimpleNamespace(id=new_id, name="Walk In", email=None, phone=None)])
+            index.remove([gone.id])
+
+    fired = []
+    engine = test_db.get_bind()
+    event.listen(engine, "after_cursor_execute", write_while_reading)
+    try:
+        assert index.build(test_db)
+    finally:
+        event.remove(engine, "after_cursor_execute", write_while_reading)
+
+    assert fired
+    assert names(index.suggest("walk")) == ["Walk In"]
+    assert index.suggest("gone") == []
+    assert names(index.suggest("kept")) == ["Kept Patient"]
+    assert not index._journal
+
+
+@pytest.fixture
+def typeahead(test_db):
+    patient_typeahead.max_patients = 100
+    patient_typeahead.build(test_db)
+    yield patient_typeahead
+    patient_typeahead._drop("test finished")
+    patient_typeahead.max_patients = 0
+
+
+def test_suggest_endpoint_follows_patient_writes(client, test_db, typeahead):
+    token = get_auth_token(client, test_db)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    created = client.post("/api/v1/patients/", json={"name": "Morgan Quinn", "email": "mq@example.com"}, headers=headers).json()
+    response = client.get("/api/v1/patients/suggest", params={"q": "morg"}, headers=headers)
+    assert response.headers["X-Suggest-Source"] == "memory"
+    assert response.json() == [{"id": created["id"], "name": "Morgan Quinn", "email": "mq@example.com", "phone": None}]
+
+    client.put(f"/api/v1/patients/{created['id']}", json={"name": "Morgana Quinn"}, headers=headers)
+    assert [p["name"] for p in client.get("/api/v1/patients/suggest", params={"q": "morgana"}, headers=headers).json()] == ["Morgana Quinn"]
+
+    client.delete(f"/api/v1/patients/{created['id']}", headers=headers)
+    assert client.get("/api/v1/patients/suggest", params={"q": "morg"}, headers=headers).json() == []
+
+
+def test_suggest_falls_back_to_the_database(client, test_db):
+    token = get_auth_token(client, test_db)
+    test_db.add(Patient(name="Riley Stone"))
+    test_db.commit()
+
+    response = client.get("/api/v1/patients/suggest", params={"q": "stone"}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.headers["X-Suggest-Source"] == "database"
+    assert [p["name"] for p in response.json()] == ["Riley Stone"]
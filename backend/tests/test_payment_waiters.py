@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+from app.models.invoice import InvoiceStatus
+from app.services.payment_waiters import PaymentWaiters, payment_waiters
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff
+
+
+def test_waiter_is_woken_from_another_thread():
+    waiters = PaymentWaiters()
+
+    async def wait():
+        future = waiters.register(["inv-1", "cs_1"])
+        assert waiters.waiting() == 2
+        threading.Timer(0.05, waiters.notify, args=(None, "cs_1")).start()
+        try:
+            return await asyncio.wait_for(future, 5)
+        finally:
+            waiters.unregister(["inv-1", "cs_1"], future)
+
+    assert asyncio.run(wait()) is True
+    assert waiters.waiting() == 0
+    assert waiters.notify("inv-1") == 0
+
+
+def test_wait_for_payment_answers_paid_pending_and_wakes(client, test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    invoice.stripe_checkout_session_id = "local_cs_1"
+    test_db.commit()
+
+    assert client.get("/api/v1/payments/wait").status_code == 400
+    assert client.get("/api/v1/payments/wait", params={"session_id": "nope", "timeout": 0}).status_code == 404
+    pending = client.get("/api/v1/payments/wait", params={"session_id": "local_cs_1", "timeout": 0})
+    assert pending.status_code == 200
+    assert pending.json()["status"] == "pending"
+
+    # A parked request answers as soon as the payment is recorded, not at its timeout
+    result = {}
+
+    def long_poll():
+        started = time.monotonic()
+        result["response"] = client.get("/api/v1/payments/wait", params={"session_id": "local_cs_1", "timeout": 20})
+        result["elapsed"] = time.monotonic() - started
+
+    poller = threading.Thread(target=long_poll)
+    poller.start()
+    deadline = time.monotonic() + 5
+    while payment_waiters.waiting() < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert payment_waiters.waiting() == 2
+
+    invoice.status = InvoiceStatus.PAID
+    invoice.paid_cents, invoice.balance_cents = 16200, 0
+    test_db.commit()
+    payment_waiters.notify(invoice.id)
+    poller.join(10)
+
+    assert result["response"].json()["status"] == "paid"
+    assert result["response"].json()["amount_paid"] == 162.0
+    assert result["elapsed"] < 10
+    assert payment_waiters.waiting() == 0
+
+
+def test_local_checkout_notifies_waiters(client, test_db, monkeypatch):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    invoice.stripe_checkout_session_id = "local_cs_2"
+    test_db.commit()
+    notified = []
+    monkeypatch.setattr(payment_waiters, "notify", lambda *keys: notified.append(keys))
+
+    response = client.post("/api/v1/payments/local-checkout/local_cs_2/start", follow_redirects=False)
+
+    assert response.status_code == 303
+    assert notified == [(invoice.id, "local_cs_2")]
+    paid = client.get("/api/v1/payments/wait", params={"invoice_id": str(invoice.id), "timeout": 0}).json()
+    assert paid["status"] == "paid"
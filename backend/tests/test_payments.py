@@ -1,6 +1,10 @@
+import hashlib
+import hmac
+import json
+import time
 import pytest
-from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
+from app.core.config import settings
 from app.models.staff import Staff, StaffRole
 from app.models.patient import Patient
 from app.models.invoice import Invoice, InvoiceStatus
@@ -51,6 +55,15 @@ def create_test_invoice(test_db, patient, staff, status=InvoiceStatus.DRAFT):
     test_db.refresh(invoice)
     return invoice
 
+def signed_webhook(event):
+    """Serialize ``event`` and sign it the way Stripe signs webhook deliveries."""
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(
+        settings.STRIPE_WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return payload, {"stripe-signature": f"t={timestamp},v1={signature}", "content-type": "application/json"}
+
 def get_auth_token(client, test_db):
     """Helper function to get authentication token."""
     create_test_staff(test_db)
@@ -62,20 +75,13 @@ def get_auth_token(client, test_db):
     
     return response.json()["access_token"]
 
-@patch('app.api.api_v1.endpoints.payments.stripe')
-def test_create_payment_link(mock_stripe, client, test_db):
+def test_create_payment_link(client, test_db, stripe_gateway):
     """Test creating a Stripe payment link."""
     token = get_auth_token(client, test_db)
     staff = create_test_staff(test_db)
     patient = create_test_patient(test_db)
     invoice = create_test_invoice(test_db, patient, staff, InvoiceStatus.ISSUED)
     
-    # Mock Stripe response
-    mock_session = MagicMock()
-    mock_session.id = "cs_test_123"
-    mock_session.url = "https://checkout.stripe.com/test"
-    mock_stripe.checkout.Session.create.return_value = mock_session
-    
     response = client.post(
         f"/api/v1/payments/invoices/{invoice.id}/create-payment-link",
         headers={"Authorization": f"Bearer {token}"}
@@ -85,7 +91,26 @@ def test_create_payment_link(mock_stripe, client, test_db):
     data = response.json()
     assert "checkout_url" in data
     assert "session_id" in data
-    assert data["session_id"] == "cs_test_123"
+    assert data["session_id"] in stripe_gateway.sessions
+    assert data["checkout_url"].endswith(f"/payments/local-checkout/{data['session_id']}")
+
+    # The stored session is still valid, so asking again does not call Stripe
+    again = client.post(
+        f"/api/v1/payments/invoices/{invoice.id}/create-payment-link",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert again.json() == data
+    assert stripe_gateway.calls == 1
+
+    # A changed amount needs a new session
+    invoice.total_amount_cents = 20000
+    test_db.commit()
+    changed = client.post(
+        f"/api/v1/payments/invoices/{invoice.id}/create-payment-link",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert changed.json()["session_id"] != data["session_id"]
+    assert stripe_gateway.calls == 2
 
 def test_create_payment_link_draft_invoice(client, test_db):
     """Test creating payment link for draft invoice (should fail)."""
@@ -118,8 +143,122 @@ def test_get_invoice_payments(client, test_db):
     data = response.json()
     assert isinstance(data, list)
 
-@patch('app.api.api_v1.endpoints.payments.stripe')
-def test_refund_payment(mock_stripe, client, test_db):
+def test_list_payments_cursor_pagination(client, test_db):
+    """Following X-Next-Cursor walks every payment exactly once, newest first."""
+    from datetime import datetime, timedelta
+    from app.models.payment import Payment, PaymentStatus
+
+    token = get_auth_token(client, test_db)
+    staff = create_test_staff(test_db)
+    patient = create_test_patient(test_db)
+    invoice = create_test_invoice(test_db, patient, staff, InvoiceStatus.ISSUED)
+    start = datetime(2025, 1, 1)
+    for i in range(5):
+        test_db.add(Payment(
+            invoice_id=invoice.id,
+            stripe_payment_id=f"manual_page_{i}",
+            amount_cents=100,
+            currency="USD",
+            status=PaymentStatus.SUCCEEDED,
+            # Two payments share a timestamp so the id tiebreaker is exercised
+            received_at=start + timedelta(days=min(i, 3)),
+        ))
+    test_db.commit()
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/api/v1/payments/", params=params, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        seen.extend(p["stripe_payment_id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert len(seen) == 5
+    assert set(seen) == {f"manual_page_{i}" for i in range(5)}
+    assert seen[-1] == "manual_page_0"
+
+    bad = client.get("/api/v1/payments/", params={"cursor": "not-a-cursor"}, headers={"Authorization": f"Bearer {token}"})
+    assert bad.status_code == 400
+
+def test_list_payments_cursor_pagination_with_default_timestamps(client, test_db):
+    """Payments stamped by the column default page through once, even within one second."""
+    from app.models.payment import Payment, PaymentStatus
+
+    token = get_auth_token(client, test_db)
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db), InvoiceStatus.ISSUED)
+    for i in range(5):
+        test_db.add(Payment(
+            invoice_id=invoice.id, stripe_payment_id=f"default_page_{i}", amount_cents=100,
+            currency="USD", status=PaymentStatus.SUCCEEDED,
+        ))
+        test_db.commit()
+
+    seen = []
+    params = {"limit": 2}
+    for _ in range(5):
+        response = client.get("/api/v1/payments/", params=params, headers={"Authorization": f"Bearer {token}"})
+        seen.extend(p["stripe_payment_id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert sorted(seen) == [f"default_page_{i}" for i in range(5)]
+
+def test_create_payments_bulk(client, test_db):
+    """A cash batch is posted in one call with per-row errors and set-based invoice updates."""
+    from app.models.audit_log import AuditLog
+    from app.models.payment import Payment
+
+    token = get_auth_token(client, test_db)
+    staff = create_test_staff(test_db)
+    patient = create_test_patient(test_db)
+    invoice = create_test_invoice(test_db, patient, staff, InvoiceStatus.ISSUED)
+    other = Invoice(
+        invoice_number="CLINIC-202401-0002", patient_id=patient.id, staff_id=staff.id,
+        currency="USD", total_amount_cents=5000, status=InvoiceStatus.ISSUED
+    )
+    cancelled = Invoice(
+        invoice_number="CLINIC-202401-0003", patient_id=patient.id, staff_id=staff.id,
+        currency="USD", total_amount_cents=5000, status=InvoiceStatus.CANCELLED
+    )
+    test_db.add_all([other, cancelled])
+    test_db.commit()
+
+    batch = {"payments": [
+        {"invoice_id": str(invoice.id), "amount_cents": 10000, "currency": "usd", "received_at": "2025-01-02T10:00:00"},
+        {"invoice_id": "CLINIC-202401-0001", "amount_cents": 6200, "currency": "USD", "received_at": "2025-01-02T17:00:00"},
+        {"invoice_id": "CLINIC-202401-0002", "amount_cents": 2000, "currency": "USD", "method": "cheque"},
+        {"invoice_id": "CLINIC-202401-0003", "amount_cents": 100, "currency": "USD"},
+        {"invoice_id": "CLINIC-209901-9999", "amount_cents": 100, "currency": "USD"},
+        {"invoice_id": str(invoice.id), "amount_cents": 100, "currency": "EUR"},
+    ]}
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rejected = client.post("/api/v1/payments/bulk", json={**batch, "all_or_nothing": True}, headers=headers)
+    assert rejected.status_code == 200
+    assert rejected.json()["created"] == 0
+    assert test_db.query(Payment).count() == 0
+
+    response = client.post("/api/v1/payments/bulk", json=batch, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["total"], data["created"], data["failed"]) == (6, 3, 3)
+    assert [r["status"] for r in data["results"]] == ["created", "created", "created", "failed", "failed", "failed"]
+    assert data["results"][3]["error"] == "Cannot add payment to cancelled invoice"
+    assert data["results"][4]["error"] == "Invoice not found"
+    statuses = {i["invoice_number"]: (i["status"], i["balance_cents"]) for i in data["invoices"]}
+    assert statuses == {"CLINIC-202401-0001": ("paid", 0), "CLINIC-202401-0002": ("partially_paid", 3000)}
+
+    test_db.expire_all()
+    assert test_db.get(Invoice, invoice.id).last_payment_at.hour == 17
+    assert test_db.query(Payment).count() == 3
+    assert test_db.query(AuditLog).filter(AuditLog.action == "create_payment").count() == 3
+
+def test_refund_payment(client, test_db, stripe_gateway):
     """Test processing a payment refund."""
     # Create admin staff for refund
     admin_staff = Staff(
@@ -143,12 +282,6 @@ def test_refund_payment(mock_stripe, client, test_db):
     patient = create_test_patient(test_db)
     invoice = create_test_invoice(test_db, patient, admin_staff)
     
-    # Mock Stripe refund response
-    mock_refund = MagicMock()
-    mock_refund.id = "re_test_123"
-    mock_refund.amount = 16200
-    mock_stripe.Refund.create.return_value = mock_refund
-    
     # Create a mock payment
     from app.models.payment import Payment, PaymentStatus
     payment = Payment(
@@ -169,7 +302,8 @@ def test_refund_payment(mock_stripe, client, test_db):
     
     assert response.status_code == 200
     data = response.json()
-    assert data["refund_id"] == "re_test_123"
+    assert data["refund_id"] in stripe_gateway.refunds
+    assert data["amount"] == 16200
     assert data["status"] == "refunded"
 
 def test_refund_payment_insufficient_permissions(client, test_db):
@@ -200,8 +334,7 @@ def test_refund_payment_insufficient_permissions(client, test_db):
     assert response.status_code == 403
     assert "Insufficient permissions" in response.json()["detail"]
 
-@patch('app.api.api_v1.endpoints.payments.stripe')
-def test_stripe_webhook_checkout_completed(mock_stripe, client, test_db):
+def test_stripe_webhook_checkout_completed(client, test_db):
     """Test Stripe webhook for completed checkout."""
     # Create test data
     staff = create_test_staff(test_db)
@@ -224,55 +357,62 @@ def test_stripe_webhook_checkout_completed(mock_stripe, client, test_db):
         }
     }
     
-    # Mock Stripe webhook verification
-    mock_stripe.Webhook.construct_event.return_value = mock_event
-    
-    response = client.post(
-        "/api/v1/payments/webhooks/stripe",
-        json=mock_event,
-        headers={"stripe-signature": "test_signature"}
-    )
+    payload, headers = signed_webhook(mock_event)
+    response = client.post("/api/v1/payments/webhooks/stripe", content=payload, headers=headers)
     
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "success"
 
+    # The delivery is stored for the inbox workers rather than applied inline
+    from app.models.inbound_event import InboundEvent, InboundEventStatus
+    stored = test_db.query(InboundEvent).all()
+    assert len(stored) == 1
+    assert stored[0].status == InboundEventStatus.PENDING
+    assert stored[0].ordering_key == str(invoice.id)
+
+    forged = client.post(
+        "/api/v1/payments/webhooks/stripe",
+        content=payload,
+        headers={**headers, "stripe-signature": "t=1,v1=deadbeef"}
+    )
+    assert forged.status_code == 400
 
-@patch('app.api.api_v1.endpoints.payments.stripe')
-def test_send_payment_link_and_webhook_creates_payment(mock_stripe, client, test_db):
+
+def test_send_payment_link_and_webhook_creates_payment(client, test_db, stripe_gateway):
     """End-to-end: staff sends payment link, Stripe completes checkout, webhook creates Payment and marks invoice PAID."""
     # Create test data
     staff = create_test_staff(test_db)
     patient = create_test_patient(test_db)
     invoice = create_test_invoice(test_db, patient, staff, InvoiceStatus.ISSUED)
 
-    # Mock checkout session creation
-    mock_session = MagicMock()
-    mock_session.id = "cs_test_abc"
-    mock_session.url = "https://checkout.stripe.com/test"
-    mock_session.payment_intent = "pi_e2e_123"
-    mock_session.amount_total = invoice.total_amount_cents
-    mock_session.currency = invoice.currency.lower()
-    mock_stripe.checkout.Session.create.return_value = mock_session
-
     # Login and send payment link
     token = get_auth_token(client, test_db)
     resp = client.post(f"/api/v1/payments/invoices/{invoice.id}/send-payment-link", headers={"Authorization": f"Bearer {token}"})
     assert resp.status_code == 200
     data = resp.json()
-    assert data["session_id"] == "cs_test_abc"
+    session_id = data["session_id"]
+    assert session_id in stripe_gateway.sessions
+    assert data["email_status"] == "pending"
+
+    # The email is queued for the outbox workers rather than sent in the request
+    from app.models.outbox_email import OutboxEmail
+    queued = test_db.query(OutboxEmail).one()
+    assert queued.related_id == str(invoice.id)
+    assert stripe_gateway.sessions[session_id].url in queued.body
 
     # Ensure invoice was updated with session id
     from app.db.session import get_db as _get_db
     inv = test_db.query(Invoice).filter(Invoice.id == invoice.id).first()
-    assert inv.stripe_checkout_session_id == "cs_test_abc"
+    assert inv.stripe_checkout_session_id == session_id
+    assert inv.stripe_checkout_amount_cents == invoice.total_amount_cents
 
     # Simulate Stripe webhook for checkout.session.completed
     mock_event = {
         "type": "checkout.session.completed",
         "data": {
             "object": {
-                "id": "cs_test_abc",
+                "id": session_id,
                 "payment_intent": "pi_e2e_123",
                 "amount_total": invoice.total_amount_cents,
                 "currency": invoice.currency.lower(),
@@ -282,12 +422,15 @@ def test_send_payment_link_and_webhook_creates_payment(mock_stripe, client, test
             }
         }
     }
-    mock_stripe.Webhook.construct_event.return_value = mock_event
-
-    wh_resp = client.post("/api/v1/payments/webhooks/stripe", json=mock_event, headers={"stripe-signature": "test_sig"})
+    payload, headers = signed_webhook(mock_event)
+    wh_resp = client.post("/api/v1/payments/webhooks/stripe", content=payload, headers=headers)
     assert wh_resp.status_code == 200
     assert wh_resp.json()["status"] == "success"
 
+    # Apply the stored event the way the background inbox workers would
+    from app.services.webhook_inbox import webhook_inbox
+    assert webhook_inbox.drain(test_db) == 1
+
     # Verify Payment record exists and invoice marked PAID
     from app.models.payment import Payment
     payment = test_db.query(Payment).filter(Payment.stripe_payment_id == "pi_e2e_123").first()
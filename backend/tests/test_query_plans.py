@@ -0,0 +1,405 @@
+"""
+Query plan regression tests for report and ETL queries.
+
+Each case runs a ReportService/ETLService call against a seeded database,
+captures every statement it executes and asks the database for its plan
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN (FORMAT JSON) on Postgres). A case
+fails when a large table is read with a full scan that the case does not
+explicitly allow, or when an index the query depends on is not used.
+
+SQLite always runs. Set TEST_POSTGRES_URL to an empty scratch database to
+run the same cases against Postgres.
+"""
+
+import os
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.api.api_v1.endpoints.invoices import list_invoice_summaries, list_invoices
+from app.api.api_v1.endpoints.payments import list_payments
+from app.core.pagination import encode_cursor
+from app.db.session import Base
+from app.models.invoice import Invoice, InvoiceItem, InvoiceStatus
+from app.models.patient import Patient, patient_search_text
+from app.models.payment import Payment, PaymentStatus
+from app.models.reporting import revenue_metrics, patient_payment_history, outstanding_payments
+from app.models.staff import Staff, StaffRole
+from app.services.etl_service import ETLService
+from app.services.invoice_search import search_invoices
+from app.services.invoice_summary import rebuild_invoice_summaries
+from app.services.overdue_invoices import scan_overdue_invoices
+from app.services.patient_import import _ChunkWriter
+from app.services.patient_search import search_patients
+from app.services.report_service import ReportService
+
+
+pytestmark = pytest.mark.slow
+
+BIG_TABLES = {
+    "patients",
+    "invoices",
+    "invoice_items",
+    "invoice_summary",
+    "invoice_search",
+    "payments",
+    "revenue_metrics",
+    "patient_payment_history",
+    "outstanding_payments",
+}
+
+N_PATIENTS = 2_000
+N_INVOICES = 8_000
+N_PAYMENTS = 20_000
+N_DAYS = 3 * 365
+START_DAY = date(2023, 1, 1)
+
+
+def _seed(db):
+    rng = random.Random(42)
+    staff_id = uuid.uuid4()
+    db.execute(insert(Staff), [{"id": staff_id, "email": "plans@clinic.com", "password_hash": "x", "name": "Plans", "role": StaffRole.ADMIN}])
+
+    patient_ids = [uuid.uuid4() for _ in range(N_PATIENTS)]
+    db.execute(insert(Patient), [
+        {"id": pid, "name": f"Patient {i}", "email": f"p{i}@example.com", "search_text": patient_search_text(f"Patient {i}", f"p{i}@example.com")}
+        for i, pid in enumerate(patient_ids)
+    ])
+
+    invoices = []
+    for i in range(N_INVOICES):
+        invoices.append({
+            "id": uuid.uuid4(),
+            "invoice_number": f"CLINIC-PLAN-{i:06d}",
+            "patient_id": rng.choice(patient_ids),
+            "staff_id": staff_id,
+            "currency": "USD",
+            "total_amount_cents": rng.randint(1_000, 50_000),
+            "status": rng.choice(list(InvoiceStatus)),
+            "due_date": START_DAY + timedelta(days=rng.randrange(N_DAYS)),
+            "created_at": datetime.combine(START_DAY, datetime.min.time()) + timedelta(minutes=rng.randrange(N_DAYS * 24 * 60)),
+        })
+    db.execute(insert(Invoice), invoices)
+    db.execute(insert(InvoiceItem), [
+        {"id": uuid.uuid4(), "invoice_id": inv["id"], "description": "Visit", "quantity": 1, "unit_price_cents": inv["total_amount_cents"], "tax_cents": 0}
+        for inv in invoices
+    ])
+
+    payments = []
+    history = []
+    statuses = [PaymentStatus.SUCCEEDED] * 8 + [PaymentStatus.FAILED, PaymentStatus.REFUNDED]
+    for i in range(N_PAYMENTS):
+        inv = rng.choice(invoices)
+        received = datetime.combine(START_DAY, datetime.min.time()) + timedelta(minutes=rng.randrange(N_DAYS * 24 * 60))
+        status = rng.choice(statuses)
+        payments.append({
+            "id": uuid.uuid4(),
+            "invoice_id": inv["id"],
+            "stripe_payment_id": f"pi_plan_{i}",
+            "amount_cents": rng.randint(500, 20_000),
+            "currency": "USD",
+            "status": status,
+            "received_at": received,
+        })
+        history.append({
+            "patient_id": str(inv["patient_id"]),
+            "payment_date": received.date(),
+            "amount": 10,
+            "payment_status": status.value,
+            "invoice_id": str(inv["id"]),
+        })
+    rebuild_invoice_summaries(db)
+    db.execute(insert(Payment), payments)
+    db.execute(insert(patient_payment_history), history)
+    db.execute(insert(revenue_metrics), [
+        {"date_key": START_DAY + timedelta(days=d), "total_revenue": 100, "payment_count": 5, "average_payment": 20}
+        for d in range(N_DAYS)
+    ])
+    db.execute(insert(outstanding_payments), [
+        {
+            "patient_id": str(inv["patient_id"]),
+            "invoice_id": str(inv["id"]),
+            "amount_due": inv["total_amount_cents"] / 100,
+            "days_overdue": rng.randrange(0, 400),
+            "payment_status": "overdue",
+        }
+        for inv in invoices[: N_INVOICES // 2]
+    ])
+    db.commit()
+    return patient_ids
+
+
+class _Capture:
+    """Records the statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        self.active = True
+        return self
+
+    def __exit__(self, *exc):
+        self.active = False
+
+
+def _sqlite_plan(conn, statement, parameters):
+    """Return [(table, index_or_None, full_scan)] for one statement."""
+    accesses = []
+    for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall():
+        detail = row[-1]
+        words = detail.split()
+        if not words or words[0] not in ("SCAN", "SEARCH"):
+            continue
+        table = words[1]
+        index = None
+        if "USING" in words and "INDEX" in words:
+            index = words[words.index("INDEX") + 1]
+        elif "PRIMARY KEY" in detail or "INTEGER PRIMARY KEY" in detail:
+            index = "PRIMARY KEY"
+        accesses.append((table, index, words[0] == "SCAN"))
+    return accesses
+
+
+def _postgres_plan(conn, statement, parameters):
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    accesses = []
+
+    def walk(node):
+        relation = node.get("Relation Name")
+        if relation:
+            full_scan = node["Node Type"] == "Seq Scan"
+            accesses.append((relation, node.get("Index Name"), full_scan))
+        elif node.get("Node Type") == "Bitmap Index Scan":
+            accesses.append((None, node.get("Index Name"), False))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return accesses
+
+
+def _explain(engine, statements):
+    planner = _postgres_plan if engine.dialect.name == "postgresql" else _sqlite_plan
+    accesses = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "DELETE", "UPDATE", "WITH")):
+                continue
+            accesses.extend(planner(conn, statement, parameters))
+            conn.rollback()
+    return accesses
+
+
+# name -> (callable(db, patient_ids), tables allowed to be fully scanned, indexes that must be used)
+CASES = {
+    "revenue_report_range": (
+        lambda db, pids: ReportService().get_revenue_report(db, start_date="2024-03-01", end_date="2024-03-31", granularity="day"),
+        set(),
+        {"ix_revenue_metrics_date_key"},
+    ),
+    "revenue_report_comparison": (
+        lambda db, pids: ReportService().get_revenue_report(
+            db, start_date="2024-03-01", end_date="2024-05-31", granularity="month", compare="previous_year"
+        ),
+        set(),
+        {"ix_revenue_metrics_date_key"},
+    ),
+    "patient_history": (
+        lambda db, pids: ReportService().get_patient_history(db, patient_id=str(pids[0]), start_date="2024-01-01", end_date="2024-12-31"),
+        set(),
+        {"ix_patient_payment_history_patient_date"},
+    ),
+    "patient_history_by_status": (
+        lambda db, pids: ReportService().get_patient_history(db, patient_id=str(pids[1]), status="succeeded"),
+        set(),
+        {"ix_patient_payment_history_patient_date"},
+    ),
+    "outstanding_min_days": (
+        lambda db, pids: ReportService().get_outstanding_payments(db=db, min_days_overdue=380),
+        set(),
+        {"ix_outstanding_payments_days_overdue"},
+    ),
+    "outstanding_unfiltered": (
+        # The whole snapshot is returned, a full read is the point of the query
+        lambda db, pids: ReportService().get_outstanding_payments(db=db),
+        {"outstanding_payments"},
+        set(),
+    ),
+    "payments_list_deep_page": (
+        # Keyset page from the middle of the table seeks the index instead of skipping rows
+        lambda db, pids: list_payments(
+            Response(), limit=50, status=None, cursor=encode_cursor(datetime(2024, 6, 1), uuid.UUID(int=0)), db=db, current_staff=None
+        ),
+        set(),
+        {"ix_payments_received_at_id"},
+    ),
+    "payments_list_deep_page_by_status": (
+        lambda db, pids: list_payments(
+            Response(), limit=50, status="refunded", cursor=encode_cursor(datetime(2024, 6, 1), uuid.UUID(int=0)), db=db, current_staff=None
+        ),
+        set(),
+        {"ix_payments_status_received_at"},
+    ),
+    "invoices_list_deep_page": (
+        lambda db, pids: list_invoices(
+            Response(), patient_id=None, status=None, from_date=None, to_date=None, limit=50,
+            cursor=encode_cursor(datetime(2024, 6, 1), uuid.UUID(int=0)), include_items=True, db=db, current_staff=None
+        ),
+        set(),
+        {"ix_invoices_created_at_id", "ix_invoice_items_invoice_id"},
+    ),
+    "invoices_list_by_patient": (
+        lambda db, pids: list_invoices(
+            Response(), patient_id=str(pids[0]), status=None, from_date=None, to_date=None, limit=50,
+            cursor=None, include_items=False, db=db, current_staff=None
+        ),
+        set(),
+        {"ix_invoices_patient_id_created_at"},
+    ),
+    "invoices_list_by_status": (
+        lambda db, pids: list_invoices(
+            Response(), patient_id=None, status=InvoiceStatus.PAID, from_date=None, to_date=None, limit=50,
+            cursor=encode_cursor(datetime(2024, 6, 1), uuid.UUID(int=0)), include_items=False, db=db, current_staff=None
+        ),
+        set(),
+        {"ix_invoices_status_created_at"},
+    ),
+    "invoice_summary_deep_page": (
+        lambda db, pids: list_invoice_summaries(
+            Response(), patient_id=None, status=None, outstanding=False, limit=50,
+            cursor=encode_cursor(datetime(2024, 6, 1), uuid.UUID(int=0)), db=db, current_staff=None
+        ),
+        set(),
+        {"ix_invoice_summary_created_at_id"},
+    ),
+    "invoice_summary_by_patient": (
+        lambda db, pids: list_invoice_summaries(
+            Response(), patient_id=str(pids[0]), status=None, outstanding=False, limit=50,
+            cursor=None, db=db, current_staff=None
+        ),
+        set(),
+        {"ix_invoice_summary_patient_id_created_at"},
+    ),
+    "invoice_search": (
+        # The full-text index itself is dialect specific (GIN / FTS5); what matters
+        # is that matches are joined to documents and summaries by key
+        lambda db, pids: search_invoices(db, "clin 0001", limit=20),
+        set(),
+        set(),
+    ),
+    "overdue_scan": (
+        # Early in the seeded range, so a few batches cover every past-due invoice
+        lambda db, pids: scan_overdue_invoices(db, today=date(2023, 3, 1), batch_size=100),
+        set(),
+        {"ix_invoices_status_due_date"},
+    ),
+    "patient_search": (
+        lambda db, pids: search_patients(db, "patient 1234", limit=20),
+        set(),
+        set(),
+    ),
+    "patient_import_duplicates": (
+        lambda db, pids: _ChunkWriter(None)._existing(
+            db, [{"name": "Patient 1234", "email": "P1234@example.com", "dob": date(1980, 1, 1)}]
+        ),
+        set(),
+        {"ix_patients_email_lower", "ix_patients_name_lower_dob"},
+    ),
+    "etl_extract_range": (
+        lambda db, pids: ETLService()._extract_aggregate_payments_by_day(db, datetime(2024, 6, 1), datetime(2024, 6, 30)),
+        set(),
+        {"ix_payments_status_received_at"},
+    ),
+    "etl_patient_history_range": (
+        lambda db, pids: ETLService()._load_patient_payment_history(db, datetime(2024, 6, 1), datetime(2024, 6, 30)),
+        set(),
+        {"ix_payments_status_received_at"},
+    ),
+    "etl_outstanding_rebuild": (
+        # Full rebuild of the snapshot from invoices.balance_cents; payments are not read.
+        # Every seeded invoice has a balance, so scanning invoices is the right plan
+        lambda db, pids: ETLService()._load_outstanding_payments(db),
+        {"invoices", "outstanding_payments"},
+        set(),
+    ),
+}
+
+# Known plan problems, keyed by (case, dialect). A listed case must still be
+# broken; once it is fixed the entry has to be removed.
+KNOWN_ISSUES = {
+    ("etl_patient_history_range", "sqlite"): "range DELETE uses (:start IS NULL OR ...) and scans patient_payment_history",
+}
+
+
+def _engines():
+    yield pytest.param("sqlite", id="sqlite")
+    yield pytest.param(
+        "postgresql",
+        id="postgresql",
+        marks=pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set"),
+    )
+
+
+@pytest.fixture(scope="module", params=list(_engines()))
+def plan_db(request, tmp_path_factory):
+    if request.param == "postgresql":
+        engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    else:
+        path = tmp_path_factory.mktemp("plans") / "plans.db"
+        engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    patient_ids = _seed(db)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    capture = _Capture(engine)
+    yield engine, db, patient_ids, capture
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_query_plan(plan_db, case):
+    engine, db, patient_ids, capture = plan_db
+    run, allowed_scans, required_indexes = CASES[case]
+
+    problems = []
+    with capture:
+        try:
+            run(db, patient_ids)
+        except Exception as e:
+            problems.append(f"query failed: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+        finally:
+            db.rollback()
+
+    if not problems:
+        accesses = _explain(engine, capture.statements)
+        scanned = {table for table, _, full in accesses if full and table in BIG_TABLES}
+        used = {index for _, index, _ in accesses if index}
+        for table in sorted(scanned - allowed_scans):
+            problems.append(f"full scan on {table}")
+        for index in sorted(required_indexes - used):
+            problems.append(f"index {index} not used (used: {sorted(used)})")
+
+    known = KNOWN_ISSUES.get((case, engine.dialect.name))
+    if known:
+        if problems:
+            pytest.xfail(f"{known}: {'; '.join(problems)}")
+        pytest.fail(f"{case} no longer shows the known issue '{known}'; remove it from KNOWN_ISSUES")
+    assert not problems, f"{case}: " + "; ".join(problems)
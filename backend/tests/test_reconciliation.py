@@ -0,0 +1,108 @@
+import io
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.models.payment import Payment, PaymentStatus
+from app.models.reconciliation import DiscrepancyKind, ReconciliationDiscrepancy, ReconciliationRunStatus
+from app.services.reconciliation import entry_from_mapping, read_export, read_json_rows, reconcile
+from app.services.stripe_gateway import FakeStripeGateway
+from tests.test_payments import create_test_invoice, create_test_patient, create_test_staff
+
+
+def add_payments(db, invoice, *specs):
+    for stripe_id, amount, status in specs:
+        db.add(Payment(
+            invoice_id=invoice.id,
+            stripe_payment_id=stripe_id,
+            amount_cents=amount,
+            currency="USD",
+            status=status,
+            received_at=datetime(2026, 9, 15),
+        ))
+    db.commit()
+
+
+def test_reconcile_csv_export_reports_discrepancies(test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db))
+    add_payments(
+        test_db, invoice,
+        ("pi_ok", 16200, PaymentStatus.SUCCEEDED),
+        ("pi_short", 16200, PaymentStatus.SUCCEEDED),
+        ("pi_refunded", 5000, PaymentStatus.REFUNDED),
+        ("pi_not_refunded", 5000, PaymentStatus.SUCCEEDED),
+        ("pi_missing", 7000, PaymentStatus.SUCCEEDED),
+        ("manual_cash", 1000, PaymentStatus.SUCCEEDED),
+    )
+    export = io.StringIO(
+        "Balance Transaction ID,Type,Payment Intent ID,Amount,Currency\n"
+        "txn_1,charge,pi_ok,162.00,usd\n"
+        "txn_2,charge,pi_short,150.00,usd\n"
+        "txn_3,charge,pi_refunded,50.00,usd\n"
+        "txn_4,refund,pi_refunded,-50.00,usd\n"
+        "txn_5,refund,pi_not_refunded,-50.00,usd\n"
+        "txn_6,charge,pi_unknown,10.00,usd\n"
+        "txn_7,charge,pi_ok,162.00,usd\n"
+        "txn_1,charge,pi_ok,162.00,usd\n"
+        "txn_8,payout,,-300.00,usd\n"
+    )
+
+    selects = []
+    engine = test_db.get_bind()
+
+    def listener(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM PAYMENTS" in statement.upper():
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        run = reconcile(
+            test_db, read_export(export, "csv"), "export.csv",
+            period_start=datetime(2026, 9, 1), period_end=datetime(2026, 10, 1), chunk_size=4,
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert run.status == ReconciliationRunStatus.COMPLETED
+    assert (run.entries_total, run.entries_matched, run.entries_ignored) == (9, 3, 1)
+    # One lookup per chunk of 4 entries (the last one holds only a payout) plus one scan for missing payments
+    assert len(selects) == 3
+    found = {
+        (row.kind, row.stripe_payment_id)
+        for row in test_db.query(ReconciliationDiscrepancy).filter(ReconciliationDiscrepancy.run_id == run.id)
+    }
+    assert found == {
+        (DiscrepancyKind.AMOUNT_MISMATCH, "pi_short"),
+        (DiscrepancyKind.STATUS_MISMATCH, "pi_not_refunded"),
+        (DiscrepancyKind.UNMATCHED, "pi_unknown"),
+        (DiscrepancyKind.DUPLICATE, "pi_ok"),
+        (DiscrepancyKind.MISSING, "pi_missing"),
+    }
+    assert run.summary["duplicate"] == 2
+
+
+def test_json_export_is_streamed_in_small_reads():
+    rows = [{"id": f"txn_{i}", "type": "charge", "amount": 100 + i, "currency": "usd", "source": {"payment_intent": f"pi_{i}"}} for i in range(50)]
+    parsed = list(read_json_rows(io.StringIO(json.dumps(rows)), buffer_size=64))
+    assert parsed == rows
+    lines = "\n".join(json.dumps(row) for row in rows)
+    assert list(read_json_rows(io.StringIO(lines), buffer_size=64)) == rows
+    assert list(read_json_rows(io.StringIO(json.dumps({"object": "list", "data": rows[:3]})))) == rows[:3]
+    entry = entry_from_mapping(rows[7])
+    assert (entry.payment_key, entry.amount_cents, entry.category) == ("pi_7", 107, "charge")
+
+
+def test_reconcile_fake_gateway_transactions(test_db):
+    invoice = create_test_invoice(test_db, create_test_patient(test_db), create_test_staff(test_db))
+    gateway = FakeStripeGateway()
+    session = gateway.create_checkout_session(invoice, 16200, {}, "http://ok", "http://cancel")
+    gateway.complete_session(session.id, payment_intent="pi_fake")
+    add_payments(test_db, invoice, ("pi_fake", 16200, PaymentStatus.SUCCEEDED))
+
+    since = datetime.utcnow() - timedelta(hours=1)
+    transactions = gateway.list_balance_transactions(created_gte=since)
+    run = reconcile(test_db, (entry_from_mapping(t) for t in transactions), "stripe")
+
+    assert (run.entries_total, run.entries_matched) == (1, 1)
+    assert sum(run.summary.values()) == 0
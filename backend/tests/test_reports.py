@@ -0,0 +1,107 @@
+import pytest
+from datetime import date
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models.reporting import revenue_metrics, patient_payment_history, outstanding_payments
+from app.services.report_service import ReportService
+
+
+@pytest.fixture
+def report_db():
+    """In-memory database with only the reporting tables."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine, tables=[revenue_metrics, patient_payment_history, outstanding_payments])
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+
+def add_revenue(db, day, total, count):
+    db.execute(
+        text(
+            "INSERT INTO revenue_metrics (date_key, total_revenue, payment_count, average_payment) "
+            "VALUES (:d, :t, :c, :a)"
+        ),
+        {"d": day.isoformat(), "t": total, "c": count, "a": total / count},
+    )
+    db.commit()
+
+
+def test_revenue_report_previous_period_by_month(report_db):
+    add_revenue(report_db, date(2025, 1, 10), 100.0, 2)
+    add_revenue(report_db, date(2025, 2, 5), 50.0, 1)
+    add_revenue(report_db, date(2025, 3, 3), 200.0, 4)
+    add_revenue(report_db, date(2025, 4, 20), 80.0, 1)
+
+    data = ReportService().get_revenue_report(
+        report_db, start_date="2025-03-01", end_date="2025-04-30", granularity="month", compare="previous_period"
+    )
+
+    assert data["previousRange"] == {"start": "2025-01-01", "end": "2025-02-28"}
+    assert [p["date"] for p in data["points"]] == ["2025-03-01", "2025-04-01"]
+    assert [p["previousDate"] for p in data["points"]] == ["2025-01-01", "2025-02-01"]
+    march, april = data["points"]
+    assert march["totalRevenue"] == 200.0
+    assert march["previousTotalRevenue"] == 100.0
+    assert march["revenueDelta"] == 100.0
+    assert march["revenueDeltaPct"] == 100.0
+    assert april["paymentCountDelta"] == 0
+    assert data["totals"]["revenueDelta"] == 130.0
+
+
+def test_revenue_report_previous_year_fills_empty_buckets(report_db):
+    add_revenue(report_db, date(2024, 6, 2), 40.0, 1)
+    add_revenue(report_db, date(2025, 6, 4), 60.0, 2)
+
+    data = ReportService().get_revenue_report(
+        report_db, start_date="2025-06-01", end_date="2025-06-03", granularity="day", compare="previous_year"
+    )
+
+    assert [p["date"] for p in data["points"]] == ["2025-06-01", "2025-06-02", "2025-06-03"]
+    assert data["points"][1]["previousTotalRevenue"] == 40.0
+    assert data["points"][1]["revenueDeltaPct"] == -100.0
+    assert data["totals"]["totalRevenue"] == 0.0
+
+
+def test_patient_history_filters_on_sqlite(report_db):
+    report_db.execute(
+        patient_payment_history.insert(),
+        [
+            {"patient_id": "p1", "payment_date": date(2025, 1, 5), "amount": 10, "payment_status": "succeeded", "invoice_id": "i1"},
+            {"patient_id": "p1", "payment_date": date(2025, 2, 5), "amount": 20, "payment_status": "refunded", "invoice_id": "i2"},
+            {"patient_id": "p1", "payment_date": date(2025, 3, 5), "amount": 30, "payment_status": "succeeded", "invoice_id": "i3"},
+            {"patient_id": "p2", "payment_date": date(2025, 2, 6), "amount": 40, "payment_status": "succeeded", "invoice_id": "i4"},
+        ],
+    )
+    report_db.commit()
+
+    data = ReportService().get_patient_history(
+        report_db, patient_id="p1", start_date="2025-01-01", end_date="2025-02-28", status="succeeded"
+    )
+
+    assert data["payments"] == [
+        {"paymentDate": "2025-01-05", "amount": 10.0, "status": "succeeded", "invoiceId": "i1"}
+    ]
+
+
+def test_outstanding_payments_amount_filter(report_db):
+    report_db.execute(
+        outstanding_payments.insert(),
+        [
+            {"patient_id": "p1", "invoice_id": "i1", "amount_due": 15, "days_overdue": 3, "payment_status": "overdue"},
+            {"patient_id": "p2", "invoice_id": "i2", "amount_due": 150, "days_overdue": 30, "payment_status": "overdue"},
+        ],
+    )
+    report_db.commit()
+
+    data = ReportService().get_outstanding_payments(db=report_db, min_amount=100)
+
+    assert data["total"] == 1
+    assert data["items"][0]["invoiceId"] == "i2"
+
+
+def test_revenue_report_comparison_requires_range(report_db):
+    with pytest.raises(ValueError):
+        ReportService().get_revenue_report(report_db, compare="previous_year")
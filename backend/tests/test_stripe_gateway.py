@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import stripe
+
+from app.services.stripe_gateway import (
+    CircuitBreaker,
+    FakeStripeGateway,
+    StripeGateway,
+    StripeUnavailable,
+    checkout_session_fields,
+    get_or_create_checkout_session,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    calls = []
+
+    def outage():
+        calls.append(1)
+        raise stripe.error.APIConnectionError("connection reset")
+
+    for _ in range(2):
+        with pytest.raises(stripe.error.APIConnectionError):
+            breaker.call(outage)
+    assert breaker.state == "open"
+
+    # Open: fails fast without calling Stripe
+    with pytest.raises(StripeUnavailable):
+        breaker.call(outage)
+    assert len(calls) == 2
+
+    # Half open: one trial call, a failure re-opens immediately
+    clock.now = 31
+    assert breaker.state == "half_open"
+    with pytest.raises(stripe.error.APIConnectionError):
+        breaker.call(outage)
+    assert breaker.state == "open"
+
+    clock.now = 62
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_request_errors_do_not_open_the_breaker():
+    gateway = StripeGateway("sk_test_x", breaker=CircuitBreaker(failure_threshold=1))
+
+    def declined():
+        raise stripe.error.CardError("declined", "card", "card_declined", http_status=402)
+
+    for _ in range(3):
+        with pytest.raises(stripe.error.CardError):
+            gateway._call(declined)
+    assert gateway.breaker.state == "closed"
+
+
+def test_checkout_session_is_reused_until_it_nears_expiry():
+    gateway = FakeStripeGateway()
+    invoice = SimpleNamespace(
+        id="inv-1", invoice_number="INV-1", currency="USD", total_amount_cents=5000,
+        stripe_checkout_session_id=None, stripe_checkout_url=None,
+        stripe_checkout_expires_at=None, stripe_checkout_amount_cents=None,
+    )
+
+    session, created = get_or_create_checkout_session(gateway, invoice, "http://api.test/local-checkout")
+    assert created and session.url == f"http://api.test/local-checkout/{session.id}"
+    vars(invoice).update(checkout_session_fields(session, 5000))
+
+    reused, created = get_or_create_checkout_session(gateway, invoice)
+    assert not created and reused.id == session.id
+    assert gateway.calls == 1
+
+    invoice.stripe_checkout_expires_at = datetime.utcnow() + timedelta(minutes=5)
+    _, created = get_or_create_checkout_session(gateway, invoice)
+    assert created
+    assert gateway.calls == 2
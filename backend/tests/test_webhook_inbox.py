@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from app.models.inbound_event import InboundEvent, InboundEventStatus
+from app.models.processed_webhook_event import ProcessedWebhookEvent
+from app.services import webhook_inbox as inbox_module
+from app.services.webhook_inbox import WebhookInbox, record_event
+
+
+def make_event(event_id, invoice_id, event_type="test.event"):
+    return {
+        "id": event_id,
+        "type": event_type,
+        "data": {"object": {"metadata": {"invoice_id": invoice_id}}},
+    }
+
+
+def test_events_for_same_invoice_are_applied_in_order(test_db, monkeypatch):
+    applied = []
+    monkeypatch.setitem(inbox_module.EVENT_HANDLERS, "test.event", lambda db, event: applied.append(event["id"]))
+    for i, invoice in enumerate(["inv-a", "inv-b", "inv-a", "inv-a"]):
+        record_event(test_db, make_event(f"evt_{i}", invoice))
+
+    assert WebhookInbox(workers=0).drain(test_db) == 4
+
+    assert [e for e in applied if e in ("evt_0", "evt_2", "evt_3")] == ["evt_0", "evt_2", "evt_3"]
+    statuses = {row.status for row in test_db.query(InboundEvent).all()}
+    assert statuses == {InboundEventStatus.PROCESSED}
+
+
+def test_failed_event_blocks_later_events_for_its_invoice(test_db, monkeypatch):
+    applied = []
+
+    def handler(db, event):
+        if event["id"] == "evt_bad":
+            raise RuntimeError("boom")
+        applied.append(event["id"])
+
+    monkeypatch.setitem(inbox_module.EVENT_HANDLERS, "test.event", handler)
+    record_event(test_db, make_event("evt_bad", "inv-a"))
+    record_event(test_db, make_event("evt_after", "inv-a"))
+    record_event(test_db, make_event("evt_other", "inv-b"))
+
+    WebhookInbox(workers=0, max_attempts=3).drain(test_db)
+
+    assert applied == ["evt_other"]
+    bad = test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_bad").one()
+    after = test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_after").one()
+    assert bad.status == InboundEventStatus.PENDING
+    assert bad.attempts == 1
+    assert bad.next_attempt_at > datetime.utcnow()
+    assert "boom" in bad.last_error
+    assert after.status == InboundEventStatus.PENDING
+    assert after.attempts == 0
+
+
+def test_event_is_dead_lettered_after_max_attempts(test_db, monkeypatch):
+    def handler(db, event):
+        if event["id"] == "evt_bad":
+            raise RuntimeError("boom")
+
+    monkeypatch.setitem(inbox_module.EVENT_HANDLERS, "test.event", handler)
+    record_event(test_db, make_event("evt_bad", "inv-a"))
+    record_event(test_db, make_event("evt_after", "inv-a"))
+    inbox = WebhookInbox(workers=0, max_attempts=2)
+
+    inbox.drain(test_db)
+    # Make the retry due immediately
+    bad = test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_bad").one()
+    bad.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    test_db.commit()
+    inbox.drain(test_db)
+
+    test_db.expire_all()
+    bad = test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_bad").one()
+    after = test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_after").one()
+    assert bad.status == InboundEventStatus.DEAD
+    assert bad.attempts == 2
+    assert after.status == InboundEventStatus.PROCESSED
+
+
+def test_replayed_event_is_stored_once(test_db):
+    first = record_event(test_db, make_event("evt_dup", "inv-a"))
+    replay = record_event(test_db, make_event("evt_dup", "inv-a"))
+
+    assert first is not None
+    assert replay is None
+    assert test_db.query(InboundEvent).filter(InboundEvent.event_id == "evt_dup").count() == 1
+    assert test_db.query(ProcessedWebhookEvent).count() == 1
+
+
+def test_purge_expired_forgets_old_event_ids(test_db):
+    record_event(test_db, make_event("evt_old", "inv-a"))
+    record_event(test_db, make_event("evt_new", "inv-a"))
+    old = test_db.query(ProcessedWebhookEvent).filter(ProcessedWebhookEvent.event_id == "evt_old").one()
+    old.received_at = datetime.utcnow() - timedelta(days=365)
+    test_db.commit()
+
+    assert WebhookInbox(workers=0).purge_expired(test_db) == 1
+    assert [row.event_id for row in test_db.query(ProcessedWebhookEvent).all()] == ["evt_new"]